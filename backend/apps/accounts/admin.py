@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Business, User
+from .models import Business, BusinessRole, User
 
 
 @admin.register(Business)
@@ -10,10 +10,17 @@ class BusinessAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+@admin.register(BusinessRole)
+class BusinessRoleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'business', 'permissions', 'updated_at')
+    list_filter = ('business',)
+    search_fields = ('name',)
+
+
 @admin.register(User)
 class MarketplaceUserAdmin(UserAdmin):
     fieldsets = UserAdmin.fieldsets + (
-        ('Marketplace', {'fields': ('business', 'role')}),
+        ('Marketplace', {'fields': ('business', 'role', 'custom_role')}),
     )
     list_display = ('id', 'username', 'email', 'role', 'business', 'is_staff')
     list_filter = ('role', 'business', 'is_staff')
@@ -0,0 +1,27 @@
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated
+
+from apps.core.async_views import AsyncAPIView
+
+from .authentication import ClaimsJWTAuthentication
+from .models import User
+from .serializers import UserSerializer
+from .views import CurrentUserValidatorsMixin
+
+
+class AsyncCurrentUserView(CurrentUserValidatorsMixin, AsyncAPIView):
+    authentication_classes = (ClaimsJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    async def get(self, request):
+        user = await User.objects.select_related('business', 'custom_role').filter(pk=request.user.id).afirst()
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        validators = self.get_profile_validators(
+            user.business_id,
+            user.permissions_version,
+            user.updated_at,
+            user.business.updated_at if user.business else None,
+            user.custom_role.updated_at if user.custom_role else None,
+        )
+        return self.conditional(validators, lambda: self.render(UserSerializer(user).data))
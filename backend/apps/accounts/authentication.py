@@ -0,0 +1,179 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ROLE_PERMISSIONS, RolePermissionsMixin, User
+
+ROLE_CLAIM = 'role'
+BUSINESS_CLAIM = 'business_id'
+PERMISSIONS_VERSION_CLAIM = 'pv'
+PERMISSIONS_CLAIM = 'perms'
+REQUIRED_CLAIMS = (ROLE_CLAIM, BUSINESS_CLAIM, PERMISSIONS_VERSION_CLAIM)
+
+
+def get_auth_cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def permissions_version_key(user_id) -> str:
+    return f'auth:pv:{user_id}'
+
+
+def denylist_key(jti: str) -> str:
+    return f'auth:deny:{jti}'
+
+
+def add_claims(token, user):
+    token['username'] = user.username
+    token[ROLE_CLAIM] = user.role
+    token[BUSINESS_CLAIM] = user.business_id
+    token[PERMISSIONS_VERSION_CLAIM] = user.permissions_version
+    token[PERMISSIONS_CLAIM] = user.permission_mask
+    return token
+
+
+def permissions_version_queryset(user_id):
+    # From the primary: a lagging replica would cache a revoked version as current for the whole timeout.
+    users = User.objects.using(DEFAULT_DB_ALIAS)
+    return users.filter(pk=user_id, is_active=True).values_list('permissions_version', flat=True)
+
+
+def load_permissions_version(user_id) -> int:
+    # 0 never matches a token, so a deleted or deactivated user is cached as "no valid tokens".
+    version = permissions_version_queryset(user_id).first() or 0
+    get_auth_cache().set(permissions_version_key(user_id), version, settings.AUTH_PERMISSIONS_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+async def aload_permissions_version(user_id) -> int:
+    version = await permissions_version_queryset(user_id).afirst() or 0
+    await get_auth_cache().aset(
+        permissions_version_key(user_id), version, settings.AUTH_PERMISSIONS_VERSION_CACHE_TIMEOUT
+    )
+    return version
+
+
+def bump_permissions_version(user_id):
+    bump_permissions_versions([user_id])
+
+
+def bump_permissions_versions(user_ids):
+    User.objects.filter(pk__in=user_ids).update(permissions_version=F('permissions_version') + 1)
+    forget_permissions_versions(user_ids)
+
+
+def forget_permissions_version(user_id):
+    forget_permissions_versions([user_id])
+
+
+def forget_permissions_versions(user_ids):
+    keys = [permissions_version_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: get_auth_cache().delete_many(keys))
+
+
+def revoke_token(token):
+    remaining = int(token.get('exp', 0) - time.time())
+    if remaining > 0:
+        get_auth_cache().set(denylist_key(token[api_settings.JTI_CLAIM]), True, remaining)
+
+
+def is_revoked(token) -> bool:
+    return get_auth_cache().get(denylist_key(token[api_settings.JTI_CLAIM])) is not None
+
+
+class ClaimsUser(RolePermissionsMixin, TokenUser):
+    # Request user rebuilt from access token claims; carries what permission checks and business scoping need.
+    @cached_property
+    def id(self) -> int:
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self) -> int:
+        return self.id
+
+    @cached_property
+    def role(self) -> str:
+        return self.token[ROLE_CLAIM]
+
+    @cached_property
+    def business_id(self) -> int | None:
+        return self.token[BUSINESS_CLAIM]
+
+    @cached_property
+    def permissions_version(self) -> int:
+        return self.token[PERMISSIONS_VERSION_CLAIM]
+
+    @cached_property
+    def permission_mask(self) -> int:
+        # Tokens issued before the claim existed fall back to the built-in role's mask.
+        return self.token.get(PERMISSIONS_CLAIM, ROLE_PERMISSIONS.get(self.role, 0))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    # Authenticates from token claims alone: one cache round trip checks the denylist and the user's current
+    # permissions version, and the database is only read when that version is not cached.
+    def get_user(self, validated_token):
+        user, keys = self.get_claims_user(validated_token)
+        version = self.check_revoked(keys, get_auth_cache().get_many(keys))
+        if version is None:
+            version = load_permissions_version(user.id)
+        return self.check_version(user, version)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user, keys = self.get_claims_user(validated_token)
+        version = self.check_revoked(keys, await get_auth_cache().aget_many(keys))
+        if version is None:
+            version = await aload_permissions_version(user.id)
+        return self.check_version(user, version), validated_token
+
+    def get_claims_user(self, validated_token):
+        if any(claim not in validated_token for claim in (api_settings.USER_ID_CLAIM, *REQUIRED_CLAIMS)):
+            raise InvalidToken('Token contained no recognizable user identification')
+        user = ClaimsUser(validated_token)
+        return user, [permissions_version_key(user.id), denylist_key(validated_token[api_settings.JTI_CLAIM])]
+
+    def check_revoked(self, keys, cached):
+        version_key, revoked_key = keys
+        if revoked_key in cached:
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+        return cached.get(version_key)
+
+    def check_version(self, user, version):
+        if version != user.permissions_version:
+            raise AuthenticationFailed('Token permissions are out of date.', code='token_outdated')
+        return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    # Access tokens are re-issued from the current user row so a refresh picks up role changes.
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_revoked(refresh):
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+
+        user = User.objects.select_related('custom_role').filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], code='no_active_account')
+        return {'access': str(add_claims(refresh.access_token, user))}
@@ -0,0 +1,107 @@
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from .hashers import make_passwords
+from .models import User
+from .serializers import EMAIL_TAKEN, USERNAME_TAKEN, BulkUserRowSerializer
+
+USERNAME_REPEATED = 'This username is used by an earlier row of the batch.'
+EMAIL_REPEATED = 'This email is used by an earlier row of the batch.'
+ROW_CONFLICT = 'This row conflicts with an existing user.'
+
+
+class BulkUserCreator:
+    # Validates rows on their own, checks uniqueness for the batch with one query per field, hashes passwords in the
+    # hashing pool and inserts every valid row in one transaction. Invalid rows are reported and skipped.
+    def __init__(self, business_id):
+        self.business_id = business_id
+        self.results = []
+
+    def run(self, rows) -> dict:
+        self.results = [None] * len(rows)
+        pending = []
+        for index, row in enumerate(rows):
+            serializer = BulkUserRowSerializer(data=row)
+            if serializer.is_valid():
+                pending.append((index, serializer.validated_data))
+            else:
+                self.reject(index, serializer.errors)
+        pending = self.reject_duplicates(pending)
+
+        # Hashed before the transaction starts, so the write lock is only held for the inserts.
+        passwords = make_passwords([data['password'] for _, data in pending])
+        users = {}
+        for (index, data), password in zip(pending, passwords):
+            fields = {key: value for key, value in data.items() if key != 'password'}
+            users[index] = User(**fields, password=password, business_id=self.business_id)
+        users = self.insert_all(pending, users)
+
+        for index, user in users.items():
+            self.results[index] = {'index': index, 'status': 'created', 'id': user.pk, 'username': user.username}
+        return {'created': len(users), 'failed': len(rows) - len(users), 'results': self.results}
+
+    def insert_all(self, pending, users: dict) -> dict:
+        # Another request may take a username or email after the lookup. Each IntegrityError re-checks the remaining
+        # rows and retries without the newly taken ones; a clash the lookups cannot explain falls back to row by row.
+        while users:
+            try:
+                self.insert(users)
+                return users
+            except IntegrityError:
+                kept = {index for index, _ in self.reject_duplicates([row for row in pending if row[0] in users])}
+                if len(kept) == len(users):
+                    return self.insert_each(users)
+                users = {index: user for index, user in users.items() if index in kept}
+        return users
+
+    def insert(self, users: dict):
+        with transaction.atomic():
+            User.objects.bulk_create(list(users.values()))
+
+    def insert_each(self, users: dict) -> dict:
+        inserted = {}
+        for index, user in users.items():
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+            except IntegrityError:
+                self.reject(index, {'non_field_errors': [ROW_CONFLICT]})
+            else:
+                inserted[index] = user
+        return inserted
+
+    def reject_duplicates(self, pending):
+        usernames = {data['username'].lower() for _, data in pending}
+        emails = {data['email'].lower() for _, data in pending if data.get('email')}
+        taken_usernames = set(
+            User.objects.filter(username__lower__in=usernames).values_list(Lower('username'), flat=True)
+        )
+        taken_emails = set(
+            User.objects.filter(email__lower__in=emails).exclude(email='').values_list(Lower('email'), flat=True)
+            if emails
+            else []
+        )
+
+        batch_usernames, batch_emails = set(), set()
+        kept = []
+        for index, data in pending:
+            username, email = data['username'].lower(), (data.get('email') or '').lower()
+            errors = {}
+            if username in taken_usernames:
+                errors['username'] = [USERNAME_TAKEN]
+            elif username in batch_usernames:
+                errors['username'] = [USERNAME_REPEATED]
+            if email in taken_emails:
+                errors['email'] = [EMAIL_TAKEN]
+            elif email and email in batch_emails:
+                errors['email'] = [EMAIL_REPEATED]
+            if errors:
+                self.reject(index, errors)
+                continue
+            batch_usernames.add(username)
+            batch_emails.add(email)
+            kept.append((index, data))
+        return kept
+
+    def reject(self, index, errors):
+        self.results[index] = {'index': index, 'status': 'failed', 'errors': errors}
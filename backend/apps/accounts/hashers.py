@@ -0,0 +1,79 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher, make_password
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    # Same algorithm name as Django's hasher, so existing scrypt hashes verify and are rehashed when the cost changes.
+    @property
+    def work_factor(self) -> int:
+        return settings.AUTH_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self) -> int:
+        return settings.AUTH_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self) -> int:
+        return settings.AUTH_SCRYPT_PARALLELISM
+
+    @property
+    def maxmem(self) -> int:
+        # scrypt needs 128 * r * N bytes; OpenSSL refuses anything over 32 MiB unless maxmem allows it. Doubled so
+        # hashes made with a larger work factor than the current one still verify.
+        return 2 * 128 * self.block_size * self.work_factor + 1024 * 1024
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self) -> int:
+        return settings.AUTH_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self) -> int:
+        return settings.AUTH_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self) -> int:
+        return settings.AUTH_ARGON2_PARALLELISM
+
+
+def get_hash_pool(processes: int) -> ProcessPoolExecutor:
+    # Started on first use and kept for the life of the process. Spawned rather than forked, since forking a threaded
+    # server process can copy locks held by other request threads.
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            context = multiprocessing.get_context('spawn')
+            _hash_pool = ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=django.setup)
+        return _hash_pool
+
+
+def discard_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        pool, _hash_pool = _hash_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_passwords(passwords: list[str]) -> list[str]:
+    # Hashes a batch across AUTH_PASSWORD_HASH_PROCESSES processes, so a bulk create is not bounded by one core.
+    processes = settings.AUTH_PASSWORD_HASH_PROCESSES
+    if processes <= 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (processes * 4))
+    try:
+        return list(get_hash_pool(processes).map(make_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time and finish this batch here.
+        discard_hash_pool()
+        return [make_password(password) for password in passwords]
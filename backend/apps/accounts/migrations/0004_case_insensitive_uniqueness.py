@@ -0,0 +1,46 @@
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicates(apps, schema_editor):
+    # Fail with the offending values rather than a bare IntegrityError from CREATE UNIQUE INDEX.
+    Business = apps.get_model('accounts', 'Business')
+    User = apps.get_model('accounts', 'User')
+    checks = [
+        ('business name', Business.objects.all(), 'name'),
+        ('username', User.objects.all(), 'username'),
+        ('email', User.objects.exclude(email=''), 'email'),
+    ]
+    for label, queryset, field in checks:
+        groups = queryset.values(key=Lower(field)).annotate(rows=Count('pk')).filter(rows__gt=1)
+        duplicates = list(groups.values_list('key', flat=True))
+        if duplicates:
+            raise RuntimeError(
+                f'Cannot add the case-insensitive {label} constraint; rename these duplicates first: {duplicates[:20]}'
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('accounts', '0003_user_permissions_version'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='business',
+            constraint=models.UniqueConstraint(Lower('name'), name='accounts_business_name_ci_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(Lower('username'), name='accounts_user_username_ci_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(
+                Lower('email'), condition=~models.Q(email=''), name='accounts_user_email_ci_uniq'
+            ),
+        ),
+    ]
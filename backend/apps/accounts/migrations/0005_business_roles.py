@@ -0,0 +1,47 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('accounts', '0004_case_insensitive_uniqueness'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessRole',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('permissions', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                (
+                    'business',
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='roles',
+                        to='accounts.business',
+                    ),
+                ),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint('business', Lower('name'), name='accounts_businessrole_name_ci_uniq'),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='custom_role',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='users',
+                to='accounts.businessrole',
+            ),
+        ),
+    ]
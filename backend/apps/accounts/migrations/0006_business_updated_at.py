@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('accounts', '0005_business_roles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,10 +1,22 @@
+import enum
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
+
+# Enables `field__lower=...` lookups, which the Lower() unique indexes below serve.
+models.CharField.register_lookup(Lower)
 
 
 class Business(models.Model):
     name = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='accounts_business_name_ci_uniq'),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -17,31 +29,67 @@ class UserRole(models.TextChoices):
     VIEWER = 'viewer', 'Viewer'
 
 
+class Permission(enum.IntFlag):
+    MANAGE_USERS = 1
+    MANAGE_PRODUCTS = 2
+    APPROVE_PRODUCTS = 4
+
+
+ALL_PERMISSIONS = Permission.MANAGE_USERS | Permission.MANAGE_PRODUCTS | Permission.APPROVE_PRODUCTS
+
+# Plain ints, so a check is one AND on values that already sit in the token claims.
 ROLE_PERMISSIONS = {
-    UserRole.ADMIN: {
-        'manage_users': True,
-        'manage_products': True,
-        'approve_products': True,
-    },
-    UserRole.EDITOR: {
-        'manage_users': False,
-        'manage_products': True,
-        'approve_products': False,
-    },
-    UserRole.APPROVER: {
-        'manage_users': False,
-        'manage_products': True,
-        'approve_products': True,
-    },
-    UserRole.VIEWER: {
-        'manage_users': False,
-        'manage_products': False,
-        'approve_products': False,
-    },
+    UserRole.ADMIN: int(ALL_PERMISSIONS),
+    UserRole.EDITOR: int(Permission.MANAGE_PRODUCTS),
+    UserRole.APPROVER: int(Permission.MANAGE_PRODUCTS | Permission.APPROVE_PRODUCTS),
+    UserRole.VIEWER: 0,
 }
 
 
-class User(AbstractUser):
+def permission_names(mask: int) -> list[str]:
+    return [permission.name.lower() for permission in Permission if mask & permission]
+
+
+class RolePermissionsMixin:
+    permission_mask: int
+
+    @property
+    def permissions_map(self) -> dict[str, bool]:
+        # The name -> flag mapping roles used before they were bitmasks.
+        return {permission.name.lower(): bool(self.permission_mask & permission) for permission in Permission}
+
+    def has_permissions(self, required: int) -> bool:
+        return self.permission_mask & required == required
+
+    def can_manage_users(self) -> bool:
+        return self.has_permissions(Permission.MANAGE_USERS)
+
+    def can_manage_products(self) -> bool:
+        return self.has_permissions(Permission.MANAGE_PRODUCTS)
+
+    def can_approve_products(self) -> bool:
+        return self.has_permissions(Permission.APPROVE_PRODUCTS)
+
+
+class BusinessRole(models.Model):
+    # A business's own role: a named permission mask that replaces the built-in role's for users assigned to it.
+    # Indexed by the leading column of the unique constraint below.
+    business = models.ForeignKey(Business, related_name='roles', on_delete=models.CASCADE, db_index=False)
+    name = models.CharField(max_length=100)
+    permissions = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint('business', Lower('name'), name='accounts_businessrole_name_ci_uniq'),
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class User(RolePermissionsMixin, AbstractUser):
     business = models.ForeignKey(
         Business,
         related_name='users',
@@ -50,16 +98,26 @@ class User(AbstractUser):
         on_delete=models.SET_NULL,
     )
     role = models.CharField(max_length=20, choices=UserRole.choices, default=UserRole.VIEWER)
+    custom_role = models.ForeignKey(
+        BusinessRole,
+        related_name='users',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Embedded in access tokens; bumping it invalidates every token issued with the old role.
+    permissions_version = models.PositiveIntegerField(default=1)
 
-    @property
-    def permissions_map(self) -> dict[str, bool]:
-        return ROLE_PERMISSIONS.get(self.role, {})
-
-    def can_manage_users(self) -> bool:
-        return bool(self.permissions_map.get('manage_users', False))
-
-    def can_manage_products(self) -> bool:
-        return bool(self.permissions_map.get('manage_products', False))
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            models.UniqueConstraint(Lower('username'), name='accounts_user_username_ci_uniq'),
+            # Email is optional; only addresses that were given must be unique.
+            models.UniqueConstraint(Lower('email'), condition=~models.Q(email=''), name='accounts_user_email_ci_uniq'),
+        ]
 
-    def can_approve_products(self) -> bool:
-        return bool(self.permissions_map.get('approve_products', False))
+    @property
+    def permission_mask(self) -> int:
+        if self.custom_role_id is not None:
+            return self.custom_role.permissions
+        return ROLE_PERMISSIONS.get(self.role, 0)
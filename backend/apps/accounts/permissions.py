@@ -1,6 +1,10 @@
 from rest_framework.permissions import BasePermission
 
 
-class IsBusinessUserManager(BasePermission):
+class HasActionPermissions(BasePermission):
+    # Views declare `action_permissions`: the Permission bits each action needs, with '*' for every other action.
+    # The user's mask comes from the token claims, so a check is a dict lookup and one AND.
     def has_permission(self, request, view):
-        return bool(request.user and request.user.is_authenticated and request.user.can_manage_users())
+        table = view.action_permissions
+        required = table.get(view.action, table['*'])
+        return bool(request.user and request.user.is_authenticated and request.user.has_permissions(required))
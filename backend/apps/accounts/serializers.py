@@ -1,11 +1,52 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
-from .models import Business, UserRole
+from .models import ALL_PERMISSIONS, Business, BusinessRole, Permission, UserRole, permission_names
 
 User = get_user_model()
 
+USERNAME_TAKEN = 'A user with this username already exists.'
+EMAIL_TAKEN = 'A user with this email already exists.'
+BUSINESS_NAME_TAKEN = 'Business name already exists.'
+ROLE_NAME_TAKEN = 'A role with this name already exists.'
+
+# Unique indexes (as SQLite and Postgres name them in errors) mapped to the field error a violation stands for.
+UNIQUE_VIOLATIONS = [
+    ('accounts_user_username_ci_uniq', 'username', USERNAME_TAKEN),
+    ('accounts_user.username', 'username', USERNAME_TAKEN),
+    ('accounts_user_username_key', 'username', USERNAME_TAKEN),
+    ('accounts_user_email_ci_uniq', 'email', EMAIL_TAKEN),
+    ('accounts_business_name_ci_uniq', 'business_name', BUSINESS_NAME_TAKEN),
+    ('accounts_business.name', 'business_name', BUSINESS_NAME_TAKEN),
+    ('accounts_business_name_key', 'business_name', BUSINESS_NAME_TAKEN),
+    ('accounts_businessrole_name_ci_uniq', 'name', ROLE_NAME_TAKEN),
+]
+
+
+def is_taken(model, field: str, value: str, instance=None) -> bool:
+    # One probe of the Lower() unique index; the constraint still decides when two requests race.
+    # Excluding blanks, which are never unique, lets the partial email index serve the lookup.
+    queryset = model.objects.filter(**{f'{field}__lower': value.lower()}).exclude(**{field: ''})
+    if instance is not None:
+        queryset = queryset.exclude(pk=instance.pk)
+    return queryset.exists()
+
+
+class UniqueViolationMixin:
+    # Validation can pass for two concurrent requests; the loser's IntegrityError becomes the same 400 a validation
+    # failure would have given.
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError as exc:
+            for index_name, field, message in UNIQUE_VIOLATIONS:
+                if index_name in str(exc):
+                    raise serializers.ValidationError({field: [message]}) from exc
+            raise
+
 
 class BusinessSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,43 +55,128 @@ class BusinessSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class PermissionsField(serializers.Field):
+    # Stored as a Permission mask, exchanged as a list of permission names.
+    default_error_messages = {
+        'not_a_list': 'Expected a list of permission names.',
+        'unknown': 'Unknown permission "{name}"; choose from {choices}.',
+    }
+
+    def to_representation(self, value):
+        return permission_names(value)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            self.fail('not_a_list')
+        mask = 0
+        for name in data:
+            try:
+                mask |= Permission[str(name).upper()]
+            except KeyError:
+                self.fail('unknown', name=name, choices=', '.join(permission_names(ALL_PERMISSIONS)))
+        return int(mask)
+
+
+class BusinessRoleSerializer(UniqueViolationMixin, serializers.ModelSerializer):
+    permissions = PermissionsField()
+
+    class Meta:
+        model = BusinessRole
+        fields = ['id', 'name', 'permissions', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+    def validate_name(self, value):
+        value = value.strip()
+        roles = BusinessRole.objects.filter(business_id=self.context['business_id'], name__lower=value.lower())
+        if self.instance is not None:
+            roles = roles.exclude(pk=self.instance.pk)
+        if roles.exists():
+            raise serializers.ValidationError(ROLE_NAME_TAKEN)
+        return value
+
+
+class BusinessRoleField(serializers.PrimaryKeyRelatedField):
+    # Only roles of the requesting user's business can be assigned.
+    def get_queryset(self):
+        return BusinessRole.objects.filter(business_id=self.context.get('business_id'))
+
+
+class UserSerializer(UniqueViolationMixin, serializers.ModelSerializer):
     business = BusinessSerializer(read_only=True)
+    custom_role = BusinessRoleField(required=False, allow_null=True)
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'role', 'business']
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'role', 'custom_role', 'business']
+        extra_kwargs = {'username': {'validators': [User.username_validator]}}
+
+    def validate_username(self, value):
+        if is_taken(User, 'username', value.strip(), self.instance):
+            raise serializers.ValidationError(USERNAME_TAKEN)
+        return value.strip()
+
+    def validate_email(self, value):
+        normalized_email = value.strip()
+        if normalized_email and is_taken(User, 'email', normalized_email, self.instance):
+            raise serializers.ValidationError(EMAIL_TAKEN)
+        return normalized_email
 
 
-class UserCreateSerializer(serializers.ModelSerializer):
+class UserCreateSerializer(UniqueViolationMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
+    custom_role = BusinessRoleField(required=False, allow_null=True)
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'password', 'role']
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'password', 'role', 'custom_role']
         read_only_fields = ['id']
+        # The model's exact-match UniqueValidator would be a second query; validate_username covers it.
+        extra_kwargs = {'username': {'validators': [User.username_validator]}}
 
     def validate_username(self, value):
-        if User.objects.filter(username__iexact=value.strip()).exists():
-            raise serializers.ValidationError('A user with this username already exists.')
+        if is_taken(User, 'username', value.strip()):
+            raise serializers.ValidationError(USERNAME_TAKEN)
         return value.strip()
 
     def validate_email(self, value):
         normalized_email = value.strip()
-        if normalized_email and User.objects.filter(email__iexact=normalized_email).exists():
-            raise serializers.ValidationError('A user with this email already exists.')
+        if normalized_email and is_taken(User, 'email', normalized_email):
+            raise serializers.ValidationError(EMAIL_TAKEN)
         return normalized_email
 
     def create(self, validated_data):
-        business = self.context['business']
         password = validated_data.pop('password')
-        user = User(**validated_data, business=business)
+        user = User(**validated_data, business_id=self.context['business_id'])
         user.set_password(password)
         user.save()
         return user
 
 
-class BusinessAdminSignupSerializer(serializers.Serializer):
+class BulkUserRowSerializer(UserCreateSerializer):
+    # Uniqueness is checked once for the whole batch by BulkUserCreator rather than with queries per row. Custom roles
+    # would need a lookup per row too; they are assigned through the single-user endpoints.
+    class Meta(UserCreateSerializer.Meta):
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'password', 'role']
+
+    def validate_username(self, value):
+        return value.strip()
+
+    def validate_email(self, value):
+        return value.strip()
+
+
+class BulkUserCreateSerializer(serializers.Serializer):
+    users = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_users(self, value):
+        if len(value) > settings.AUTH_BULK_CREATE_MAX_USERS:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.AUTH_BULK_CREATE_MAX_USERS} elements.'
+            )
+        return value
+
+
+class BusinessAdminSignupSerializer(UniqueViolationMixin, serializers.Serializer):
     business_name = serializers.CharField(max_length=255)
     username = serializers.CharField(max_length=150)
     email = serializers.EmailField(required=False, allow_blank=True)
@@ -59,22 +185,21 @@ class BusinessAdminSignupSerializer(serializers.Serializer):
     password = serializers.CharField(min_length=8, write_only=True)
 
     def validate_business_name(self, value):
-        if Business.objects.filter(name__iexact=value.strip()).exists():
-            raise serializers.ValidationError('Business name already exists.')
+        if is_taken(Business, 'name', value.strip()):
+            raise serializers.ValidationError(BUSINESS_NAME_TAKEN)
         return value.strip()
 
     def validate_username(self, value):
-        if User.objects.filter(username__iexact=value.strip()).exists():
-            raise serializers.ValidationError('A user with this username already exists.')
+        if is_taken(User, 'username', value.strip()):
+            raise serializers.ValidationError(USERNAME_TAKEN)
         return value.strip()
 
     def validate_email(self, value):
         normalized_email = value.strip()
-        if normalized_email and User.objects.filter(email__iexact=normalized_email).exists():
-            raise serializers.ValidationError('A user with this email already exists.')
+        if normalized_email and is_taken(User, 'email', normalized_email):
+            raise serializers.ValidationError(EMAIL_TAKEN)
         return normalized_email
 
-    @transaction.atomic
     def create(self, validated_data):
         business = Business.objects.create(name=validated_data['business_name'])
         user = User(
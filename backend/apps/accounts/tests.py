@@ -1,12 +1,32 @@
-from django.urls import reverse
+import unittest
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.urls import path, reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from apps.accounts.models import Business, User, UserRole
+from apps.accounts.async_views import AsyncCurrentUserView
+from apps.accounts.hashers import discard_hash_pool
+from apps.accounts.authentication import PERMISSIONS_CLAIM, ClaimsTokenObtainPairSerializer
+from apps.accounts.bulk import BulkUserCreator
+from apps.accounts.models import ROLE_PERMISSIONS, Business, BusinessRole, Permission, User, UserRole
+from apps.accounts.throttling import login_slots
+from apps.products.models import Product, ProductStatus
+
+# Serves the async views when a test overrides ROOT_URLCONF with this module.
+urlpatterns = [
+    path('api/auth/me/', AsyncCurrentUserView.as_view(), name='current_user'),
+]
 
 
 class BusinessUserManagementTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.business = Business.objects.create(name='Umbrella Corp')
         self.admin = User.objects.create_user(
             username='admin', password='password123', business=self.business, role=UserRole.ADMIN
@@ -35,6 +55,49 @@ class BusinessUserManagementTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_user_list_and_profile_support_conditional_requests(self):
+        self.client.force_authenticate(self.admin)
+        list_response = self.client.get(reverse('business-users-list'))
+        me_response = self.client.get(reverse('current_user'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.client.get(reverse('business-users-list'), HTTP_IF_NONE_MATCH=list_response['ETag']).status_code,
+                status.HTTP_304_NOT_MODIFIED,
+            )
+        self.assertEqual(
+            self.client.get(reverse('current_user'), HTTP_IF_NONE_MATCH=me_response['ETag']).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        self.viewer.role = UserRole.EDITOR
+        self.viewer.save()
+        self.assertEqual(
+            self.client.get(reverse('business-users-list'), HTTP_IF_NONE_MATCH=list_response['ETag']).status_code,
+            status.HTTP_200_OK,
+        )
+
+    def test_profile_revalidates_when_its_business_or_custom_role_changes(self):
+        role = BusinessRole.objects.create(business=self.business, name='Packer')
+        self.viewer.custom_role = role
+        self.viewer.save()
+        self.client.force_authenticate(self.viewer)
+
+        def is_fresh(etag):
+            response = self.client.get(reverse('current_user'), HTTP_IF_NONE_MATCH=etag)
+            return response.status_code == status.HTTP_304_NOT_MODIFIED, response['ETag']
+
+        etag = self.client.get(reverse('current_user'))['ETag']
+        self.assertEqual(is_fresh(etag), (True, etag))
+        role.permissions = int(Permission.MANAGE_PRODUCTS)
+        role.save()
+        fresh, etag = is_fresh(etag)
+        self.assertFalse(fresh)
+        self.business.name = 'Umbrella Corporation'
+        self.business.save()
+        fresh, _ = is_fresh(etag)
+        self.assertFalse(fresh)
+
     def test_viewer_cannot_create_user(self):
         self.authenticate('viewer')
         response = self.client.post(
@@ -49,6 +112,94 @@ class BusinessUserManagementTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    @override_settings(AUTH_PASSWORD_HASH_PROCESSES=1)
+    def test_bulk_create_checks_uniqueness_once_per_batch(self):
+        self.admin.email = 'admin@example.com'
+        self.admin.save()
+        self.authenticate('admin')
+        rows = [
+            {'username': 'ada', 'email': 'ada@example.com', 'password': 'password123', 'role': UserRole.EDITOR},
+            {'username': 'Admin', 'password': 'password123'},
+            {'username': 'ADA', 'password': 'password123'},
+            {'username': 'grace', 'email': 'ADMIN@example.com', 'password': 'password123'},
+            {'username': 'linus', 'email': 'Ada@Example.com', 'password': 'password123'},
+            {'username': 'ken', 'password': 'short'},
+            {'username': 'barbara', 'password': 'password123', 'role': UserRole.APPROVER},
+        ]
+        # Permissions version, two uniqueness lookups and the insert in a savepoint, whatever the batch size.
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('business-users-bulk-create'), {'users': rows}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 5))
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['created', *['failed'] * 5, 'created'])
+        self.assertEqual(results[1]['errors'], {'username': ['A user with this username already exists.']})
+        self.assertEqual(results[2]['errors'], {'username': ['This username is used by an earlier row of the batch.']})
+        self.assertEqual(results[3]['errors'], {'email': ['A user with this email already exists.']})
+        self.assertEqual(results[4]['errors'], {'email': ['This email is used by an earlier row of the batch.']})
+        self.assertIn('password', results[5]['errors'])
+
+        ada = User.objects.get(pk=results[0]['id'])
+        self.assertEqual((ada.business_id, ada.role), (self.business.id, UserRole.EDITOR))
+        self.assertTrue(ada.check_password('password123'))
+        self.assertEqual(User.objects.get(username='barbara').role, UserRole.APPROVER)
+
+    @override_settings(AUTH_PASSWORD_HASH_PROCESSES=2)
+    def test_bulk_create_hashes_in_a_process_pool(self):
+        self.addCleanup(discard_hash_pool)
+        self.authenticate('admin')
+        rows = [{'username': f'bulk{index}', 'password': f'password-{index}'} for index in range(3)]
+        response = self.client.post(reverse('business-users-bulk-create'), {'users': rows}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        for index in range(3):
+            self.assertTrue(User.objects.get(username=f'bulk{index}').check_password(f'password-{index}'))
+
+    @override_settings(AUTH_PASSWORD_HASH_PROCESSES=1)
+    def test_bulk_create_reports_rows_taken_during_the_insert(self):
+        self.authenticate('admin')
+        insert = BulkUserCreator.insert
+
+        def insert_after_a_racing_signup(creator, users):
+            if not User.objects.filter(username='ada').exists():
+                User.objects.create_user(username='ada', password='password123')
+            insert(creator, users)
+
+        rows = [{'username': 'ada', 'password': 'password123'}, {'username': 'grace', 'password': 'password123'}]
+        with mock.patch.object(BulkUserCreator, 'insert', insert_after_a_racing_signup):
+            response = self.client.post(reverse('business-users-bulk-create'), {'users': rows}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result['status'] for result in response.data['results']], ['failed', 'created'])
+        self.assertEqual(
+            response.data['results'][0]['errors'], {'username': ['A user with this username already exists.']}
+        )
+
+        # A clash the uniqueness lookups miss is found by inserting the rows one at a time.
+        rows = [{'username': 'grace', 'password': 'password123'}, {'username': 'linus', 'password': 'password123'}]
+        with mock.patch.object(BulkUserCreator, 'reject_duplicates', lambda creator, pending: pending):
+            response = self.client.post(reverse('business-users-bulk-create'), {'users': rows}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result['status'] for result in response.data['results']], ['failed', 'created'])
+        self.assertEqual(
+            response.data['results'][0]['errors'], {'non_field_errors': ['This row conflicts with an existing user.']}
+        )
+        self.assertTrue(User.objects.filter(username='linus').exists())
+
+    def test_bulk_create_rejections(self):
+        self.authenticate('viewer')
+        rows = [{'username': 'nope', 'password': 'password123'}]
+        response = self.client.post(reverse('business-users-bulk-create'), {'users': rows}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate('admin')
+        rows = [{'username': 'viewer', 'password': 'password123'}]
+        response = self.client.post(reverse('business-users-bulk-create'), {'users': rows}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 0)
+        with override_settings(AUTH_BULK_CREATE_MAX_USERS=1):
+            response = self.client.post(reverse('business-users-bulk-create'), {'users': rows * 2}, format='json')
+        self.assertIn('users', response.data)
+
 
 class BusinessAdminSignupTests(APITestCase):
     def test_signup_creates_business_and_admin(self):
@@ -123,3 +274,311 @@ class BusinessAdminSignupTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('email', response.data)
+
+    def signup(self, **overrides):
+        data = {
+            'business_name': 'FreshBiz',
+            'username': 'fresh_admin',
+            'email': 'fresh@example.com',
+            'first_name': 'Fresh',
+            'last_name': 'Admin',
+            'password': 'password123',
+            **overrides,
+        }
+        return self.client.post(reverse('business_admin_signup'), data, format='json')
+
+    def test_signup_uniqueness_ignores_case(self):
+        User.objects.create_user(username='Existing_Admin', email='Existing@Example.com', password='password123')
+        Business.objects.create(name='Acme')
+
+        with self.assertNumQueries(3):
+            response = self.signup(business_name='ACME', username='existing_admin', email='existing@example.COM')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'business_name', 'username', 'email'})
+
+    def test_unique_indexes_decide_between_racing_signups(self):
+        self.assertEqual(self.signup(email='').status_code, status.HTTP_201_CREATED)
+        # Blank emails are not unique.
+        self.assertEqual(self.signup(business_name='Other', username='other', email='').status_code, 201)
+
+        # Both requests passed validation before either wrote: the constraint rejects the second one.
+        with mock.patch('apps.accounts.serializers.is_taken', return_value=False):
+            response = self.signup(business_name='Third', username='FRESH_ADMIN')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'username': ['A user with this username already exists.']})
+        self.assertFalse(Business.objects.filter(name='Third').exists())
+
+        with mock.patch('apps.accounts.serializers.is_taken', return_value=False):
+            response = self.signup(business_name='freshbiz', username='fourth')
+        self.assertEqual(response.data, {'business_name': ['Business name already exists.']})
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Query plan assertions target SQLite EXPLAIN QUERY PLAN.')
+    def test_uniqueness_lookups_use_the_lower_indexes(self):
+        from apps.accounts.serializers import is_taken
+
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            is_taken(User, 'username', 'Somebody')
+            is_taken(User, 'email', 'somebody@example.com')
+            is_taken(Business, 'name', 'Somewhere')
+
+        plans = []
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plans.append(' '.join(row[-1] for row in cursor.fetchall()))
+        for plan, index_name in zip(
+            plans, ['accounts_user_username_ci_uniq', 'accounts_user_email_ci_uniq', 'accounts_business_name_ci_uniq']
+        ):
+            self.assertIn(f'USING INDEX {index_name}', plan)
+
+
+class TokenClaimsAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Umbrella Corp')
+        self.admin = User.objects.create_user(
+            username='admin', password='password123', business=self.business, role=UserRole.ADMIN
+        )
+        self.viewer = User.objects.create_user(
+            username='viewer', password='password123', business=self.business, role=UserRole.VIEWER
+        )
+
+    def login(self, username: str) -> dict:
+        return self.client.post(
+            reverse('token_obtain_pair'), {'username': username, 'password': 'password123'}, format='json'
+        ).data
+
+    def test_authenticated_requests_do_not_load_the_user(self):
+        tokens = self.login('admin')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        me = self.client.get(reverse('current_user'))
+        self.assertEqual(me.data['role'], UserRole.ADMIN)
+        self.assertEqual(me.data['business']['name'], 'Umbrella Corp')
+
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('token_logout'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.client.get(reverse('current_user')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        refresh = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(refresh.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_invalidates_tokens_until_refresh(self):
+        viewer_tokens = self.login('viewer')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {viewer_tokens['access']}")
+        self.assertEqual(self.client.get(reverse('current_user')).status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login('admin')['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('business-users-detail', args=[self.viewer.id]), {'role': UserRole.EDITOR}, format='json'
+            )
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {viewer_tokens['access']}")
+        self.assertEqual(self.client.get(reverse('current_user')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials()
+        access = self.client.post(reverse('token_refresh'), {'refresh': viewer_tokens['refresh']}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access.data['access']}")
+        self.assertEqual(self.client.get(reverse('current_user')).data['role'], UserRole.EDITOR)
+
+    def test_async_profile_matches_sync_view(self):
+        headers = {'Authorization': f"Bearer {self.login('admin')['access']}"}
+        sync_response = self.client.get(reverse('current_user'), headers=headers)
+
+        with override_settings(ROOT_URLCONF=__name__):
+            get = async_to_sync(self.async_client.get)
+            response = get(reverse('current_user'), headers=headers)
+            self.assertEqual(response.content, sync_response.content)
+            self.assertEqual(response['ETag'], sync_response['ETag'])
+            not_modified = get(reverse('current_user'), headers={**headers, 'If-None-Match': response['ETag']})
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            anonymous = get(reverse('current_user'))
+            self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(anonymous['WWW-Authenticate'], 'Bearer realm="api"')
+            self.assertEqual(get(reverse('current_user'), headers={'Authorization': 'Bearer junk'}).status_code, 401)
+
+    def test_deleted_user_token_is_rejected(self):
+        viewer_tokens = self.login('viewer')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login('admin')['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('business-users-detail', args=[self.viewer.id]))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {viewer_tokens['access']}")
+        self.assertEqual(self.client.get(reverse('current_user')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BusinessRoleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Umbrella Corp')
+        self.admin = User.objects.create_user(
+            username='admin', password='password123', business=self.business, role=UserRole.ADMIN
+        )
+        self.viewer = User.objects.create_user(
+            username='viewer', password='password123', business=self.business, role=UserRole.VIEWER
+        )
+        self.product = Product.objects.create(
+            business=self.business,
+            created_by=self.admin,
+            name='Umbrella',
+            price='10.00',
+            status=ProductStatus.PENDING_APPROVAL,
+        )
+
+    def use_token(self, username: str):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': username, 'password': 'password123'}, format='json'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data['access']
+
+    def as_admin(self, method: str, url: str, data=None):
+        self.use_token('admin')
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(url, data, format='json')
+
+    def test_built_in_roles_are_bitmasks(self):
+        self.assertEqual(ROLE_PERMISSIONS[UserRole.APPROVER], Permission.MANAGE_PRODUCTS | Permission.APPROVE_PRODUCTS)
+        self.assertEqual(ROLE_PERMISSIONS[UserRole.VIEWER], 0)
+        self.assertEqual(
+            self.admin.permissions_map, {'manage_users': True, 'manage_products': True, 'approve_products': True}
+        )
+        self.assertTrue(self.admin.has_permissions(Permission.MANAGE_USERS | Permission.APPROVE_PRODUCTS))
+        self.assertFalse(self.viewer.can_manage_products())
+        self.viewer.custom_role = BusinessRole.objects.create(
+            business=self.business, name='Packer', permissions=Permission.MANAGE_PRODUCTS
+        )
+        self.assertEqual(
+            self.viewer.permissions_map, {'manage_users': False, 'manage_products': True, 'approve_products': False}
+        )
+
+    def test_custom_role_permissions_travel_in_the_token(self):
+        data = {'name': 'Catalogue approver', 'permissions': ['approve_products']}
+        role = self.as_admin('post', reverse('business-roles-list'), data)
+        self.assertEqual(role.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(role.data['permissions'], ['approve_products'])
+        viewer_url = reverse('business-users-detail', args=[self.viewer.id])
+        self.as_admin('patch', viewer_url, {'custom_role': role.data['id']})
+
+        token = self.use_token('viewer')
+        self.assertEqual(self.client.get(reverse('products-list')).status_code, status.HTTP_403_FORBIDDEN)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('products-list'))
+        response = self.client.post(reverse('products-approve', args=[self.product.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Changing the role's permissions invalidates its users' tokens.
+        url = reverse('business-roles-detail', args=[role.data['id']])
+        self.as_admin('patch', url, {'permissions': ['approve_products', 'manage_products']})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(reverse('products-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.use_token('viewer')
+        self.assertEqual(self.client.get(reverse('products-list')).status_code, status.HTTP_200_OK)
+
+        # Deleting the role puts its users back on their built-in role.
+        self.assertEqual(self.as_admin('delete', url).status_code, status.HTTP_204_NO_CONTENT)
+        self.viewer.refresh_from_db()
+        self.assertIsNone(self.viewer.custom_role_id)
+        self.use_token('viewer')
+        self.assertEqual(self.client.get(reverse('products-list')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_roles_are_validated_and_scoped_to_the_business(self):
+        other = BusinessRole.objects.create(business=Business.objects.create(name='Acme'), name='Other')
+        BusinessRole.objects.create(business=self.business, name='Packer')
+
+        viewer_url = reverse('business-users-detail', args=[self.viewer.id])
+        response = self.as_admin('patch', viewer_url, {'custom_role': other.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('custom_role', response.data)
+
+        response = self.as_admin('post', reverse('business-roles-list'), {'name': 'PACKER ', 'permissions': []})
+        self.assertEqual(response.data, {'name': ['A role with this name already exists.']})
+        response = self.as_admin('post', reverse('business-roles-list'), {'name': 'Boss', 'permissions': ['fly']})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([role['name'] for role in self.client.get(reverse('business-roles-list')).data], ['Packer'])
+
+        self.use_token('viewer')
+        self.assertEqual(self.client.get(reverse('business-roles-list')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_tokens_without_the_permissions_claim_use_the_built_in_role(self):
+        access = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+        del access[PERMISSIONS_CLAIM]
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(reverse('business-users-list')).status_code, status.HTTP_200_OK)
+
+
+class LoginHardeningTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Umbrella Corp')
+        self.viewer = User.objects.create_user(
+            username='viewer', password='password123', business=self.business, role=UserRole.VIEWER
+        )
+
+    def login(self, username: str, password: str = 'password123', **extra):
+        data = {'username': username, 'password': password}
+        return self.client.post(reverse('token_obtain_pair'), data, format='json', **extra)
+
+    def test_legacy_password_hash_is_upgraded_on_login(self):
+        User.objects.filter(pk=self.viewer.pk).update(password=make_password('password123', hasher='pbkdf2_sha256'))
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_200_OK)
+        self.viewer.refresh_from_db()
+        self.assertTrue(self.viewer.password.startswith(f'{get_hasher().algorithm}$'))
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_200_OK)
+
+    @override_settings(AUTH_LOGIN_THROTTLE_RATES={'login_ip': None, 'login_username': '2/min'})
+    def test_username_throttle_rejects_before_hashing(self):
+        self.assertEqual(self.login('viewer', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('Viewer ', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with mock.patch('django.contrib.auth.backends.ModelBackend.authenticate') as authenticate:
+            response = self.login('viewer')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        authenticate.assert_not_called()
+
+        User.objects.create_user(username='other', password='password123', business=self.business)
+        self.assertEqual(self.login('other').status_code, status.HTTP_200_OK)
+
+    @override_settings(AUTH_LOGIN_THROTTLE_RATES={'login_ip': None, 'login_username': '2/min'})
+    def test_username_throttle_counts_failures_from_one_address(self):
+        # Someone guessing from another address does not lock the owner out.
+        for _ in range(2):
+            self.assertEqual(self.login('viewer', 'wrong', REMOTE_ADDR='10.0.0.9').status_code, 401)
+        self.assertEqual(self.login('viewer', REMOTE_ADDR='10.0.0.9').status_code, 429)
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_200_OK)
+
+        # Successful logins are not counted, and one clears the earlier failures.
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('viewer', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('viewer', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_200_OK)
+
+    @override_settings(AUTH_LOGIN_THROTTLE_RATES={'login_ip': '2/min', 'login_username': None})
+    def test_ip_throttle_covers_every_username(self):
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('nobody').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('viewer', REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_200_OK)
+
+    @override_settings(AUTH_LOGIN_CONCURRENCY=1, AUTH_LOGIN_QUEUE_TIMEOUT=0)
+    def test_login_is_refused_while_every_slot_is_busy(self):
+        slots = login_slots(1)
+        slots.acquire()
+        try:
+            response = self.login('viewer')
+        finally:
+            slots.release()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.login('viewer').status_code, status.HTTP_200_OK)
@@ -0,0 +1,89 @@
+import contextlib
+import functools
+import hashlib
+import threading
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import SimpleRateThrottle
+
+from .authentication import get_auth_cache
+
+
+class LoginRateThrottle(SimpleRateThrottle):
+    # Throttles run in APIView.initial(), before the serializer authenticates, so a rejected attempt costs one cache
+    # round trip instead of a password hash.
+    @property
+    def cache(self):
+        return get_auth_cache()
+
+    def get_rate(self):
+        return settings.AUTH_LOGIN_THROTTLE_RATES[self.scope]
+
+
+class LoginIPRateThrottle(LoginRateThrottle):
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginUsernameRateThrottle(LoginRateThrottle):
+    # Caps failed guesses against one account from one address. Only failures count and a successful login clears
+    # them, and keying on the address too means someone guessing a username cannot lock its owner out elsewhere;
+    # LoginIPRateThrottle bounds each address across usernames.
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str) or not username:
+            return None
+        ident = hashlib.sha256(f'{username.strip().casefold()}\0{self.get_ident(request)}'.encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        # Checks the failures recorded so far without adding this attempt; record_failure() does that.
+        if self.rate is None or (key := self.get_cache_key(request, view)) is None:
+            return True
+        self.key, self.now = key, self.timer()
+        self.history = [moment for moment in self.cache.get(key, []) if moment > self.now - self.duration]
+        if len(self.history) >= self.num_requests:
+            return self.throttle_failure()
+        return True
+
+    def record_failure(self, request, view):
+        if self.rate is None or (key := self.get_cache_key(request, view)) is None:
+            return
+        now = self.timer()
+        history = [moment for moment in self.cache.get(key, []) if moment > now - self.duration]
+        self.cache.set(key, [now, *history], self.duration)
+
+    def reset(self, request, view):
+        if self.rate is not None and (key := self.get_cache_key(request, view)) is not None:
+            self.cache.delete(key)
+
+
+class LoginBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins in progress, try again shortly.'
+    default_code = 'login_busy'
+    # DRF's exception handler turns `wait` into a Retry-After header.
+    wait = 1
+
+
+@functools.lru_cache(maxsize=1)
+def login_slots(size: int) -> threading.BoundedSemaphore:
+    return threading.BoundedSemaphore(size)
+
+
+@contextlib.contextmanager
+def login_slot():
+    # Bounds the request threads of this process that can hash passwords at once.
+    slots = login_slots(settings.AUTH_LOGIN_CONCURRENCY)
+    if not slots.acquire(timeout=settings.AUTH_LOGIN_QUEUE_TIMEOUT):
+        raise LoginBusy()
+    try:
+        yield
+    finally:
+        slots.release()
@@ -1,23 +1,101 @@
-from rest_framework import mixins, status, viewsets
+from django.db import transaction
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.generics import CreateAPIView, RetrieveAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .models import User
-from .permissions import IsBusinessUserManager
+from apps.core.conditional import ConditionalResponseMixin
+
+from .authentication import (
+    bump_permissions_version,
+    bump_permissions_versions,
+    forget_permissions_version,
+    revoke_token,
+)
+from .bulk import BulkUserCreator
+from .models import BusinessRole, Permission, User
+from .permissions import HasActionPermissions
 from .serializers import (
+    BulkUserCreateSerializer,
     BusinessAdminSignupSerializer,
+    BusinessRoleSerializer,
     UserCreateSerializer,
     UserSerializer,
 )
+from .throttling import LoginIPRateThrottle, LoginUsernameRateThrottle, login_slot
+
+
+class CurrentUserValidatorsMixin(ConditionalResponseMixin):
+    # The profile embeds the business and carries the role, whose permissions a custom role may change without
+    # touching the user row, so their versions are part of the validators too.
+    profile_validator_fields = (
+        'business_id',
+        'permissions_version',
+        'updated_at',
+        'business__updated_at',
+        'custom_role__updated_at',
+    )
 
+    def get_profile_validators(self, business_id, permissions_version, *modified) -> tuple[str, float | None]:
+        last_modified = max((value for value in modified if value is not None), default=None)
+        return self.make_validators([business_id, permissions_version, *modified], last_modified)
 
-class CurrentUserView(RetrieveAPIView):
+
+class CurrentUserView(CurrentUserValidatorsMixin, RetrieveAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return User.objects.select_related('business').get(pk=self.request.user.id)
+
+    def retrieve(self, request, *args, **kwargs):
+        row = User.objects.filter(pk=request.user.id).values_list(*self.profile_validator_fields).first()
+        validators = self.get_profile_validators(*row) if row else None
+        return self.conditional(
+            validators, lambda: super(ConditionalResponseMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+
+class LoginView(TokenObtainPairView):
+    throttle_classes = [LoginIPRateThrottle, LoginUsernameRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        throttle = LoginUsernameRateThrottle()
+        try:
+            with login_slot():
+                response = super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            throttle.record_failure(request, self)
+            raise
+        throttle.reset(request, self)
+        return response
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+
+
+class LogoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens = [request.auth]
+        if serializer.validated_data.get('refresh'):
+            try:
+                tokens.append(RefreshToken(serializer.validated_data['refresh']))
+            except TokenError as exc:
+                return Response({'refresh': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        for token in tokens:
+            revoke_token(token)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class BusinessAdminSignupView(CreateAPIView):
@@ -32,16 +110,18 @@ class BusinessAdminSignupView(CreateAPIView):
 
 
 class BusinessUserViewSet(
+    ConditionalResponseMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet,
 ):
-    permission_classes = [IsAuthenticated, IsBusinessUserManager]
+    permission_classes = [IsAuthenticated, HasActionPermissions]
+    action_permissions = {'*': Permission.MANAGE_USERS}
 
     def get_queryset(self):
-        return User.objects.filter(business=self.request.user.business).order_by('id')
+        return User.objects.filter(business_id=self.request.user.business_id).order_by('id')
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -50,11 +130,63 @@ class BusinessUserViewSet(
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        context['business'] = self.request.user.business
+        context['business_id'] = self.request.user.business_id
         return context
 
+    def perform_update(self, serializer):
+        previous_roles = (serializer.instance.role, serializer.instance.custom_role_id)
+        user = serializer.save()
+        if (user.role, user.custom_role_id) != previous_roles:
+            bump_permissions_version(user.pk)
+
+    def perform_destroy(self, instance):
+        user_id = instance.pk
+        instance.delete()
+        forget_permissions_version(user_id)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk-create')
+    def bulk_create(self, request):
+        serializer = BulkUserCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = BulkUserCreator(business_id=request.user.business_id).run(serializer.validated_data['users'])
+        failed_outright = report['failed'] and not report['created']
+        return Response(report, status=status.HTTP_400_BAD_REQUEST if failed_outright else status.HTTP_201_CREATED)
+
+
+class BusinessRoleViewSet(viewsets.ModelViewSet):
+    serializer_class = BusinessRoleSerializer
+    permission_classes = [IsAuthenticated, HasActionPermissions]
+    action_permissions = {'*': Permission.MANAGE_USERS}
+    pagination_class = None
+
+    def get_queryset(self):
+        return BusinessRole.objects.filter(business_id=self.request.user.business_id).order_by('name', 'id')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['business_id'] = self.request.user.business_id
+        return context
+
+    def perform_create(self, serializer):
+        serializer.save(business_id=self.request.user.business_id)
+
+    def perform_update(self, serializer):
+        # Tokens carry the permission mask; a changed mask must invalidate every token of the role's users.
+        previous_permissions = serializer.instance.permissions
+        with transaction.atomic():
+            role = serializer.save()
+            if role.permissions != previous_permissions:
+                bump_permissions_versions(list(role.users.values_list('pk', flat=True)))
+
+    def perform_destroy(self, instance):
+        # Users of a deleted role fall back to their built-in role.
+        with transaction.atomic():
+            user_ids = list(instance.users.values_list('pk', flat=True))
+            instance.delete()
+            bump_permissions_versions(user_ids)
@@ -0,0 +1,49 @@
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from .renderers import FastJSONRenderer
+
+
+class AsyncAPIView(View):
+    # DRF views are synchronous. This is the subset of APIView that read-only async endpoints need: a DRF Request
+    # for query_params, authenticators exposing `aauthenticate`, permission checks and DRF-shaped error bodies.
+    authentication_classes = ()
+    permission_classes = ()
+    renderer = FastJSONRenderer()
+    www_authenticate_header = 'Bearer realm="api"'
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = Request(request, authenticators=())
+        self.args, self.kwargs = args, kwargs
+        try:
+            await self.perform_authentication(self.request)
+            self.check_permissions(self.request)
+            return await super().dispatch(self.request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def perform_authentication(self, request):
+        for authentication_class in self.authentication_classes:
+            result = await authentication_class().aauthenticate(request)
+            if result is not None:
+                request.user, request.auth = result
+                return
+
+    def check_permissions(self, request):
+        for permission_class in self.permission_classes:
+            if not permission_class().has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+
+    def handle_exception(self, exc):
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(detail, exc.status_code)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = self.www_authenticate_header
+        return response
+
+    def render(self, data, status_code: int = status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), content_type=self.renderer.media_type, status=status_code)
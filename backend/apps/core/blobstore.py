@@ -0,0 +1,37 @@
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, default_storage
+
+
+class ContentAddressedStore:
+    def __init__(self, storage: Storage | None = None, prefix: str = 'blobs'):
+        self.storage = storage or default_storage
+        self.prefix = prefix.strip('/')
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def name_for(self, digest: str, extension: str, variant: str = '') -> str:
+        suffix = f'-{variant}' if variant else ''
+        return f'{self.prefix}/{digest[:2]}/{digest}{suffix}.{extension}'
+
+    def exists(self, name: str) -> bool:
+        return self.storage.exists(name)
+
+    def read(self, name: str) -> bytes:
+        with self.storage.open(name, 'rb') as blob:
+            return blob.read()
+
+    def put(self, name: str, content: bytes) -> str:
+        if self.storage.exists(name):
+            return name
+        saved_name = self.storage.save(name, ContentFile(content))
+        if saved_name != name:
+            # Another writer stored the same content first; keep a single copy.
+            self.storage.delete(saved_name)
+        return name
+
+    def url(self, name: str) -> str:
+        return self.storage.url(name)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource has changed since the version named in If-Match; reload it and try again.'
+    default_code = 'precondition_failed'
+
+
+class EditConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Another change to this resource was saved first; reload it and try again.'
+    default_code = 'edit_conflict'
+
+
+class ConditionalResponseMixin:
+    # Answers If-None-Match / If-Modified-Since from cheap validators (max(updated_at), row count and the request
+    # filters) before any serialization happens.
+    validator_field = 'updated_at'
+    # A version column gives objects strong ETags that lead with it, which If-Match is checked against.
+    version_field = None
+
+    def get_validator_fingerprint(self) -> list:
+        request = self.request
+        user_id = request.user.pk if request.user and request.user.is_authenticated else None
+        return [request.path, sorted(request.query_params.lists()), user_id]
+
+    def make_validators(self, count, last_modified) -> tuple[str, float | None]:
+        fingerprint = [*self.get_validator_fingerprint(), count, last_modified.isoformat() if last_modified else None]
+        digest = hashlib.sha1(json.dumps(fingerprint, default=str).encode()).hexdigest()[:32]
+        return f'W/"{digest}"', last_modified.timestamp() if last_modified else None
+
+    def get_list_validators(self, queryset) -> tuple[str, float | None]:
+        aggregate = queryset.order_by().aggregate(last_modified=Max(self.validator_field), count=Count('pk'))
+        return self.make_validators(aggregate['count'], aggregate['last_modified'])
+
+    async def aget_list_validators(self, queryset) -> tuple[str, float | None]:
+        aggregate = await queryset.order_by().aaggregate(last_modified=Max(self.validator_field), count=Count('pk'))
+        return self.make_validators(aggregate['count'], aggregate['last_modified'])
+
+    def get_page_validators(self, rows, pk_name: str = 'id') -> tuple[str, float | None]:
+        if rows and isinstance(rows[0], dict):
+            values = [(row[pk_name], row[self.validator_field]) for row in rows]
+        else:
+            values = [(row.pk, getattr(row, self.validator_field)) for row in rows]
+        return self.make_validators([pk for pk, _ in values], max((value for _, value in values), default=None))
+
+    def get_object_validators(self, queryset, pk) -> tuple[str, float | None] | None:
+        fields = [self.validator_field, *([self.version_field] if self.version_field else [])]
+        try:
+            row = queryset.order_by().filter(pk=pk).values_list(*fields).first()
+        except (TypeError, ValueError, ValidationError):
+            return None
+        if row is None:
+            return None
+        if self.version_field:
+            return self.version_etag(row[1], row[0]), row[0].timestamp()
+        return self.make_validators(pk, row[0])
+
+    def version_etag(self, version, last_modified) -> str:
+        # "<version>.<modified>": GET caches see every change, while If-Match only compares the version, so writes
+        # that do not bump it (derived fields such as thumbnails) do not fail the next edit.
+        return f'"{version}.{round(last_modified.timestamp() * 1_000_000)}"'
+
+    def check_if_match(self, version):
+        # Strong ETags only, as RFC 9110 requires for If-Match; a match needs the current version (or *).
+        header = self.request.headers.get('If-Match')
+        if header is None:
+            return
+        etags = parse_etags(header)
+        versions = {etag.strip('"').partition('.')[0] for etag in etags if etag.startswith('"')}
+        if '*' not in etags and str(version) not in versions:
+            raise PreconditionFailed()
+
+    def with_version_etag(self, response):
+        last_modified = parse_datetime(response.data[self.validator_field])
+        response['ETag'] = self.version_etag(response.data[self.version_field], last_modified)
+        return response
+
+    def get_not_modified_response(self, etag, last_modified):
+        return get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        is_authenticated = bool(self.request.user and self.request.user.is_authenticated)
+        patch_cache_control(response, no_cache=True, private=is_authenticated)
+        return response
+
+    def conditional(self, validators, render):
+        if validators is None:
+            return render()
+        etag, last_modified = validators
+        not_modified = self.get_not_modified_response(etag, last_modified)
+        if not_modified is not None:
+            return self.set_validators(not_modified, etag, last_modified)
+        return self.set_validators(render(), etag, last_modified)
+
+    def counts_rows(self) -> bool:
+        include_count = getattr(self.paginator, 'include_count', None)
+        return include_count is None or include_count(self.request)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        self.validators = None
+        # An aggregate over the whole result set costs as much as the COUNT(*) a client may have opted out of; in
+        # that case validate against the rows of the requested page instead.
+        if self.counts_rows():
+            self.validators = self.get_list_validators(queryset)
+            not_modified = self.get_not_modified_response(*self.validators)
+            if not_modified is not None:
+                return self.set_validators(not_modified, *self.validators)
+
+        rows_queryset = self.get_list_rows_queryset(queryset)
+        page = self.paginate_queryset(rows_queryset)
+        rows = page if page is not None else list(rows_queryset)
+        if self.validators is None:
+            self.validators = self.get_page_validators(rows, queryset.model._meta.pk.attname)
+            not_modified = self.get_not_modified_response(*self.validators)
+            if not_modified is not None:
+                return self.set_validators(not_modified, *self.validators)
+
+        data = self.serialize_list(rows)
+        response = self.get_paginated_response(data) if page is not None else Response(data)
+        return self.set_validators(response, *self.validators)
+
+    def get_list_rows_queryset(self, queryset):
+        return queryset
+
+    def serialize_list(self, rows):
+        return self.get_serializer(rows, many=True).data
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        validators = self.get_object_validators(self.filter_queryset(self.get_queryset()), kwargs[lookup_url_kwarg])
+        return self.conditional(
+            validators, lambda: super(ConditionalResponseMixin, self).retrieve(request, *args, **kwargs)
+        )
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.core.replicas import copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = 'Copy a SQLite `default` onto the SQLite DATABASE_REPLICAS; a local stand-in for replication.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='repeat every N seconds (0 copies once)')
+
+    def handle(self, *args, interval=0, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError("Only a SQLite primary can be copied; use the database's own replication.")
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if connections[alias].vendor == 'sqlite']
+        if not replicas:
+            raise CommandError('No SQLite replicas are configured in DJANGO_DATABASE_REPLICAS.')
+        while True:
+            for alias in replicas:
+                copy_sqlite_database(DEFAULT_DB_ALIAS, alias)
+                self.stdout.write(f'Copied {DEFAULT_DB_ALIAS} to {alias}.')
+            if interval <= 0:
+                return
+            time.sleep(interval)
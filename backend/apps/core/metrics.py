@@ -0,0 +1,275 @@
+import bisect
+import contextlib
+import logging
+import random
+import threading
+import time
+from collections import Counter as TallyCounter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, registry, name: str, documentation: str, label_names=()):
+        self.lock = registry.lock
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.series = {}
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            series = sorted((labels, self.snapshot(value)) for labels, value in self.series.items())
+        for labels, value in series:
+            lines += self.render_series(labels, value)
+        return lines
+
+
+class CounterMetric(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def snapshot(self, value):
+        return value
+
+    def render_series(self, labels, value):
+        return [f'{self.name}{format_labels(self.label_names, labels)} {format_value(value)}']
+
+
+class HistogramMetric(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self, value):
+        return list(value[0]), value[1]
+
+    def render_series(self, labels, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip([*self.buckets, '+Inf'], counts):
+            cumulative += count
+            le = format_labels(self.label_names, labels, f'le="{bound}"')
+            lines.append(f'{self.name}_bucket{le} {cumulative}')
+        label_text = format_labels(self.label_names, labels)
+        lines.append(f'{self.name}_sum{label_text} {format_value(total)}')
+        lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    # Process-local metrics. Buckets are cumulative counters as Prometheus expects; windows (rolling p95 etc.) come
+    # from rate()/histogram_quantile() over the scraped series.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, documentation, label_names=()) -> CounterMetric:
+        metric = CounterMetric(self, name, documentation, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS) -> HistogramMetric:
+        metric = HistogramMetric(self, name, documentation, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        # `collector()` returns (name, kind, documentation, value) tuples read at scrape time.
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collector in self.collectors:
+            for name, kind, documentation, value in collector():
+                lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}', f'{name} {format_value(value)}']
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+ENDPOINT_LABELS = ('endpoint', 'method')
+requests_total = registry.counter(
+    'http_requests_total', 'Requests handled, by URL name, method and status.', (*ENDPOINT_LABELS, 'status')
+)
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Wall time spent in Django per request.', ENDPOINT_LABELS
+)
+response_size = registry.histogram(
+    'http_response_size_bytes', 'Size of non-streaming response bodies.', ENDPOINT_LABELS, SIZE_BUCKETS
+)
+sampled_total = registry.counter(
+    'http_requests_sampled_total', 'Requests whose database activity was recorded.', ENDPOINT_LABELS
+)
+db_duration = registry.histogram(
+    'http_request_db_duration_seconds', 'Time spent executing SQL per sampled request.', ENDPOINT_LABELS
+)
+query_count = registry.histogram(
+    'http_request_queries', 'SQL statements per sampled request.', ENDPOINT_LABELS, QUERY_BUCKETS
+)
+duplicate_queries_total = registry.counter(
+    'http_duplicate_queries_total',
+    'Statements that repeated SQL already run in the same sampled request (N+1 candidates).',
+    ENDPOINT_LABELS,
+)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = TallyCounter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self) -> int:
+        return sum(count - 1 for count in self.statements.values())
+
+
+def endpoint_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route or 'unnamed'
+
+
+class RequestMetricsMiddleware:
+    # Every request updates the request counter, latency and size histograms; a sampled fraction also wraps the
+    # database connections to time SQL, count statements and spot repeated statements.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        recorder = self.get_recorder()
+        started = time.perf_counter()
+        with self.wrap_connections(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - started, recorder)
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        recorder = self.get_recorder()
+        started = time.perf_counter()
+        # Async ORM calls run in the request's sync thread, so the wrappers are installed on that thread's connections.
+        wrappers = await sync_to_async(self.wrap_connections)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+        return self.finish(request, response, time.perf_counter() - started, recorder)
+
+    def get_recorder(self) -> QueryRecorder | None:
+        sampled = settings.METRICS_SAMPLE_RATE >= 1 or random.random() < settings.METRICS_SAMPLE_RATE
+        return QueryRecorder() if sampled else None
+
+    def wrap_connections(self, recorder) -> contextlib.ExitStack:
+        stack = contextlib.ExitStack()
+        if recorder is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def finish(self, request, response, elapsed: float, recorder):
+        labels = (endpoint_name(request), request.method)
+        requests_total.inc((*labels, str(response.status_code)))
+        request_duration.observe(labels, elapsed)
+        if not response.streaming:
+            response_size.observe(labels, len(response.content))
+        if recorder is not None:
+            self.record_queries(labels, recorder)
+            if settings.METRICS_SERVER_TIMING:
+                response['Server-Timing'] = ', '.join(
+                    [
+                        f'app;dur={elapsed * 1000:.1f}',
+                        f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+                    ]
+                )
+        return response
+
+    def record_queries(self, labels, recorder):
+        sampled_total.inc(labels)
+        db_duration.observe(labels, recorder.duration)
+        query_count.observe(labels, recorder.count)
+        if recorder.duplicates:
+            duplicate_queries_total.inc(labels, recorder.duplicates)
+            sql, repeats = recorder.statements.most_common(1)[0]
+            if repeats >= settings.METRICS_DUPLICATE_QUERY_THRESHOLD:
+                logger.warning('%s %s ran the same statement %d times: %.200s', labels[1], labels[0], repeats, sql)
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        # Route names and latencies are not public: without a token the endpoint only exists in DEBUG.
+        if not settings.DEBUG:
+            raise Http404()
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,200 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Seeks past the last row's (ordering..., pk) values instead of using OFFSET, so deep pages cost the
+    # same as the first one. Keeps the PageNumberPagination envelope; `?count=false` skips the COUNT(*).
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.prepare(queryset, request)
+        self.count = self.get_count(queryset, request, view)
+        rows = list(self.get_page_queryset(queryset))
+        return self.build_page(rows)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.prepare(queryset, request)
+        self.count = self.get_count(queryset, request, view, count_rows=False)
+        if self.count is None and self.include_count(request):
+            self.count = await queryset.acount()
+        rows = [row async for row in self.get_page_queryset(queryset)]
+        return self.build_page(rows)
+
+    def prepare(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model_meta = queryset.model._meta
+        self.keys = self.get_keys(queryset)
+        self.cursor = self.decode_cursor(request)
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def include_count(self, request) -> bool:
+        return request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0', 'no')
+
+    def get_count(self, queryset, request, view=None, count_rows: bool = True) -> int | None:
+        # A view that already counted the result set (e.g. while computing facets) exposes it as `result_count`.
+        if not self.include_count(request):
+            return None
+        known = getattr(view, 'result_count', None)
+        if known is not None or not count_rows:
+            return known
+        return queryset.count()
+
+    def get_keys(self, queryset) -> list[tuple[str, bool]]:
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        keys = []
+        for item in ordering:
+            if not isinstance(item, str):
+                raise ImproperlyConfigured('KeysetPagination only supports orderings by field or annotation name.')
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            keys.append((queryset.model._meta.pk.attname if name == 'pk' else name, descending))
+
+        pk_name = queryset.model._meta.pk.attname
+        if pk_name not in [name for name, _ in keys]:
+            keys.append((pk_name, keys[-1][1] if keys else False))
+        return keys
+
+    def get_page_queryset(self, queryset):
+        reverse = bool(self.cursor and self.cursor['reverse'])
+        queryset = queryset.order_by(
+            *[('-' if descending != reverse else '') + name for name, descending in self.keys]
+        )
+        if self.cursor:
+            queryset = queryset.filter(self.seek_condition(self.cursor['values'], reverse))
+        return queryset[: self.page_size + 1]
+
+    def seek_condition(self, values, reverse: bool) -> Q:
+        condition = Q()
+        for index, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending != reverse else 'gt'
+            branch = Q(**{f'{name}__{lookup}': values[index]})
+            for previous_index in range(index):
+                branch &= Q(**{self.keys[previous_index][0]: values[previous_index]})
+            condition |= branch
+
+        # Bound the leading column as well so the planner can turn the seek into an index range scan.
+        leading_name, leading_descending = self.keys[0]
+        leading_lookup = 'lte' if leading_descending != reverse else 'gte'
+        return Q(**{f'{leading_name}__{leading_lookup}': values[0]}) & condition
+
+    def build_page(self, rows):
+        reverse = bool(self.cursor and self.cursor['reverse'])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = bool(rows), has_more
+        else:
+            has_next, has_previous = has_more, self.cursor is not None
+
+        self.next_values = self.row_values(rows[-1]) if has_next and rows else None
+        self.previous_values = self.row_values(rows[0]) if has_previous and rows else None
+        return rows
+
+    def row_values(self, row) -> list:
+        if isinstance(row, dict):
+            return [row[name] for name, _ in self.keys]
+        return [getattr(row, name) for name, _ in self.keys]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values = payload['v']
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                raise ValueError
+            return {
+                'values': [self.to_python(name, value) for (name, _), value in zip(self.keys, values)],
+                'reverse': bool(payload.get('r')),
+            }
+        except (binascii.Error, ValueError, TypeError, KeyError, UnicodeEncodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, values, reverse: bool = False) -> str:
+        payload = {'v': [self.to_primitive(value) for value in values]}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def to_python(self, name: str, value):
+        try:
+            field = self.model_meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    @staticmethod
+    def to_primitive(value):
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        return self.encode_cursor(self.next_values)
+
+    def get_previous_link(self):
+        if self.previous_values is None:
+            return None
+        return self.encode_cursor(self.previous_values, reverse=True)
+
+    def get_paginated_data(self, data) -> OrderedDict:
+        return OrderedDict(
+            [
+                ('count', self.count),
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data),
+            ]
+        )
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['count', 'results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
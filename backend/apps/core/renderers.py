@@ -0,0 +1,36 @@
+import importlib.util
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+HAS_ORJSON = importlib.util.find_spec('orjson') is not None
+
+if HAS_ORJSON:
+    import orjson
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Encodes with orjson when it is installed and falls back to the stock renderer otherwise. Datetimes and other
+    # non-native types still go through DRF's JSONEncoder so the bytes match JSONRenderer's compact UTF-8 output.
+    orjson_options = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if HAS_ORJSON
+        else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            not HAS_ORJSON
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=self.orjson_options)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same as JSONRenderer: escape the line separators that are valid JSON but not valid JavaScript.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
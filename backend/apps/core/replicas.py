@@ -0,0 +1,125 @@
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_read_replica = contextvars.ContextVar('read_replica', default=None)
+
+
+def current_replica() -> str | None:
+    return _read_replica.get()
+
+
+def read_alias(alias: str) -> str:
+    # Where reads of `alias` go: the request's replica for `default`, unless a transaction is open on the primary.
+    replica = _read_replica.get()
+    if replica is None or alias != DEFAULT_DB_ALIAS or connections[alias].in_atomic_block:
+        return alias
+    return replica
+
+
+def primary_alias(alias: str | None) -> str | None:
+    return DEFAULT_DB_ALIAS if alias in settings.DATABASE_REPLICAS else alias
+
+
+def copy_sqlite_database(source: str, target: str):
+    # The local stand-in for replication: an online backup of one SQLite database onto another.
+    for alias in (source, target):
+        connections[alias].ensure_connection()
+    connections[source].connection.backup(connections[target].connection)
+
+
+class ReplicaRouter:
+    # Writes go to the primary primary_for() picks; reads of `default` go to the replica ReplicaReadMiddleware chose
+    # for the request, if any. Objects loaded from a replica are saved to its primary.
+    def primary_for(self, model, **hints) -> str:
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        return read_alias(self.primary_for(model, **hints))
+
+    def db_for_write(self, model, **hints):
+        return self.primary_for(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if primary_alias(obj1._state.db) == primary_alias(obj2._state.db):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def sticky_signer() -> signing.TimestampSigner:
+    return signing.TimestampSigner(salt='apps.core.replicas.sticky')
+
+
+class ReplicaReadMiddleware:
+    # Safe-method requests read `default` from one of DATABASE_REPLICAS. A successful write hands the client a signed,
+    # timestamped token that keeps its reads on the primary for DATABASE_REPLICA_STICKY_SECONDS, so its author sees
+    # the change right away while the replicas catch up. Browsers get it as a cookie; API clients on another origin,
+    # which do not send cookies, echo the DATABASE_REPLICA_STICKY_HEADER response header on their next requests.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _read_replica.set(self.choose_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_replica.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = _read_replica.set(self.choose_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_replica.reset(token)
+        return self.finish(request, response)
+
+    def choose_replica(self, request) -> str | None:
+        if not settings.DATABASE_REPLICAS or request.method not in SAFE_METHODS:
+            return None
+        if self.is_sticky(request):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def is_sticky(self, request) -> bool:
+        token = request.headers.get(settings.DATABASE_REPLICA_STICKY_HEADER) or request.COOKIES.get(
+            settings.DATABASE_REPLICA_STICKY_COOKIE
+        )
+        if not token:
+            return False
+        try:
+            sticky_signer().unsign(token, max_age=settings.DATABASE_REPLICA_STICKY_SECONDS)
+        except signing.BadSignature:
+            return False
+        return True
+
+    def finish(self, request, response):
+        # Rejected and failed requests wrote nothing, so they do not move the client off the replicas.
+        if settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400:
+            token = sticky_signer().sign('primary')
+            response[settings.DATABASE_REPLICA_STICKY_HEADER] = token
+            response.set_cookie(
+                settings.DATABASE_REPLICA_STICKY_COOKIE,
+                token,
+                max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
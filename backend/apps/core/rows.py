@@ -0,0 +1,51 @@
+from rest_framework import serializers
+
+
+class RowSerializer:
+    # Serializes `.values()` rows with the output of a ModelSerializer, minus its per-row field machinery: the
+    # serializer's fields are resolved once into (key, lookup, formatter) extractors. Fields whose representation of
+    # a non-null value is the value itself get no formatter; related fields read a joined column via `lookups`.
+    passthrough_fields = (
+        serializers.CharField,
+        serializers.IntegerField,
+        serializers.BooleanField,
+        serializers.ChoiceField,
+        serializers.ReadOnlyField,
+    )
+
+    def __init__(self, serializer_class, lookups: dict[str, str] | None = None):
+        lookups = lookups or {}
+        self.extractors = []
+        for key, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            lookup = lookups.get(key, field.source.replace('.', '__'))
+            if key in lookups or isinstance(field, self.passthrough_fields):
+                formatter = None
+            else:
+                formatter = field.to_representation
+            self.extractors.append((key, lookup, formatter))
+        self.lookups = [lookup for _, lookup, _ in self.extractors]
+
+    def to_representation(self, row: dict) -> dict:
+        data = {}
+        for key, lookup, formatter in self.extractors:
+            value = row[lookup]
+            data[key] = formatter(value) if formatter is not None and value is not None else value
+        return data
+
+    def serialize(self, rows) -> list[dict]:
+        return [self.to_representation(row) for row in rows]
+
+
+class RowSerializerMixin:
+    # List actions fetch `.values()` rows and serialize them with `row_serializer` instead of model instances.
+    row_serializer: RowSerializer = None
+
+    def get_list_rows_queryset(self, queryset):
+        ordering = [name.lstrip('-') for name in queryset.query.order_by or queryset.model._meta.ordering]
+        extra = [queryset.model._meta.pk.attname, self.validator_field, *ordering, *queryset.query.annotations]
+        return queryset.values(*dict.fromkeys([*self.row_serializer.lookups, *extra]))
+
+    def serialize_list(self, rows):
+        return self.row_serializer.serialize(rows)
@@ -0,0 +1,50 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.jobs.worker import Worker
+
+
+def run_worker(threads: int, burst: bool):
+    # Entry point of each child process started with --processes.
+    worker = Worker(threads=threads)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(burst=burst)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue until stopped (SIGTERM/SIGINT finish the running jobs).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='jobs run concurrently per process')
+        parser.add_argument('--processes', type=int, default=1, help='worker processes to start')
+        parser.add_argument('--burst', action='store_true', help='exit once no due jobs are left')
+
+    def handle(self, *args, threads=4, processes=1, burst=False, **options):
+        if processes <= 1:
+            worker = Worker(threads=threads)
+            signal.signal(signal.SIGTERM, worker.stop)
+            signal.signal(signal.SIGINT, worker.stop)
+            processed = worker.run(burst=burst)
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs.'))
+            return
+
+        # Forked children inherit the loaded project but must not share the parent's database connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [context.Process(target=run_worker, args=(threads, burst)) for _ in range(processes)]
+        for child in children:
+            child.start()
+
+        def stop(signum, frame):
+            for child in children:
+                child.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for child in children:
+            child.join()
+        self.stdout.write(self.style.SUCCESS(f'{processes} worker processes stopped.'))
@@ -0,0 +1,37 @@
+from django.db import models
+from django.utils import timezone
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    SUCCEEDED = 'succeeded', 'Succeeded'
+    FAILED = 'failed', 'Failed'
+
+
+class Job(models.Model):
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    # Enqueueing a key that already exists returns the existing job instead of adding another.
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Worker claims: the oldest due queued jobs.
+            models.Index(fields=['run_after', 'id'], condition=models.Q(status='queued'), name='jobs_due_idx'),
+            # Reclaiming jobs whose worker died, and pruning finished jobs.
+            models.Index(fields=['locked_at'], condition=models.Q(status='running'), name='jobs_running_idx'),
+            models.Index(fields=['finished_at'], condition=models.Q(status='succeeded'), name='jobs_succeeded_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.task} #{self.pk} ({self.status})'
@@ -0,0 +1,106 @@
+import logging
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    func: Callable
+    max_attempts: int | None = None
+
+    def get_max_attempts(self) -> int:
+        return self.max_attempts or settings.JOBS_MAX_ATTEMPTS
+
+
+registry: dict[str, Task] = {}
+
+
+class UnknownTask(LookupError):
+    pass
+
+
+def task(name: str, max_attempts: int | None = None):
+    # Registers `func(**payload)` under `name`. Tasks may run more than once (retries, a worker dying mid-job), so
+    # they must be safe to repeat.
+    def decorator(func):
+        registry[name] = Task(name, func, max_attempts)
+        return func
+
+    return decorator
+
+
+def get_task(name: str) -> Task:
+    try:
+        return registry[name]
+    except KeyError:
+        raise UnknownTask(f'No task registered as {name!r}.') from None
+
+
+def enqueue(name: str, payload: dict | None = None, idempotency_key: str | None = None, delay: float = 0) -> Job | None:
+    payload = payload or {}
+    registered = get_task(name)
+    if settings.JOBS_EAGER:
+        # Single-process setups and tests: run now, in the caller. A failure must not fail the caller, whose write has
+        # usually committed already; it is queued as a failed first attempt for `run_jobs` to retry.
+        try:
+            registered.func(**payload)
+        except Exception as exc:
+            return eager_failed(registered, payload, idempotency_key, exc)
+        return None
+
+    fields = {
+        'task': name,
+        'payload': payload,
+        'max_attempts': registered.get_max_attempts(),
+        'run_after': timezone.now() + timedelta(seconds=delay),
+    }
+    if idempotency_key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(idempotency_key=idempotency_key, defaults=fields)
+    return job
+
+
+def eager_failed(registered: Task, payload: dict, idempotency_key: str | None, exc: Exception) -> Job:
+    from .worker import backoff  # worker imports this module
+
+    fields = {
+        'task': registered.name,
+        'payload': payload,
+        'attempts': 1,
+        'max_attempts': registered.get_max_attempts(),
+        'last_error': ''.join(traceback.format_exception(exc)),
+    }
+    if fields['attempts'] < fields['max_attempts']:
+        fields.update(run_after=timezone.now() + timedelta(seconds=backoff(1)))
+        logger.warning('Eager job %s failed, queued for a retry', registered.name, exc_info=exc)
+    else:
+        fields.update(status=JobStatus.FAILED, finished_at=timezone.now())
+        logger.error('Eager job %s failed permanently', registered.name, exc_info=exc)
+    if idempotency_key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(idempotency_key=idempotency_key, defaults=fields)
+    return job
+
+
+def enqueue_on_commit(
+    name: str,
+    payload: dict | None = None,
+    idempotency_key: str | None = None,
+    delay: float = 0,
+    using: str | None = None,
+):
+    # Enqueues once the current transaction on `using` commits, so workers never see a job for a write that rolled
+    # back. The task name is checked now, while the caller can still handle the error.
+    get_task(name)
+    transaction.on_commit(lambda: enqueue(name, payload, idempotency_key=idempotency_key, delay=delay), using=using)
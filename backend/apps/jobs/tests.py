@@ -0,0 +1,164 @@
+import io
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from apps.jobs.models import Job, JobStatus
+from apps.jobs.queue import UnknownTask, enqueue, enqueue_on_commit, task
+from apps.jobs.worker import Worker, backoff, recover_stale_jobs
+
+calls = []
+failures = {}
+
+
+@task('tests.record')
+def record(value=None):
+    calls.append(value)
+
+
+@task('tests.flaky', max_attempts=3)
+def flaky(key):
+    # Fails the first `failures[key]` times it runs.
+    if failures.get(key, 0) > 0:
+        failures[key] -= 1
+        raise RuntimeError(f'{key} is not ready yet')
+    calls.append(key)
+
+
+class JobTestCase(TestCase):
+    def setUp(self):
+        calls.clear()
+        failures.clear()
+
+    def make_due(self):
+        Job.objects.filter(status=JobStatus.QUEUED).update(run_after=timezone.now())
+
+
+class JobQueueTests(JobTestCase):
+    def test_enqueue_on_commit_waits_for_the_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_on_commit('tests.record', {'value': 1})
+            self.assertFalse(Job.objects.exists())
+        self.assertEqual(Job.objects.get().payload, {'value': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    enqueue_on_commit('tests.record', {'value': 2})
+                    raise RuntimeError('roll back')
+            except RuntimeError:
+                pass
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_unknown_tasks_are_rejected_when_enqueued(self):
+        with self.assertRaises(UnknownTask):
+            enqueue_on_commit('tests.missing')
+
+    def test_idempotency_key_returns_the_existing_job(self):
+        first = enqueue('tests.record', {'value': 1}, idempotency_key='record:1')
+        second = enqueue('tests.record', {'value': 1}, idempotency_key='record:1')
+        self.assertEqual(first.pk, second.pk)
+        enqueue('tests.record', {'value': 1})
+        self.assertEqual(Job.objects.count(), 2)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_in_the_caller(self):
+        self.assertIsNone(enqueue('tests.record', {'value': 3}))
+        self.assertEqual(calls, [3])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_EAGER=True, JOBS_RETRY_BASE_DELAY=10)
+    def test_eager_failures_are_queued_for_a_retry(self):
+        failures['owl'] = 1
+        with self.assertLogs('apps.jobs.queue', 'WARNING'):
+            job = enqueue('tests.flaky', {'key': 'owl'})
+        self.assertEqual((job.status, job.attempts), (JobStatus.QUEUED, 1))
+        self.assertIn('owl is not ready yet', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+
+        self.make_due()
+        self.assertEqual(Worker().work_off(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.SUCCEEDED, 2))
+        self.assertEqual(calls, ['owl'])
+
+
+@override_settings(JOBS_RETRY_BASE_DELAY=10, JOBS_RETRY_MAX_DELAY=30)
+class WorkerTests(JobTestCase):
+    def test_runs_due_jobs_in_order(self):
+        for value in range(3):
+            enqueue('tests.record', {'value': value})
+        enqueue('tests.record', {'value': 'later'}, delay=60)
+
+        self.assertEqual(Worker(threads=2).work_off(), 3)
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertEqual(Job.objects.filter(status=JobStatus.SUCCEEDED).count(), 3)
+        self.assertEqual(Job.objects.get(status=JobStatus.QUEUED).payload, {'value': 'later'})
+
+    def test_failed_jobs_retry_with_backoff(self):
+        failures['mouse'] = 2
+        job = enqueue('tests.flaky', {'key': 'mouse'})
+        worker = Worker()
+
+        with self.assertLogs('apps.jobs.worker', 'WARNING'):
+            worker.work_off()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.QUEUED, 1))
+        self.assertIn('mouse is not ready yet', job.last_error)
+        self.assertGreaterEqual(job.run_after, timezone.now() + timedelta(seconds=9))
+        self.assertEqual(worker.work_off(), 0)
+
+        with self.assertLogs('apps.jobs.worker', 'WARNING'):
+            self.make_due()
+            worker.work_off()
+        self.make_due()
+        worker.work_off()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (JobStatus.SUCCEEDED, 3, ''))
+        self.assertEqual(calls, ['mouse'])
+
+    def test_jobs_fail_after_max_attempts(self):
+        failures['lamp'] = 5
+        job = enqueue('tests.flaky', {'key': 'lamp'})
+        with self.assertLogs('apps.jobs.worker', 'WARNING') as logs:
+            for _ in range(3):
+                self.make_due()
+                Worker().work_off()
+        self.assertIn('failed permanently', logs.output[-1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 3))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_grows_and_is_capped(self):
+        self.assertTrue(10 <= backoff(1) <= 12.5)
+        self.assertTrue(20 <= backoff(2) <= 25)
+        self.assertTrue(30 <= backoff(6) <= 37.5)
+
+    @override_settings(JOBS_LOCK_TIMEOUT=60)
+    def test_jobs_of_a_lost_worker_are_requeued(self):
+        job = enqueue('tests.record', {'value': 'lost'})
+        Job.objects.filter(pk=job.pk).update(
+            status=JobStatus.RUNNING, attempts=1, locked_by='gone:1', locked_at=timezone.now() - timedelta(minutes=5)
+        )
+        self.assertEqual(recover_stale_jobs(), 1)
+        Worker().work_off()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.SUCCEEDED, 2))
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_burst_run_drains_the_queue(self):
+        for value in range(5):
+            enqueue('tests.record', {'value': value})
+        output = io.StringIO()
+        # One thread: the in-memory test database locks whole tables against concurrent connections.
+        call_command('run_jobs', threads=1, burst=True, stdout=output)
+        self.assertIn('Processed 5 jobs.', output.getvalue())
+        self.assertEqual(sorted(calls), [0, 1, 2, 3, 4])
+        self.assertFalse(Job.objects.exclude(status=JobStatus.SUCCEEDED).exists())
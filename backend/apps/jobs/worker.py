@@ -0,0 +1,141 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job, JobStatus
+from .queue import UnknownTask, get_task
+
+logger = logging.getLogger(__name__)
+
+
+def backoff(attempts: int) -> float:
+    # Exponential backoff with up to 25% jitter, so jobs that failed together do not retry in lockstep.
+    delay = min(settings.JOBS_RETRY_MAX_DELAY, settings.JOBS_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0))
+    return delay * (1 + random.random() / 4)
+
+
+class Worker:
+    def __init__(self, threads: int = 1, name: str | None = None, poll_interval: float | None = None):
+        self.threads = threads
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = settings.JOBS_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.stopping = threading.Event()
+        self.processed = 0
+        self.processed_lock = threading.Lock()
+        self.last_maintenance = 0.0
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self, burst: bool = False) -> int:
+        # Claims only as many jobs as there are idle threads, so nothing sits locked behind a busy pool. In burst mode
+        # returns once the queue has no due jobs left.
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job') as executor:
+            while not self.stopping.is_set():
+                self.maintain()
+                jobs = self.claim(self.threads - len(running))
+                running.update(executor.submit(self.execute_in_thread, job) for job in jobs)
+                if running:
+                    _, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                elif burst:
+                    break
+                else:
+                    self.stopping.wait(self.poll_interval)
+            wait(running)
+        return self.processed
+
+    def claim(self, limit: int) -> list[Job]:
+        if limit <= 0:
+            return []
+        now = timezone.now()
+        with transaction.atomic():
+            # SKIP LOCKED lets concurrent workers take different jobs on Postgres; SQLite serializes write transactions.
+            due = Job.objects.select_for_update(skip_locked=True).filter(status=JobStatus.QUEUED, run_after__lte=now)
+            ids = list(due.order_by('run_after', 'id').values_list('pk', flat=True)[:limit])
+            if not ids:
+                return []
+            Job.objects.filter(pk__in=ids).update(
+                status=JobStatus.RUNNING, locked_by=self.name, locked_at=now, attempts=F('attempts') + 1
+            )
+        return list(Job.objects.filter(pk__in=ids).order_by('run_after', 'id'))
+
+    def work_off(self) -> int:
+        # Runs every due job in the calling thread and on its connection, e.g. from a cron job or a test.
+        processed = 0
+        while jobs := self.claim(self.threads):
+            for job in jobs:
+                self.execute(job)
+            processed += len(jobs)
+        return processed
+
+    def execute_in_thread(self, job: Job):
+        # Pool threads keep their own connections; drop them if they broke or outlived CONN_MAX_AGE.
+        close_old_connections()
+        try:
+            self.execute(job)
+        except Exception:
+            # The job row could not be updated; it stays running until recover_stale_jobs() requeues it.
+            logger.exception('Job %s (%s) could not be recorded', job.pk, job.task)
+        finally:
+            close_old_connections()
+
+    def execute(self, job: Job):
+        try:
+            get_task(job.task).func(**job.payload)
+        except Exception as exc:
+            self.failed(job, exc)
+        else:
+            Job.objects.filter(pk=job.pk, locked_by=self.name).update(
+                status=JobStatus.SUCCEEDED, finished_at=timezone.now(), locked_at=None, last_error=''
+            )
+        with self.processed_lock:
+            self.processed += 1
+
+    def failed(self, job: Job, exc: Exception):
+        error = ''.join(traceback.format_exception(exc))
+        retry = job.attempts < job.max_attempts and not isinstance(exc, UnknownTask)
+        if retry:
+            run_after = timezone.now() + timedelta(seconds=backoff(job.attempts))
+            changes = {'status': JobStatus.QUEUED, 'run_after': run_after}
+            logger.warning('Job %s (%s) failed on attempt %s, retrying', job.pk, job.task, job.attempts, exc_info=exc)
+        else:
+            changes = {'status': JobStatus.FAILED, 'finished_at': timezone.now()}
+            logger.error('Job %s (%s) failed permanently', job.pk, job.task, exc_info=exc)
+        Job.objects.filter(pk=job.pk, locked_by=self.name).update(**changes, locked_at=None, last_error=error)
+
+    def maintain(self):
+        if time.monotonic() - self.last_maintenance < settings.JOBS_MAINTENANCE_INTERVAL:
+            return
+        self.last_maintenance = time.monotonic()
+        recover_stale_jobs()
+        prune_finished_jobs()
+
+
+def recover_stale_jobs() -> int:
+    # A job still running after JOBS_LOCK_TIMEOUT belonged to a worker that died; hand it to the next claim.
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    stale = Job.objects.filter(status=JobStatus.RUNNING, locked_at__lt=cutoff)
+    exhausted = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=JobStatus.FAILED, finished_at=timezone.now(), locked_at=None, last_error='Worker lost.'
+    )
+    return exhausted + stale.update(status=JobStatus.QUEUED, run_after=timezone.now(), locked_by='', locked_at=None)
+
+
+def prune_finished_jobs() -> int:
+    # Succeeded jobs are kept for JOBS_RETENTION seconds so their idempotency keys keep deduplicating; failed jobs stay
+    # until someone looks at them.
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_RETENTION)
+    deleted, _ = Job.objects.filter(status=JobStatus.SUCCEEDED, finished_at__lt=cutoff).delete()
+    return deleted
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib import admin
 
 from .models import Product
@@ -8,3 +9,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'business', 'status', 'price', 'created_by', 'approved_by')
     list_filter = ('status', 'business')
     search_fields = ('name', 'description')
+
+    def get_queryset(self, request):
+        # The admin has no business context to pick a shard from; it lists the first shard's products.
+        return super().get_queryset(request).using(settings.PRODUCT_SHARDS[0])
@@ -1,6 +1,70 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import post_migrate, post_save, pre_delete
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.products'
+
+    def ready(self):
+        from apps.accounts.models import Business, User
+        from apps.core.metrics import registry
+
+        from . import sharding
+
+        post_migrate.connect(install_search_index, sender=self)
+        post_save.connect(sharding.place_new_business, sender=Business)
+        pre_delete.connect(sharding.delete_sharded_products, sender=Business)
+        pre_delete.connect(sharding.protect_sharded_products, sender=User)
+        registry.register_collector(catalogue_cache_metrics)
+        checks.register(check_stalled_shard_moves, checks.Tags.database)
+
+
+def check_stalled_shard_moves(app_configs=None, databases=None, **kwargs):
+    # A database check, so `migrate` and `check --database default` report moves a crash left unfinished.
+    from django.db import DEFAULT_DB_ALIAS, connections
+
+    from .models import BusinessShard
+    from .sharding import stalled_moves
+
+    if DEFAULT_DB_ALIAS not in (databases or ()):
+        return []
+    if BusinessShard._meta.db_table not in connections[DEFAULT_DB_ALIAS].introspection.table_names():
+        return []
+    return [
+        checks.Warning(
+            f'Business {business_id} is still marked as moving off product shard {alias!r}; its product writes get '
+            f'503 until the move finishes.',
+            hint=f'If no move is running, re-run `manage.py move_business_shard {business_id} <target shard>`.',
+            id='products.W001',
+        )
+        for business_id, alias in stalled_moves()
+    ]
+
+
+def catalogue_cache_metrics():
+    from .cache import catalogue_cache
+
+    documentation = {
+        'hits': 'Public catalogue pages served from cache.',
+        'misses': 'Public catalogue lookups that had to query the database.',
+        'invalidations': 'Catalogue version bumps caused by product writes.',
+    }
+    return [
+        (f'catalogue_cache_{name}_total', 'counter', documentation[name], value)
+        for name, value in catalogue_cache.stats().items()
+    ]
+
+
+def install_search_index(using='default', **kwargs):
+    from django.db import connections
+
+    from .search import SEARCH_INDEXES, get_search_backend
+
+    # SQLite drops the sync triggers whenever a migration rebuilds an indexed table; put them back.
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    for index in SEARCH_INDEXES:
+        if index.table in tables:
+            get_search_backend(connection, index).install(connection)
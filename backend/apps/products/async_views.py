@@ -0,0 +1,58 @@
+from apps.core.async_views import AsyncAPIView
+from apps.core.conditional import ConditionalResponseMixin
+from apps.core.pagination import KeysetPagination
+from apps.core.rows import RowSerializerMixin
+
+from .cache import catalogue_cache
+from .facets import FACET_PARAMS, acompute_facets
+from .serializers import public_product_row_serializer
+from .views import public_product_filters, public_products_queryset, with_facets
+
+
+class AsyncPublicProductListView(RowSerializerMixin, ConditionalResponseMixin, AsyncAPIView):
+    # Async twin of PublicProductListView; both read and fill the same catalogue cache entries.
+    row_serializer = public_product_row_serializer
+    pagination_class = KeysetPagination
+
+    async def get(self, request):
+        filters = public_product_filters(request.query_params)
+        queryset = public_products_queryset(filters)
+        facets = await self.get_facets(queryset, filters) if filters['facets'] else None
+        self.result_count = facets['data']['count'] if facets is not None else None
+        cache_key = await catalogue_cache.amake_key(request)
+        cached = await catalogue_cache.aget(cache_key)
+        if cached is not None:
+            return self.conditional(
+                (cached['etag'], cached['last_modified']), lambda: self.render(with_facets(cached['data'], facets))
+            )
+
+        self.paginator = self.pagination_class()
+        validators = None
+        if facets is not None:
+            validators = self.make_validators(facets['data']['count'], facets['last_modified'])
+        elif self.counts_rows():
+            validators = await self.aget_list_validators(queryset)
+        if validators is not None:
+            not_modified = self.get_not_modified_response(*validators)
+            if not_modified is not None:
+                return self.set_validators(not_modified, *validators)
+
+        rows = await self.paginator.apaginate_queryset(self.get_list_rows_queryset(queryset), request, view=self)
+        if validators is None:
+            validators = self.get_page_validators(rows, queryset.model._meta.pk.attname)
+            not_modified = self.get_not_modified_response(*validators)
+            if not_modified is not None:
+                return self.set_validators(not_modified, *validators)
+
+        data = self.paginator.get_paginated_data(self.serialize_list(rows))
+        etag, last_modified = validators
+        await catalogue_cache.aset(cache_key, {'etag': etag, 'last_modified': last_modified, 'data': data})
+        return self.set_validators(self.render(with_facets(data, facets)), etag, last_modified)
+
+    async def get_facets(self, queryset, filters):
+        cache_key = await catalogue_cache.amake_key(self.request, 'facets', FACET_PARAMS)
+        facets = await catalogue_cache.aget(cache_key)
+        if facets is None:
+            facets = await acompute_facets(queryset, filters)
+            await catalogue_cache.aset(cache_key, facets)
+        return facets
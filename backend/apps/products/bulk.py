@@ -0,0 +1,146 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+from . import catalog, sharding
+from . import stats as product_stats
+from .models import Product, ProductStatus
+from .serializers import ProductSerializer, product_row_serializer, product_rows_serializer, with_usernames
+from .tasks import schedule_thumbnails
+
+IMPORT_COLUMNS = ('name', 'description', 'image_url', 'price', 'status')
+CSV_MEDIA_TYPE = 'text/csv'
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+class RowParseError(ValueError):
+    pass
+
+
+def decode_lines(stream):
+    # Decode lazily so a multi-megabyte upload is never held in memory as one string.
+    return codecs.iterdecode(iter(stream.readline, b''), 'utf-8-sig')
+
+
+def iter_csv_rows(stream):
+    reader = csv.DictReader(decode_lines(stream))
+    try:
+        for row in reader:
+            yield reader.line_num, {column: row[column] for column in IMPORT_COLUMNS if row.get(column) is not None}
+    except (csv.Error, UnicodeDecodeError) as exc:
+        yield reader.line_num + 1, RowParseError(str(exc))
+
+
+def iter_ndjson_rows(stream):
+    line_number = 0
+    try:
+        for line_number, line in enumerate(decode_lines(stream), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, RowParseError(f'Invalid JSON: {exc}')
+                continue
+            if not isinstance(row, dict):
+                yield line_number, RowParseError('Each line must be a JSON object.')
+                continue
+            yield line_number, {column: row[column] for column in IMPORT_COLUMNS if column in row}
+    except UnicodeDecodeError as exc:
+        yield line_number + 1, RowParseError(str(exc))
+
+
+def rows_for_upload(upload):
+    name = (upload.name or '').lower()
+    if name.endswith('.ndjson') or name.endswith('.jsonl') or upload.content_type == NDJSON_MEDIA_TYPE:
+        return iter_ndjson_rows(upload)
+    return iter_csv_rows(upload)
+
+
+class CSVStreamParser(BaseParser):
+    media_type = CSV_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_csv_rows(stream)
+
+
+class NDJSONStreamParser(BaseParser):
+    media_type = NDJSON_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_ndjson_rows(stream)
+
+
+class ProductImporter:
+    def __init__(self, business_id, user_id, batch_size=None, max_errors=None):
+        self.business_id = business_id
+        self.user_id = user_id
+        self.batch_size = batch_size or settings.PRODUCT_IMPORT_BATCH_SIZE
+        self.max_errors = max_errors or settings.PRODUCT_IMPORT_MAX_ERRORS
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows) -> dict:
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.batch_size)):
+            built = [result for result in (self.build(row_number, row) for row_number, row in chunk) if result]
+            products = [product for product, _ in built]
+            with sharding.atomic():
+                Product.objects.bulk_create(products, batch_size=self.batch_size)
+                product_stats.record_created(self.business_id, products)
+                catalog.record_changes(product.pk for product in products if product.status == ProductStatus.APPROVED)
+                for product, stored_image in built:
+                    schedule_thumbnails(product, stored_image)
+            self.created += len(products)
+
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def build(self, row_number, row):
+        if isinstance(row, RowParseError):
+            return self.reject(row_number, {'non_field_errors': [str(row)]})
+        serializer = ProductSerializer(data=row)
+        if not serializer.is_valid():
+            return self.reject(row_number, serializer.errors)
+        product = Product(**serializer.validated_data, business_id=self.business_id, created_by_id=self.user_id)
+        return product, serializer.stored_image
+
+    def reject(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'errors': errors})
+        return None
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset):
+    chunk_size = settings.PRODUCT_EXPORT_CHUNK_SIZE
+    serializer = product_rows_serializer(queryset.db)
+    rows = queryset.values(*serializer.lookups).iterator(chunk_size=chunk_size)
+    while chunk := serializer.serialize(islice(rows, chunk_size)):
+        yield from chunk if serializer is product_row_serializer else with_usernames(chunk)
+
+
+def stream_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow([key for key, _, _ in product_row_serializer.extractors])
+    for row in export_rows(queryset):
+        yield writer.writerow(['' if value is None else value for value in row.values()])
+
+
+def stream_ndjson(queryset):
+    for row in export_rows(queryset):
+        yield json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
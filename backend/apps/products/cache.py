@@ -0,0 +1,141 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from apps.core.replicas import current_replica
+
+
+class CatalogueCache:
+    # Public catalogue pages are cached under a version counter instead of being deleted on writes: pages filtered
+    # by one business embed that business's version, every other page embeds the global version. A product write
+    # bumps both, which orphans exactly the pages it can affect; orphans simply expire.
+    key_params = (
+        'business_id',
+        'search',
+        'min_price',
+        'max_price',
+        'cursor',
+        'page_size',
+        'count',
+        'facets',
+        'price_buckets',
+        'price_edges',
+    )
+
+    def __init__(self, alias: str, timeout: int, prefix: str = 'catalogue'):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version_key(self, business_id=None) -> str:
+        scope = f'business:{business_id}' if business_id is not None else 'global'
+        return f'{self.prefix}:version:{scope}'
+
+    def get_version(self, business_id=None) -> int:
+        key = self.version_key(business_id)
+        version = self.cache.get(key)
+        if version is None:
+            # Seed from the clock so an evicted counter never rewinds onto pages cached under an older value.
+            self.cache.add(key, time.time_ns() // 1000, None)
+            version = self.cache.get(key)
+        return version
+
+    async def aget_version(self, business_id=None) -> int:
+        key = self.version_key(business_id)
+        version = await self.cache.aget(key)
+        if version is None:
+            await self.cache.aadd(key, time.time_ns() // 1000, None)
+            version = await self.cache.aget(key)
+        return version
+
+    def normalize_params(self, query_params, names=None) -> dict[str, str]:
+        normalized = {}
+        for name in names or self.key_params:
+            if name == 'business_id':
+                values = [item.strip() for value in query_params.getlist(name) for item in value.split(',')]
+                value = ','.join(sorted({str(int(item)) if item.isdigit() else item for item in values if item}))
+            else:
+                value = query_params.get(name, '').strip()
+            if not value:
+                continue
+            if name == 'search':
+                value = ' '.join(value.lower().split())
+            normalized[name] = value
+        return normalized
+
+    def version_scope(self, params: dict[str, str]):
+        # Only a single-business filter can rely on that business's version; any wider result uses the global one.
+        business_id = params.get('business_id')
+        return business_id if business_id and ',' not in business_id else None
+
+    def make_key(self, request, kind: str = 'page', names=None) -> str:
+        params = self.normalize_params(request.query_params, names)
+        return self.format_key(request, kind, params, self.get_version(self.version_scope(params)))
+
+    async def amake_key(self, request, kind: str = 'page', names=None) -> str:
+        params = self.normalize_params(request.query_params, names)
+        return self.format_key(request, kind, params, await self.aget_version(self.version_scope(params)))
+
+    def format_key(self, request, kind: str, params: dict[str, str], version: int) -> str:
+        fingerprint = json.dumps([request.scheme, request.get_host(), params], sort_keys=True)
+        digest = hashlib.sha1(fingerprint.encode()).hexdigest()
+        return f'{self.prefix}:{kind}:{version}:{digest}'
+
+    def get(self, key: str):
+        data = self.cache.get(key)
+        self._count('hits' if data is not None else 'misses')
+        return data
+
+    async def aget(self, key: str):
+        data = await self.cache.aget(key)
+        self._count('hits' if data is not None else 'misses')
+        return data
+
+    def fill_timeout(self) -> int:
+        # A replica may not have applied the change behind the latest version bump yet, so its pages are kept briefly.
+        if current_replica() is None:
+            return self.timeout
+        return min(self.timeout, settings.DATABASE_REPLICA_CACHE_TIMEOUT)
+
+    def set(self, key: str, data):
+        self.cache.set(key, data, self.fill_timeout())
+
+    async def aset(self, key: str, data):
+        await self.cache.aset(key, data, self.fill_timeout())
+
+    def invalidate(self, business_ids):
+        for key in {self.version_key(business_id) for business_id in business_ids} | {self.version_key()}:
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, time.time_ns() // 1000, None)
+        self._count('invalidations')
+
+    def invalidate_on_commit(self, business_ids):
+        business_ids = list(business_ids)
+        transaction.on_commit(lambda: self.invalidate(business_ids))
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+
+catalogue_cache = CatalogueCache(
+    alias=settings.PRODUCT_CATALOGUE_CACHE_ALIAS,
+    timeout=settings.PRODUCT_CATALOGUE_CACHE_TIMEOUT,
+)
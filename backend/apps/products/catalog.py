@@ -0,0 +1,91 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.jobs.queue import enqueue_on_commit
+
+from . import sharding
+from .cache import catalogue_cache
+from .models import CatalogOutbox, Product, ProductStatus, PublicCatalogEntry
+
+ENTRY_FIELDS = ('business_id', 'name', 'description', 'image_url', 'thumbnail_url', 'price', 'created_at', 'updated_at')
+
+
+def record_changes(product_ids):
+    # Called inside the transaction that wrote the products, so the outbox rows commit or roll back with the write.
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return
+    CatalogOutbox.objects.bulk_create([CatalogOutbox(product_id=product_id) for product_id in product_ids])
+    enqueue_on_commit('products.publish_catalog', using=sharding.current_shard())
+
+
+def publish_pending(batch_size: int | None = None) -> int:
+    # Runs as the products.publish_catalog job; drains each shard's outbox into the projection in `default`, oldest
+    # change first. Rows a failed publish leaves behind are picked up by the next one or by `manage.py
+    # sync_public_catalog`; applying a change twice is harmless, it copies the product's current state.
+    batch_size = batch_size or settings.PRODUCT_CATALOGUE_PUBLISH_BATCH_SIZE
+    published = 0
+    for alias in settings.PRODUCT_SHARDS:
+        with sharding.use_shard(alias):
+            published += publish_shard(alias, batch_size)
+    return published
+
+
+def publish_shard(alias: str, batch_size: int) -> int:
+    published = 0
+    while True:
+        # The outbox rows stay locked on their shard until the projection write in `default` has committed.
+        with transaction.atomic(using=alias), transaction.atomic():
+            pending = CatalogOutbox.objects.select_for_update().order_by('pk')
+            events = list(pending.values_list('pk', 'product_id')[:batch_size])
+            if not events:
+                break
+            business_ids = apply_changes({product_id for _, product_id in events})
+            CatalogOutbox.objects.filter(pk__in=[pk for pk, _ in events]).delete()
+            if business_ids:
+                catalogue_cache.invalidate_on_commit(business_ids)
+        published += len(events)
+        if len(events) < batch_size:
+            break
+    return published
+
+
+def apply_changes(product_ids) -> set[int]:
+    # Approved products are upserted, everything else (unapproved, deleted) is removed. Returns the businesses touched.
+    rows = list(Product.objects.filter(pk__in=product_ids, status=ProductStatus.APPROVED).values('pk', *ENTRY_FIELDS))
+    stale = PublicCatalogEntry.objects.filter(pk__in=product_ids).exclude(pk__in=[row['pk'] for row in rows])
+    business_ids = set(stale.values_list('business_id', flat=True))
+    stale.delete()
+    return business_ids | upsert(rows)
+
+
+def upsert(rows) -> set[int]:
+    PublicCatalogEntry.objects.bulk_create(
+        [PublicCatalogEntry(id=row['pk'], **{field: row[field] for field in ENTRY_FIELDS}) for row in rows],
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=[field.removesuffix('_id') for field in ENTRY_FIELDS],
+    )
+    return {row['business_id'] for row in rows}
+
+
+def rebuild(batch_size: int | None = None) -> int:
+    # Recreates the projection from every shard's products table and discards the outbox it supersedes. Readers keep
+    # seeing the old projection until the transaction commits.
+    batch_size = batch_size or settings.PRODUCT_CATALOGUE_PUBLISH_BATCH_SIZE
+    with transaction.atomic():
+        business_ids = set(PublicCatalogEntry.objects.values_list('business_id', flat=True).distinct())
+        PublicCatalogEntry.objects.all().delete()
+        published = 0
+        for alias in settings.PRODUCT_SHARDS:
+            with sharding.use_shard(alias), transaction.atomic(using=alias):
+                CatalogOutbox.objects.all().delete()
+                approved = Product.objects.filter(status=ProductStatus.APPROVED).order_by('pk')
+                rows = approved.values('pk', *ENTRY_FIELDS).iterator(chunk_size=batch_size)
+                while chunk := list(islice(rows, batch_size)):
+                    business_ids |= upsert(chunk)
+                    published += len(chunk)
+        catalogue_cache.invalidate_on_commit(business_ids)
+    return published
@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Max, Min, Subquery, Value, When
+from django.db.models.functions import Cast, Floor, Least
+from rest_framework import serializers
+
+# Query parameters the facet counts depend on; the cursor and page size only select a page.
+FACET_PARAMS = ('business_id', 'search', 'min_price', 'max_price', 'price_buckets', 'price_edges')
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+price_representation = serializers.DecimalField(max_digits=10, decimal_places=2).to_representation
+
+
+def fixed_bucket(edges):
+    # Bucket 0 is below the first edge, bucket i is [edges[i-1], edges[i]) and the last is at or above the last edge.
+    return Case(
+        *[When(price__lt=edge, then=Value(index)) for index, edge in enumerate(edges)],
+        default=Value(len(edges)),
+        output_field=IntegerField(),
+    )
+
+
+def adaptive_bucket(queryset, buckets: int):
+    # Equal-width bands between the cheapest and dearest matching product. The bounds are scalar subqueries over the
+    # same filters, so the histogram still takes a single statement.
+    prices = queryset.order_by().values('price')
+    lowest = Subquery(prices.order_by('price')[:1], output_field=PRICE_FIELD)
+    highest = Subquery(prices.order_by('-price')[:1], output_field=PRICE_FIELD)
+    # The first branch also covers a single distinct price, so the division never sees a zero width.
+    return Case(
+        When(price=highest, then=Value(buckets - 1)),
+        default=Least(
+            Cast(Floor((F('price') - lowest) * Value(buckets) / (highest - lowest)), IntegerField()),
+            Value(buckets - 1),
+        ),
+        output_field=IntegerField(),
+    )
+
+
+def facet_rows(queryset, bucket):
+    return (
+        queryset.order_by()
+        .annotate(price_bucket=bucket)
+        .values('business_id', 'business__name', 'price_bucket')
+        .annotate(
+            count=Count('pk'),
+            price_min=Min('price'),
+            price_max=Max('price'),
+            last_modified=Max('updated_at'),
+        )
+    )
+
+
+def facet_bucket(queryset, filters):
+    if filters.get('price_edges'):
+        return fixed_bucket(filters['price_edges'])
+    return adaptive_bucket(queryset, filters['price_buckets'])
+
+
+def compute_facets(queryset, filters) -> dict:
+    return summarize(list(facet_rows(queryset, facet_bucket(queryset, filters))), filters)
+
+
+async def acompute_facets(queryset, filters) -> dict:
+    rows = [row async for row in facet_rows(queryset, facet_bucket(queryset, filters))]
+    return summarize(rows, filters)
+
+
+def summarize(rows, filters) -> dict:
+    businesses = {}
+    bucket_counts = {}
+    for row in rows:
+        business = businesses.setdefault(
+            row['business_id'], {'id': row['business_id'], 'name': row['business__name'], 'count': 0}
+        )
+        business['count'] += row['count']
+        bucket_counts[row['price_bucket']] = bucket_counts.get(row['price_bucket'], 0) + row['count']
+
+    lowest = min((row['price_min'] for row in rows), default=None)
+    highest = max((row['price_max'] for row in rows), default=None)
+    last_modified = max((row['last_modified'] for row in rows), default=None)
+    if filters.get('price_edges'):
+        bounds = fixed_bounds(filters['price_edges'])
+    else:
+        bounds = adaptive_bounds(lowest, highest, filters['price_buckets'])
+    data = {
+        'count': sum(business['count'] for business in businesses.values()),
+        'price': {'min': format_price(lowest), 'max': format_price(highest)},
+        'businesses': sorted(businesses.values(), key=lambda business: (-business['count'], business['id'])),
+        'price_buckets': [
+            {'min': format_price(low), 'max': format_price(high), 'count': bucket_counts.get(index, 0)}
+            for index, (low, high) in enumerate(bounds)
+        ],
+    }
+    # The total and newest updated_at double as list validators, so facet requests skip the separate aggregate.
+    return {'data': data, 'last_modified': last_modified}
+
+
+def fixed_bounds(edges) -> list[tuple]:
+    return list(zip([None, *edges], [*edges, None]))
+
+
+def adaptive_bounds(lowest, highest, buckets: int) -> list[tuple]:
+    if lowest is None:
+        return []
+    width = (Decimal(highest) - Decimal(lowest)) / buckets
+    edges = [Decimal(lowest) + width * index for index in range(buckets)] + [Decimal(highest)]
+    return list(zip(edges, edges[1:]))
+
+
+def format_price(value):
+    return None if value is None else price_representation(Decimal(value))
@@ -0,0 +1,157 @@
+import base64
+import binascii
+import importlib.util
+import io
+import re
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from apps.core.blobstore import ContentAddressedStore
+
+HAS_PILLOW = importlib.util.find_spec('PIL') is not None
+
+IMAGE_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+DATA_URL_PATTERN = re.compile(r'^data:(?P<mime>[\w.+-]+/[\w.+-]+)?(?P<params>(?:;[^,;]+)*?)(?P<base64>;base64)?,', re.I)
+
+
+class ImageIngestError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    digest: str
+    name: str
+    url: str
+    thumbnail_url: str
+    # The thumbnails still have to be generated; `thumbnail_url` is the original until then.
+    thumbnails_pending: bool = False
+
+
+def get_image_store() -> ContentAddressedStore:
+    return ContentAddressedStore(prefix=settings.PRODUCT_IMAGE_PREFIX)
+
+
+def is_data_url(value: str) -> bool:
+    return value[:5].lower() == 'data:'
+
+
+def decode_data_url(value: str) -> tuple[bytes, str]:
+    match = DATA_URL_PATTERN.match(value)
+    if not match or not match.group('base64'):
+        raise ImageIngestError('Image data URLs must be base64 encoded.')
+    mime_type = (match.group('mime') or '').lower()
+    if mime_type not in IMAGE_EXTENSIONS:
+        raise ImageIngestError('Unsupported image type.')
+    try:
+        content = base64.b64decode(value[match.end():], validate=True)
+    except (binascii.Error, ValueError) as exc:
+        raise ImageIngestError('Image data is not valid base64.') from exc
+    return content, mime_type
+
+
+def ingest_data_url(value: str, defer_thumbnails: bool = False) -> StoredImage:
+    content, mime_type = decode_data_url(value)
+    return ingest_bytes(content, mime_type, defer_thumbnails)
+
+
+def ingest_upload(upload, defer_thumbnails: bool = False) -> StoredImage:
+    if upload.size > settings.PRODUCT_IMAGE_MAX_BYTES:
+        raise ImageIngestError('Image is too large.')
+    mime_type = (upload.content_type or '').lower()
+    if mime_type not in IMAGE_EXTENSIONS:
+        raise ImageIngestError('Unsupported image type.')
+    return ingest_bytes(upload.read(), mime_type, defer_thumbnails)
+
+
+def ingest_bytes(content: bytes, mime_type: str, defer_thumbnails: bool = False) -> StoredImage:
+    # With `defer_thumbnails` the image is only decoded here and resizing is left to
+    # apps.products.tasks.generate_product_thumbnails, unless an identical image already has its thumbnails.
+    if not content:
+        raise ImageIngestError('Image is empty.')
+    if len(content) > settings.PRODUCT_IMAGE_MAX_BYTES:
+        raise ImageIngestError('Image is too large.')
+
+    store = get_image_store()
+    digest = store.digest(content)
+    pending = False
+    if defer_thumbnails and HAS_PILLOW:
+        thumbnail_names = planned_thumbnails(store, digest, decode_image(content))
+        pending = not all(store.exists(name) for name in thumbnail_names)
+    else:
+        thumbnail_names = generate_thumbnails(store, digest, content)
+    original_name = store.put(store.name_for(digest, IMAGE_EXTENSIONS[mime_type]), content)
+    original_url = store.url(original_name)
+    thumbnail_url = store.url(thumbnail_names[0]) if thumbnail_names and not pending else original_url
+    return StoredImage(
+        digest=digest, name=original_name, url=original_url, thumbnail_url=thumbnail_url, thumbnails_pending=pending
+    )
+
+
+def open_image(content: bytes):
+    # Image.open reads the header only; pixels are decoded on first use.
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        return Image.open(io.BytesIO(content))
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise ImageIngestError('Uploaded file is not a valid image.') from exc
+
+
+def decode_image(content: bytes):
+    # Decodes every pixel, so a truncated or corrupt body is rejected now instead of failing the thumbnail job on
+    # every retry.
+    from PIL import Image
+
+    image = open_image(content)
+    try:
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise ImageIngestError('Uploaded file is not a valid image.') from exc
+    return image
+
+
+def has_alpha(image) -> bool:
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def planned_thumbnails(store: ContentAddressedStore, digest: str, image) -> list[str]:
+    extension = 'png' if has_alpha(image) else 'jpg'
+    return [store.name_for(digest, extension, variant=f'w{size}') for size in settings.PRODUCT_IMAGE_THUMBNAIL_SIZES]
+
+
+def generate_thumbnails(store: ContentAddressedStore, digest: str, content: bytes) -> list[str]:
+    if not HAS_PILLOW:
+        return []
+
+    from PIL import Image, ImageOps
+
+    names = []
+    source = None
+    for size in settings.PRODUCT_IMAGE_THUMBNAIL_SIZES:
+        if source is None:
+            try:
+                source = ImageOps.exif_transpose(open_image(content))
+            except (OSError, Image.DecompressionBombError) as exc:
+                raise ImageIngestError('Uploaded file is not a valid image.') from exc
+        alpha = has_alpha(source)
+        extension = 'png' if alpha else 'jpg'
+        name = store.name_for(digest, extension, variant=f'w{size}')
+        if not store.exists(name):
+            thumbnail = source.convert('RGBA' if alpha else 'RGB')
+            thumbnail.thumbnail((size, size))
+            buffer = io.BytesIO()
+            if alpha:
+                thumbnail.save(buffer, format='PNG', optimize=True)
+            else:
+                thumbnail.save(buffer, format='JPEG', quality=82, optimize=True)
+            store.put(name, buffer.getvalue())
+        names.append(name)
+    return names
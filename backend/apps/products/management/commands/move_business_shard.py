@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import Business
+from apps.products.sharding import load_placement, move_business
+
+
+class Command(BaseCommand):
+    help = "Move a business's products, stats and pending catalogue changes to another product shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('business_id', type=int)
+        parser.add_argument('shard', choices=settings.PRODUCT_SHARDS)
+        parser.add_argument('--grace', type=float, help='seconds to let in-flight writes finish before copying')
+        parser.add_argument('--batch-size', type=int, default=500, help='products copied per statement')
+
+    def handle(self, *args, business_id, shard, grace=None, batch_size=500, **options):
+        if not Business.objects.filter(pk=business_id).exists():
+            raise CommandError(f'Business {business_id} does not exist.')
+        source, _ = load_placement(business_id)
+        moved = move_business(business_id, shard, grace=grace, batch_size=batch_size)
+        if source == shard:
+            # Re-running a move that was switched over but not cleaned up deletes what is left on the old shard.
+            self.stdout.write(f'Business {business_id} is already on {shard}; removed leftovers on other shards.')
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f'Moved {moved} products of business {business_id} from {source} to {shard}.')
+        )
@@ -0,0 +1,66 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.accounts.models import Business
+from apps.products.models import BusinessProductStats
+from apps.products.sharding import fan_out, first_shard, shard_map
+from apps.products.stats import STATS_FIELDS, compute_stats, rebuild
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-business product statistics from the products table, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, action='append', dest='business_ids', help='limit to these ids')
+        parser.add_argument('--verify', action='store_true', help='report drift without writing; exit 1 if any')
+
+    def handle(self, *args, business_ids=None, verify=False, **options):
+        businesses = Business.objects.order_by('pk')
+        if business_ids:
+            businesses = businesses.filter(pk__in=business_ids)
+        placements = shard_map()
+        by_shard = {}
+        for business_id in businesses.values_list('pk', flat=True).iterator():
+            by_shard.setdefault(placements.get(business_id, first_shard()), []).append(business_id)
+
+        # Each shard's businesses are handled in a thread of their own, against that shard only.
+        drift = fan_out(lambda alias: self.process(alias, by_shard.get(alias, []), verify), by_shard)
+        checked, drifted = sum(len(ids) for ids in by_shard.values()), sum(drift.values())
+
+        if not verify:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt product statistics for {checked} businesses.'))
+        elif drifted:
+            raise CommandError(f'{drifted} of {checked} businesses have drifted statistics; run without --verify.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Product statistics match for {checked} businesses.'))
+
+    def process(self, alias, business_ids, verify) -> int:
+        drifted = 0
+        business_ids = iter(business_ids)
+        while chunk := list(islice(business_ids, BATCH_SIZE)):
+            if not verify:
+                for business_id in chunk:
+                    with transaction.atomic(using=alias):
+                        rebuild(business_id)
+                continue
+            stored = {stats.business_id: stats for stats in BusinessProductStats.objects.filter(business_id__in=chunk)}
+            for business_id in chunk:
+                # A business that never had a product has no row yet, which reads as all zeros.
+                stats = stored.get(business_id) or BusinessProductStats(business_id=business_id)
+                drifted += self.verify(business_id, stats)
+        return drifted
+
+    def verify(self, business_id, stats) -> bool:
+        expected = compute_stats(business_id)
+        differences = [
+            f'{field}={getattr(stats, field)!r} expected {expected[field]!r}'
+            for field in STATS_FIELDS
+            if getattr(stats, field) != expected[field]
+        ]
+        if differences:
+            self.stderr.write(f'business {business_id}: ' + ', '.join(differences))
+        return bool(differences)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.products import catalog
+
+
+class Command(BaseCommand):
+    help = 'Apply pending catalogue outbox changes to the public catalogue, or rebuild it from products with --rebuild.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='recreate every entry from the products table')
+        parser.add_argument('--batch-size', type=int, help='outbox rows or products handled per transaction')
+
+    def handle(self, *args, rebuild=False, batch_size=None, **options):
+        if rebuild:
+            published = catalog.rebuild(batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt the public catalogue with {published} products.'))
+        else:
+            published = catalog.publish_pending(batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Applied {published} pending catalogue changes.'))
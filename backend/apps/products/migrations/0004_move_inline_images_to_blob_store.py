@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def move_inline_images(apps, schema_editor):
+    from apps.products.images import ImageIngestError, ingest_data_url
+
+    Product = apps.get_model('products', 'Product')
+    inline_products = (
+        Product.objects.using(schema_editor.connection.alias)
+        .filter(image_url__startswith='data:')
+        .values_list('id', 'image_url')
+    )
+    for product_id, image_url in inline_products.iterator(chunk_size=100):
+        try:
+            stored = ingest_data_url(image_url)
+        except ImageIngestError:
+            continue
+        Product.objects.using(schema_editor.connection.alias).filter(pk=product_id).update(
+            image_url=stored.url,
+            thumbnail_url=stored.thumbnail_url,
+        )
+
+
+def copy_external_thumbnails(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.using(schema_editor.connection.alias).exclude(image_url='').exclude(
+        image_url__startswith='data:'
+    ).filter(thumbnail_url='').update(thumbnail_url=F('image_url'))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('products', '0003_product_thumbnail_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_inline_images, migrations.RunPython.noop),
+        migrations.RunPython(copy_external_thumbnails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('products', '0004_move_inline_images_to_blob_store'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='business',
+            field=models.ForeignKey(db_index=False, on_delete=models.deletion.CASCADE, related_name='products', to='accounts.business'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['-created_at', '-id'], name='prod_public_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['business', '-created_at', '-id'], name='prod_public_biz_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['price', 'id'], name='prod_public_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['business', '-created_at', '-id'], name='prod_biz_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['business', 'price', 'id'], name='prod_biz_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['business', 'status', '-created_at', '-id'], name='prod_biz_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['business', 'status', 'price', 'id'], name='prod_biz_status_price_idx'),
+        ),
+    ]
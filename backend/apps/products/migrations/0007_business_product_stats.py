@@ -0,0 +1,80 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Q, Sum
+
+
+def backfill_approved_at(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.using(schema_editor.connection.alias).filter(
+        status='approved', approved_by__isnull=False
+    ).update(approved_at=F('updated_at'))
+
+
+def build_stats(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    BusinessProductStats = apps.get_model('products', 'BusinessProductStats')
+    rows = (
+        Product.objects.using(schema_editor.connection.alias)
+        .order_by()
+        .values('business_id')
+        .annotate(
+            draft_count=Count('pk', filter=Q(status='draft')),
+            pending_approval_count=Count('pk', filter=Q(status='pending_approval')),
+            approved_count=Count('pk', filter=Q(status='approved')),
+            price_total=Sum('price'),
+            price_min=Min('price'),
+            price_max=Max('price'),
+            last_approved_at=Max('approved_at', filter=Q(status='approved')),
+        )
+    )
+    BusinessProductStats.objects.using(schema_editor.connection.alias).bulk_create(
+        [BusinessProductStats(**row) for row in rows], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('accounts', '0003_user_permissions_version'),
+        ('products', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='approved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(
+                condition=models.Q(('status', 'approved')),
+                fields=['business', '-approved_at'],
+                name='prod_biz_approved_idx',
+            ),
+        ),
+        migrations.CreateModel(
+            name='BusinessProductStats',
+            fields=[
+                (
+                    'business',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='product_stats',
+                        serialize=False,
+                        to='accounts.business',
+                    ),
+                ),
+                ('draft_count', models.IntegerField(default=0)),
+                ('pending_approval_count', models.IntegerField(default=0)),
+                ('approved_count', models.IntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('price_min', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('price_max', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_approved_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_approved_at, migrations.RunPython.noop),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
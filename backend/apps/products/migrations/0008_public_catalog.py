@@ -0,0 +1,103 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from apps.products.search import CATALOG_FTS_TABLE, CATALOG_SEARCH_INDEX, FullTextField, get_search_backend
+
+ENTRY_FIELDS = ('business_id', 'name', 'description', 'image_url', 'thumbnail_url', 'price', 'created_at', 'updated_at')
+
+
+def build_catalog(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    PublicCatalogEntry = apps.get_model('products', 'PublicCatalogEntry')
+    rows = (
+        Product.objects.using(schema_editor.connection.alias)
+        .filter(status='approved')
+        .values('pk', *ENTRY_FIELDS)
+        .iterator(chunk_size=500)
+    )
+    PublicCatalogEntry.objects.using(schema_editor.connection.alias).bulk_create(
+        (PublicCatalogEntry(id=row.pop('pk'), **row) for row in rows), batch_size=500
+    )
+
+
+def install_search_index(apps, schema_editor):
+    get_search_backend(schema_editor.connection, CATALOG_SEARCH_INDEX).install(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    get_search_backend(schema_editor.connection, CATALOG_SEARCH_INDEX).uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('accounts', '0003_user_permissions_version'),
+        ('products', '0007_business_product_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicCatalogEntry',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('image_url', models.TextField(blank=True)),
+                ('thumbnail_url', models.TextField(blank=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                (
+                    'business',
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='catalog_entries',
+                        to='accounts.business',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [
+                    models.Index(fields=['-created_at', '-id'], name='catalog_created_idx'),
+                    models.Index(fields=['business', '-created_at', '-id'], name='catalog_biz_created_idx'),
+                    models.Index(fields=['price', 'id'], name='catalog_price_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='PublicCatalogSearchIndex',
+            fields=[
+                (
+                    'entry',
+                    models.OneToOneField(
+                        db_column='rowid',
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name='search_index',
+                        serialize=False,
+                        to='products.publiccatalogentry',
+                    ),
+                ),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('document', FullTextField(db_column=CATALOG_FTS_TABLE)),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': CATALOG_FTS_TABLE,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CatalogOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(build_catalog, migrations.RunPython.noop),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,85 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('accounts', '0005_business_roles'),
+        ('products', '0008_public_catalog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessShard',
+            fields=[
+                (
+                    'business',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='product_shard',
+                        serialize=False,
+                        to='accounts.business',
+                    ),
+                ),
+                ('alias', models.CharField(max_length=64)),
+                ('moving', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductIdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField()),
+            ],
+        ),
+        # Products may live on a shard without the accounts tables, so their references stop being constraints.
+        migrations.AlterField(
+            model_name='businessproductstats',
+            name='business',
+            field=models.OneToOneField(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                primary_key=True,
+                related_name='product_stats',
+                serialize=False,
+                to='accounts.business',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='approved_by',
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='approved_products',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='business',
+            field=models.ForeignKey(
+                db_constraint=False,
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='products',
+                to='accounts.business',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='created_by',
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='products',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -1,8 +1,12 @@
+from decimal import Decimal
+
 from django.conf import settings
-from django.db import models
+from django.db import models, router
 
 from apps.accounts.models import Business
 
+from .search import CATALOG_FTS_TABLE, FTS_TABLE, FullTextField
+
 
 class ProductStatus(models.TextChoices):
     DRAFT = 'draft', 'Draft'
@@ -10,12 +14,28 @@ class ProductStatus(models.TextChoices):
     APPROVED = 'approved', 'Approved'
 
 
+class ProductQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        from .sharding import assign_product_ids
+
+        objs = list(objs)
+        assign_product_ids(objs, self.db)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Product(models.Model):
-    business = models.ForeignKey(Business, related_name='products', on_delete=models.CASCADE)
-    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='products', on_delete=models.PROTECT)
+    # Every composite index below leads with business, so the standalone FK index is redundant. Businesses and users
+    # live in `default` while products may sit on another shard, so none of these references is a database constraint.
+    business = models.ForeignKey(
+        Business, related_name='products', on_delete=models.CASCADE, db_index=False, db_constraint=False
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name='products', on_delete=models.PROTECT, db_constraint=False
+    )
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     image_url = models.TextField(blank=True)
+    thumbnail_url = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=ProductStatus.choices, default=ProductStatus.DRAFT)
     approved_by = models.ForeignKey(
@@ -24,12 +44,181 @@ class Product(models.Model):
         null=True,
         blank=True,
         on_delete=models.SET_NULL,
+        db_constraint=False,
     )
+    approved_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped by every write through the API; product updates only apply to the version they were based on.
+    version = models.PositiveIntegerField(default=1)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # PublicProductListView: approved only, optionally one business, newest first.
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(status='approved'),
+                name='prod_public_created_idx',
+            ),
+            models.Index(
+                fields=['business', '-created_at', '-id'],
+                condition=models.Q(status='approved'),
+                name='prod_public_biz_created_idx',
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                condition=models.Q(status='approved'),
+                name='prod_public_price_idx',
+            ),
+            # ProductViewSet: always scoped to one business, optionally by status, ordered by date or price.
+            models.Index(fields=['business', '-created_at', '-id'], name='prod_biz_created_idx'),
+            models.Index(fields=['business', 'price', 'id'], name='prod_biz_price_idx'),
+            models.Index(fields=['business', 'status', '-created_at', '-id'], name='prod_biz_status_created_idx'),
+            models.Index(fields=['business', 'status', 'price', 'id'], name='prod_biz_status_price_idx'),
+            # BusinessProductStats: re-reading the latest approval when that product is deleted or unapproved.
+            models.Index(
+                fields=['business', '-approved_at'],
+                condition=models.Q(status='approved'),
+                name='prod_biz_approved_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name} ({self.status})'
+
+    def save(self, **kwargs):
+        if self.pk is None:
+            from .sharding import assign_product_ids
+
+            assign_product_ids([self], kwargs.get('using') or router.db_for_write(Product, instance=self))
+            if self.pk is not None:
+                kwargs['force_insert'] = True
+        super().save(**kwargs)
+
+
+class BusinessProductStats(models.Model):
+    # One row per business, kept current by apps.products.stats in the same transaction as each product write.
+    business = models.OneToOneField(
+        Business, primary_key=True, related_name='product_stats', on_delete=models.CASCADE, db_constraint=False
+    )
+    draft_count = models.IntegerField(default=0)
+    pending_approval_count = models.IntegerField(default=0)
+    approved_count = models.IntegerField(default=0)
+    price_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    price_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    price_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_approved_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'Product stats for business {self.business_id}'
+
+    @property
+    def total_count(self) -> int:
+        return self.draft_count + self.pending_approval_count + self.approved_count
+
+    @property
+    def price_avg(self) -> Decimal | None:
+        if not self.total_count:
+            return None
+        return (self.price_total / self.total_count).quantize(Decimal('0.01'))
+
+
+class ProductSearchIndex(models.Model):
+    # Read-only view of the SQLite FTS5 table that triggers keep in sync with products_product.
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    name = models.TextField()
+    description = models.TextField()
+    document = FullTextField(db_column=FTS_TABLE)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
+
+
+class PublicCatalogEntry(models.Model):
+    # Read-optimized copy of an approved product, the only table the public catalogue reads. Rows are written by
+    # apps.products.catalog from the outbox, never by request handlers; `id` is the product's id.
+    id = models.BigIntegerField(primary_key=True)
+    business = models.ForeignKey(Business, related_name='catalog_entries', on_delete=models.CASCADE, db_index=False)
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    image_url = models.TextField(blank=True)
+    thumbnail_url = models.TextField(blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Every row is public, so these are the partial prod_public_* indexes without the status condition.
+            models.Index(fields=['-created_at', '-id'], name='catalog_created_idx'),
+            models.Index(fields=['business', '-created_at', '-id'], name='catalog_biz_created_idx'),
+            models.Index(fields=['price', 'id'], name='catalog_price_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class PublicCatalogSearchIndex(models.Model):
+    # Read-only view of the FTS5 table over the public catalogue; see ProductSearchIndex.
+    entry = models.OneToOneField(
+        PublicCatalogEntry,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    name = models.TextField()
+    description = models.TextField()
+    document = FullTextField(db_column=CATALOG_FTS_TABLE)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = CATALOG_FTS_TABLE
+
+
+class CatalogOutbox(models.Model):
+    # A product whose public catalogue entry may be stale. Rows are inserted in the same transaction as the product
+    # write and removed once apps.products.catalog has applied them, so no committed change is ever lost.
+    product_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'Catalogue change for product {self.product_id}'
+
+
+class BusinessShard(models.Model):
+    # The shard map: which database alias from PRODUCT_SHARDS holds a business's products. Businesses without a row
+    # live on the first shard. `moving` is set while apps.products.sharding.move_business copies them elsewhere.
+    business = models.OneToOneField(Business, primary_key=True, related_name='product_shard', on_delete=models.CASCADE)
+    alias = models.CharField(max_length=64)
+    moving = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f'Business {self.business_id} on {self.alias}'
+
+
+class ProductIdSequence(models.Model):
+    # Lives on every shard: the next counter value for ids of products created there while products are sharded.
+    # See apps.products.sharding.allocate_product_ids.
+    next_value = models.BigIntegerField()
+
+    def __str__(self) -> str:
+        return f'Next product id counter {self.next_value}'
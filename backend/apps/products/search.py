@@ -0,0 +1,189 @@
+import re
+from typing import NamedTuple
+
+from django.db import connections, models
+from django.db.models import BooleanField, F, FloatField, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'products_product_fts'
+CATALOG_FTS_TABLE = 'products_publiccatalogentry_fts'
+MAX_SEARCH_TERMS = 8
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchIndex(NamedTuple):
+    # A full-text index over the name and description columns of `table`.
+    table: str
+    fts_table: str
+
+    @property
+    def postgres_index(self) -> str:
+        return f'{self.table}_search_idx'
+
+
+PRODUCT_SEARCH_INDEX = SearchIndex('products_product', FTS_TABLE)
+CATALOG_SEARCH_INDEX = SearchIndex('products_publiccatalogentry', CATALOG_FTS_TABLE)
+SEARCH_INDEXES = (PRODUCT_SEARCH_INDEX, CATALOG_SEARCH_INDEX)
+
+
+def sqlite_install_statements(index: SearchIndex) -> list[str]:
+    fts, table = index.fts_table, index.table
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            name, description, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF name, description ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO {fts}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+        """,
+        # Matches in the name outweigh matches in the description.
+        f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    ]
+
+
+def sqlite_uninstall_statements(index: SearchIndex) -> list[str]:
+    fts = index.fts_table
+    return [
+        f'DROP TRIGGER IF EXISTS {fts}_ai',
+        f'DROP TRIGGER IF EXISTS {fts}_ad',
+        f'DROP TRIGGER IF EXISTS {fts}_au',
+        f'DROP TABLE IF EXISTS {fts}',
+    ]
+
+
+# The same expression backs the GIN index, so Postgres can answer `@@` from the index.
+POSTGRES_DOCUMENT = (
+    "(setweight(to_tsvector('simple', coalesce({table}.name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({table}.description, '')), 'B'))"
+)
+
+
+class FullTextField(models.TextField):
+    pass
+
+
+@FullTextField.register_lookup
+class FullTextMatch(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+def search_terms(query: str) -> list[str]:
+    return [term.lower() for term in TOKEN_PATTERN.findall(query)][:MAX_SEARCH_TERMS]
+
+
+class LikeSearchBackend:
+    def __init__(self, index: SearchIndex = PRODUCT_SEARCH_INDEX):
+        self.index = index
+
+    def search(self, queryset, query: str):
+        condition = Q()
+        for term in search_terms(query):
+            condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def install(self, connection) -> bool:
+        return False
+
+    def uninstall(self, connection):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+
+class SQLiteSearchBackend(LikeSearchBackend):
+    def search(self, queryset, query: str):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        # bm25() is negative and lower is better, so ascending `search_rank` is most relevant first.
+        return queryset.filter(search_index__document__match=expression).annotate(
+            search_rank=F('search_index__rank')
+        )
+
+    def install(self, connection) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{self.index.fts_table}_a_'],
+            )
+            installed = cursor.fetchone()[0] == 3
+            if not installed:
+                for statement in sqlite_install_statements(self.index):
+                    cursor.execute(statement)
+        if not installed:
+            self.rebuild(connection)
+        return not installed
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for statement in sqlite_uninstall_statements(self.index):
+                cursor.execute(statement)
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            fts = self.index.fts_table
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+class PostgresSearchBackend(LikeSearchBackend):
+    def search(self, queryset, query: str):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        table = connections[queryset.db].ops.quote_name(queryset.model._meta.db_table)
+        document = POSTGRES_DOCUMENT.format(table=table)
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.filter(
+            RawSQL(f"{document} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f"-ts_rank({document}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+        )
+
+    def install(self, connection) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.index.postgres_index} ON {self.index.table} '
+                f'USING GIN ({POSTGRES_DOCUMENT.format(table=self.index.table)})'
+            )
+        return False
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {self.index.postgres_index}')
+
+
+def get_search_backend(connection, index: SearchIndex = PRODUCT_SEARCH_INDEX) -> LikeSearchBackend:
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend(index)
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend(index)
+    return LikeSearchBackend(index)
+
+
+def search_products(queryset, query: str):
+    # Both indexed tables expose their FTS rows as `search_index`, so the backend only needs the index for DDL.
+    return get_search_backend(connections[queryset.db]).search(queryset, query)
@@ -1,11 +1,18 @@
+from django.db import DEFAULT_DB_ALIAS
 from rest_framework import serializers
 
-from .models import Product, ProductStatus
+from apps.accounts.models import User
+from apps.core.replicas import primary_alias
+from apps.core.rows import RowSerializer
+
+from .images import ImageIngestError, ingest_data_url, ingest_upload, is_data_url
+from .models import BusinessProductStats, Product, ProductStatus, PublicCatalogEntry
 
 
 class ProductSerializer(serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
     approved_by = serializers.StringRelatedField(read_only=True)
+    image = serializers.FileField(write_only=True, required=False)
 
     class Meta:
         model = Product
@@ -14,22 +21,101 @@ class ProductSerializer(serializers.ModelSerializer):
             'name',
             'description',
             'image_url',
+            'thumbnail_url',
+            'image',
             'price',
             'status',
             'created_by',
             'approved_by',
             'created_at',
             'updated_at',
+            'version',
         ]
-        read_only_fields = ['id', 'created_by', 'approved_by', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'thumbnail_url', 'created_by', 'approved_by', 'created_at', 'updated_at', 'version']
 
     def validate_status(self, value):
         if value not in ProductStatus.values:
             raise serializers.ValidationError('Invalid product status.')
         return value
 
+    # Set by validate() when an image was ingested; the caller schedules its thumbnails once the product is saved.
+    stored_image = None
+
+    def validate(self, attrs):
+        upload = attrs.pop('image', None)
+        image_url = attrs.get('image_url')
+        try:
+            if upload is not None:
+                stored = ingest_upload(upload, defer_thumbnails=True)
+            elif image_url and is_data_url(image_url):
+                stored = ingest_data_url(image_url, defer_thumbnails=True)
+            else:
+                stored = None
+        except ImageIngestError as exc:
+            raise serializers.ValidationError({'image' if upload is not None else 'image_url': str(exc)}) from exc
+
+        self.stored_image = stored
+        if stored is not None:
+            attrs['image_url'] = stored.url
+            attrs['thumbnail_url'] = stored.thumbnail_url
+        elif 'image_url' in attrs:
+            attrs['thumbnail_url'] = image_url
+        return attrs
+
 
 class PublicProductSerializer(serializers.ModelSerializer):
+    # Entries are approved products by construction; the public queryset annotates the status.
+    status = serializers.ReadOnlyField()
+
     class Meta:
-        model = Product
-        fields = ['id', 'name', 'description', 'image_url', 'price', 'status']
+        model = PublicCatalogEntry
+        fields = ['id', 'name', 'description', 'image_url', 'thumbnail_url', 'price', 'status']
+
+
+class BusinessProductStatsSerializer(serializers.ModelSerializer):
+    total_count = serializers.IntegerField(read_only=True)
+    price_avg = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = BusinessProductStats
+        fields = [
+            'draft_count',
+            'pending_approval_count',
+            'approved_count',
+            'total_count',
+            'price_min',
+            'price_max',
+            'price_avg',
+            'last_approved_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+product_row_serializer = RowSerializer(
+    ProductSerializer,
+    lookups={'created_by': 'created_by__username', 'approved_by': 'approved_by__username'},
+)
+public_product_row_serializer = RowSerializer(PublicProductSerializer)
+
+# Products on a shard other than `default` cannot join accounts_user; their rows carry user ids that with_usernames()
+# swaps for usernames.
+sharded_product_row_serializer = RowSerializer(
+    ProductSerializer,
+    lookups={'created_by': 'created_by_id', 'approved_by': 'approved_by_id'},
+)
+USER_FIELDS = ('created_by', 'approved_by')
+
+
+def product_rows_serializer(alias: str) -> RowSerializer:
+    return product_row_serializer if primary_alias(alias) == DEFAULT_DB_ALIAS else sharded_product_row_serializer
+
+
+def with_usernames(items: list[dict]) -> list[dict]:
+    user_ids = {item[field] for item in items for field in USER_FIELDS if item[field] is not None}
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list('pk', 'username')) if user_ids else {}
+    for item in items:
+        for field in USER_FIELDS:
+            if item[field] is not None:
+                item[field] = usernames.get(item[field])
+    return items
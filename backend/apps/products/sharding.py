@@ -0,0 +1,291 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, ProtectedError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from apps.accounts.models import Business
+from apps.core.replicas import ReplicaRouter, primary_alias
+
+from .models import BusinessProductStats, BusinessShard, CatalogOutbox, Product, ProductIdSequence
+
+# Per-business tables, partitioned across PRODUCT_SHARDS. Everything else, the shard map and the public catalogue
+# included, lives in `default`.
+SHARDED_MODELS = frozenset(
+    {'product', 'productsearchindex', 'productidsequence', 'businessproductstats', 'catalogoutbox'}
+)
+
+_selected_shard = contextvars.ContextVar('product_shard', default=None)
+
+
+class ShardNotSelected(RuntimeError):
+    pass
+
+
+class ShardMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "This business's products are being moved to another database; try again shortly."
+    default_code = 'shard_moving'
+    wait = 5
+
+
+def is_sharded(model) -> bool:
+    return model._meta.app_label == 'products' and model._meta.model_name in SHARDED_MODELS
+
+
+def sharding_enabled() -> bool:
+    return len(settings.PRODUCT_SHARDS) > 1
+
+
+def first_shard() -> str:
+    return settings.PRODUCT_SHARDS[0]
+
+
+def placement_key(business_id) -> str:
+    return f'products:shard:{business_id}'
+
+
+def load_placement(business_id) -> tuple[str, bool]:
+    # From the primary: a replica could still show a business's old shard after a move, and it would be cached.
+    placements = BusinessShard.objects.using(DEFAULT_DB_ALIAS).filter(business_id=business_id)
+    row = placements.values_list('alias', 'moving').first()
+    return tuple(row) if row else (first_shard(), False)
+
+
+def get_placement(business_id) -> tuple[str, bool]:
+    # (alias, moving) for the business, from the shard map behind a shared cache; a single database needs no lookup.
+    if not sharding_enabled():
+        return first_shard(), False
+    cache = caches[settings.PRODUCT_SHARD_CACHE_ALIAS]
+    placement = cache.get(placement_key(business_id))
+    if placement is None:
+        placement = load_placement(business_id)
+        cache.set(placement_key(business_id), placement, settings.PRODUCT_SHARD_CACHE_TIMEOUT)
+    return tuple(placement)
+
+
+def set_placement(business_id, alias: str, moving: bool = False):
+    BusinessShard.objects.update_or_create(business_id=business_id, defaults={'alias': alias, 'moving': moving})
+    key = placement_key(business_id)
+    transaction.on_commit(lambda: caches[settings.PRODUCT_SHARD_CACHE_ALIAS].delete(key))
+
+
+def shard_map() -> dict[int, str]:
+    # Every explicit placement, for maintenance commands that walk all businesses.
+    return dict(BusinessShard.objects.using(DEFAULT_DB_ALIAS).values_list('business_id', 'alias'))
+
+
+def business_shard(business_id, for_write: bool = False) -> str:
+    alias, moving = get_placement(business_id)
+    if moving and for_write:
+        raise ShardMoving()
+    return alias
+
+
+def current_shard() -> str:
+    alias = _selected_shard.get()
+    if alias is not None:
+        return alias
+    if sharding_enabled():
+        raise ShardNotSelected('Product queries need a shard; run them inside use_shard() or pass .using().')
+    return first_shard()
+
+
+def select_shard(alias: str) -> contextvars.Token:
+    return _selected_shard.set(alias)
+
+
+def release_shard(token: contextvars.Token):
+    _selected_shard.reset(token)
+
+
+@contextmanager
+def use_shard(alias: str):
+    token = select_shard(alias)
+    try:
+        yield alias
+    finally:
+        release_shard(token)
+
+
+def atomic(**kwargs):
+    # transaction.atomic() on the selected shard, for blocks that write products.
+    return transaction.atomic(using=current_shard(), **kwargs)
+
+
+def run_on_shard(func, alias: str):
+    with use_shard(alias):
+        return func(alias)
+
+
+def run_in_thread(func, alias: str):
+    try:
+        return run_on_shard(func, alias)
+    finally:
+        connections.close_all()
+
+
+def fan_out(func, aliases=None) -> dict:
+    # Calls func(alias) with each shard selected, in up to PRODUCT_SHARD_FAN_OUT_THREADS threads, and returns the
+    # results by alias. Each thread only touches its own shard's connection, which it closes when done.
+    aliases = list(aliases or settings.PRODUCT_SHARDS)
+    threads = min(len(aliases), settings.PRODUCT_SHARD_FAN_OUT_THREADS)
+    if threads <= 1:
+        return {alias: run_on_shard(func, alias) for alias in aliases}
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='product-shard') as pool:
+        futures = {alias: pool.submit(run_in_thread, func, alias) for alias in aliases}
+        return {alias: future.result() for alias, future in futures.items()}
+
+
+class ProductShardRouter(ReplicaRouter):
+    # Sends products, their stats and catalogue outbox to a shard: the one an instance was loaded from, else the one
+    # selected with use_shard(), else the shard map's entry for the business the instance belongs to. Reads of the
+    # `default` shard may then go to a replica.
+    def primary_for(self, model, **hints) -> str:
+        if not is_sharded(model):
+            # Explicit, or Django would look up a product's user or business on the product's shard.
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(type(instance)) and instance._state.db:
+            return primary_alias(instance._state.db)
+        if _selected_shard.get() is None and instance is not None:
+            business_id = instance.pk if isinstance(instance, Business) else getattr(instance, 'business_id', None)
+            if business_id is not None:
+                return business_shard(business_id)
+        return current_shard()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Products on any shard reference businesses and users in `default`.
+        if is_sharded(type(obj1)) or is_sharded(type(obj2)):
+            return True
+        return super().allow_relation(obj1, obj2, **hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name is None:
+            # Data migrations backfill `default`; a new shard starts empty.
+            return db == DEFAULT_DB_ALIAS
+        if app_label == 'products' and model_name in SHARDED_MODELS:
+            return db in settings.PRODUCT_SHARDS
+        return db == DEFAULT_DB_ALIAS
+
+
+def allocate_product_ids(alias: str, count: int) -> list[int]:
+    # Ids are counter * PRODUCT_SHARD_ID_STRIDE + the shard's position, so they are unique across shards (the public
+    # catalogue and outbox key on them) and a moved product keeps its id. The counter row is locked and advanced in
+    # the transaction that inserts the products, and never falls below ids already in the table.
+    stride = settings.PRODUCT_SHARD_ID_STRIDE
+    with transaction.atomic(using=alias):
+        sequence = ProductIdSequence.objects.using(alias).select_for_update().filter(pk=1).first()
+        highest = Product.objects.using(alias).aggregate(highest=Max('pk'))['highest'] or 0
+        start = max(sequence.next_value if sequence else 0, highest // stride + 1)
+        ProductIdSequence.objects.using(alias).update_or_create(pk=1, defaults={'next_value': start + count})
+    position = settings.PRODUCT_SHARDS.index(alias)
+    return [counter * stride + position for counter in range(start, start + count)]
+
+
+def assign_product_ids(products, alias: str):
+    # A single database keeps handing out AUTOINCREMENT ids.
+    missing = [product for product in products if product.pk is None]
+    if missing and sharding_enabled():
+        for product, product_id in zip(missing, allocate_product_ids(alias, len(missing))):
+            product.pk = product_id
+
+
+def copy_business(business_id, source: str, target: str, batch_size: int) -> int:
+    products = Product.objects.using(source).filter(business_id=business_id)
+    pending = CatalogOutbox.objects.using(source).filter(product_id__in=products.values('pk'))
+    copied = 0
+    with transaction.atomic(using=target):
+        # Leftovers of an interrupted move.
+        delete_business(business_id, target)
+        rows = products.order_by('pk').iterator(chunk_size=batch_size)
+        while chunk := list(islice(rows, batch_size)):
+            timestamps = [(product.created_at, product.updated_at) for product in chunk]
+            Product.objects.using(target).bulk_create(chunk)
+            # bulk_create stamps auto_now fields with the current time; keep the originals.
+            for product, (created_at, updated_at) in zip(chunk, timestamps):
+                product.created_at, product.updated_at = created_at, updated_at
+            Product.objects.using(target).bulk_update(chunk, ['created_at', 'updated_at'])
+            copied += len(chunk)
+        BusinessProductStats.objects.using(target).bulk_create(
+            BusinessProductStats.objects.using(source).filter(business_id=business_id)
+        )
+        CatalogOutbox.objects.using(target).bulk_create(
+            [CatalogOutbox(product_id=product_id) for product_id in pending.values_list('product_id', flat=True)]
+        )
+    return copied
+
+
+def delete_business(business_id, alias: str):
+    products = Product.objects.using(alias).filter(business_id=business_id)
+    CatalogOutbox.objects.using(alias).filter(product_id__in=products.values('pk')).delete()
+    products.delete()
+    BusinessProductStats.objects.using(alias).filter(business_id=business_id).delete()
+
+
+def move_business(business_id, target: str, grace: float | None = None, batch_size: int = 500) -> int:
+    # Rebalances one tenant: copies its products, stats and pending catalogue changes to `target`, repoints the shard
+    # map and deletes the originals. Product writes get 503 from the moment the business is marked as moving; `grace`
+    # seconds let requests that read the old placement finish first.
+    # A process killed mid-move leaves the business marked as moving (see stalled_moves()), possibly with rows on
+    # both shards; recovery is re-running the same move. The copy replaces the target's leftovers, and a business
+    # already switched to `target` only has the originals still on other shards deleted.
+    if target not in settings.PRODUCT_SHARDS:
+        raise ValueError(f'Unknown product shard {target!r}; expected one of {settings.PRODUCT_SHARDS}.')
+    source, _ = load_placement(business_id)
+    if source == target:
+        for alias in settings.PRODUCT_SHARDS:
+            if alias != target:
+                delete_business(business_id, alias)
+        return 0
+    set_placement(business_id, source, moving=True)
+    try:
+        time.sleep(settings.PRODUCT_SHARD_MOVE_GRACE if grace is None else grace)
+        moved = copy_business(business_id, source, target, batch_size)
+        with transaction.atomic(using=source):
+            delete_business(business_id, source)
+            set_placement(business_id, target)
+    except BaseException:
+        set_placement(business_id, source)
+        raise
+    return moved
+
+
+def stalled_moves() -> list[tuple[int, str]]:
+    # (business_id, source alias) of businesses still marked as moving. A move in progress shows up here too.
+    moving = BusinessShard.objects.using(DEFAULT_DB_ALIAS).filter(moving=True).order_by('business_id')
+    return list(moving.values_list('business_id', 'alias'))
+
+
+def place_new_business(sender, instance, created, raw=False, **kwargs):
+    # New businesses are spread over PRODUCT_SHARDS_FOR_NEW_BUSINESSES by id; move_business rebalances later.
+    if created and not raw and sharding_enabled():
+        candidates = settings.PRODUCT_SHARDS_FOR_NEW_BUSINESSES
+        BusinessShard.objects.create(business=instance, alias=candidates[instance.pk % len(candidates)])
+
+
+def delete_sharded_products(sender, instance, **kwargs):
+    # Deleting a business cascades through `default` only; clear its rows on the shard that holds them.
+    alias = business_shard(instance.pk)
+    if alias != DEFAULT_DB_ALIAS:
+        delete_business(instance.pk, alias)
+
+
+def protect_sharded_products(sender, instance, **kwargs):
+    # The PROTECT/SET_NULL rules of Product's user references, for products on a shard the delete collector skips.
+    alias = business_shard(instance.business_id)
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    created = Product.objects.using(alias).filter(created_by_id=instance.pk)
+    if created.exists():
+        raise ProtectedError(
+            f'Cannot delete user {instance.pk}: products on shard {alias!r} reference them.', set(created[:20])
+        )
+    Product.objects.using(alias).filter(approved_by_id=instance.pk).update(approved_by=None)
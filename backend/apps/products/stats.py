@@ -0,0 +1,167 @@
+from collections import Counter
+from typing import NamedTuple
+
+from django.db import models
+from django.db.models import Case, Count, F, Max, Min, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import BusinessProductStats, Product, ProductStatus
+
+COUNT_FIELDS = {
+    ProductStatus.DRAFT: 'draft_count',
+    ProductStatus.PENDING_APPROVAL: 'pending_approval_count',
+    ProductStatus.APPROVED: 'approved_count',
+}
+STATS_FIELDS = (*COUNT_FIELDS.values(), 'price_total', 'price_min', 'price_max', 'last_approved_at')
+PRICE_FIELD = models.DecimalField(max_digits=10, decimal_places=2)
+TIMESTAMP_FIELD = models.DateTimeField()
+
+
+class ProductSnapshot(NamedTuple):
+    status: str
+    price: object
+    approved_at: object
+
+
+def snapshot(product) -> ProductSnapshot:
+    return ProductSnapshot(product.status, product.price, product.approved_at)
+
+
+def compute_stats(business_id) -> dict:
+    # Full aggregate over the business's products; used to create, rebuild and verify rows, never per request.
+    totals = Product.objects.filter(business_id=business_id).aggregate(
+        **{field: Count('pk', filter=Q(status=status)) for status, field in COUNT_FIELDS.items()},
+        price_total=Sum('price'),
+        price_min=Min('price'),
+        price_max=Max('price'),
+        last_approved_at=Max('approved_at', filter=Q(status=ProductStatus.APPROVED)),
+    )
+    totals['price_total'] = totals['price_total'] or 0
+    return totals
+
+
+def rebuild(business_id) -> BusinessProductStats:
+    stats, _ = BusinessProductStats.objects.update_or_create(
+        business_id=business_id, defaults=compute_stats(business_id)
+    )
+    return stats
+
+
+def first_value(business_id, ordering, **filters):
+    # ORDER BY ... LIMIT 1 seeks to one end of an index; a MIN()/MAX() over a filtered GROUP BY would walk it.
+    queryset = Product.objects.filter(business_id=business_id, **filters).order_by(ordering)
+    return Subquery(queryset.values(ordering.lstrip('-'))[:1])
+
+
+def bound(field, combine, added, removed, recompute, output_field):
+    # Adding a value can only widen the bound; removing the value that currently is the bound re-reads it through an
+    # index. The CASE keeps that subquery off the common path.
+    expression = F(field)
+    if added is not None:
+        added = Value(added, output_field=output_field)
+        expression = Coalesce(combine(expression, added), added, output_field=output_field)
+    if removed:
+        expression = Case(
+            When(**{f'{field}__in': removed}, then=recompute), default=expression, output_field=output_field
+        )
+    return expression
+
+
+def apply_changes(
+    business_id,
+    counts=None,
+    price_delta=0,
+    added_prices=(),
+    removed_prices=(),
+    approved_at=None,
+    removed_approved_at=None,
+):
+    # Runs inside the transaction that wrote the products, after the write, so recompute subqueries and a first-time
+    # rebuild already see it.
+    counts = counts or {}
+    changes = {field: F(field) + counts[status] for status, field in COUNT_FIELDS.items() if counts.get(status)}
+    if price_delta:
+        changes['price_total'] = F('price_total') + price_delta
+    if added_prices or removed_prices:
+        changes['price_min'] = bound(
+            'price_min',
+            Least,
+            min(added_prices, default=None),
+            removed_prices,
+            first_value(business_id, 'price'),
+            PRICE_FIELD,
+        )
+        changes['price_max'] = bound(
+            'price_max',
+            Greatest,
+            max(added_prices, default=None),
+            removed_prices,
+            first_value(business_id, '-price'),
+            PRICE_FIELD,
+        )
+    if approved_at is not None or removed_approved_at is not None:
+        changes['last_approved_at'] = bound(
+            'last_approved_at',
+            Greatest,
+            approved_at,
+            [removed_approved_at] if removed_approved_at is not None else [],
+            first_value(business_id, '-approved_at', status=ProductStatus.APPROVED, approved_at__isnull=False),
+            TIMESTAMP_FIELD,
+        )
+    if not changes:
+        return
+    if not BusinessProductStats.objects.filter(business_id=business_id).update(**changes, updated_at=timezone.now()):
+        rebuild(business_id)
+
+
+def record_created(business_id, products):
+    products = list(products)
+    if not products:
+        return
+    approved_at = [product.approved_at for product in products if product.approved_at is not None]
+    apply_changes(
+        business_id,
+        counts=Counter(product.status for product in products),
+        price_delta=sum(product.price for product in products),
+        added_prices=[product.price for product in products],
+        approved_at=max(approved_at, default=None),
+    )
+
+
+def record_updated(business_id, before: ProductSnapshot, product):
+    after = snapshot(product)
+    if after == before:
+        return
+    price_changed = after.price != before.price
+    approval_changed = after.approved_at != before.approved_at or after.status != before.status
+    was_counted = before.status == ProductStatus.APPROVED and before.approved_at is not None
+    is_counted = after.status == ProductStatus.APPROVED and after.approved_at is not None
+    apply_changes(
+        business_id,
+        counts={before.status: -1, after.status: 1} if after.status != before.status else None,
+        price_delta=after.price - before.price,
+        added_prices=[after.price] if price_changed else (),
+        removed_prices=[before.price] if price_changed else (),
+        approved_at=after.approved_at if approval_changed and is_counted else None,
+        removed_approved_at=before.approved_at if approval_changed and was_counted else None,
+    )
+
+
+def record_deleted(business_id, before: ProductSnapshot):
+    apply_changes(
+        business_id,
+        counts={before.status: -1},
+        price_delta=-before.price,
+        removed_prices=[before.price],
+        removed_approved_at=before.approved_at if before.status == ProductStatus.APPROVED else None,
+    )
+
+
+def record_bulk_approved(business_id, count: int, approved_at):
+    if count:
+        apply_changes(
+            business_id,
+            counts={ProductStatus.PENDING_APPROVAL: -count, ProductStatus.APPROVED: count},
+            approved_at=approved_at,
+        )
@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.utils import timezone
+
+from apps.jobs.queue import enqueue_on_commit, task
+
+from . import catalog, sharding
+from .images import generate_thumbnails, get_image_store
+from .models import Product
+
+
+@task('products.publish_catalog')
+def publish_catalog():
+    catalog.publish_pending()
+
+
+@task('products.generate_thumbnails')
+def generate_product_thumbnails(product_id: int, name: str, digest: str, business_id: int | None = None):
+    store = get_image_store()
+    thumbnail_names = generate_thumbnails(store, digest, store.read(name))
+    if not thumbnail_names:
+        return
+    # Resolved now rather than when queued, so a business moved in between is found on its new shard; while it is
+    # moving, ShardMoving fails the job and it is retried.
+    alias = sharding.business_shard(business_id, for_write=True)
+    with sharding.use_shard(alias), transaction.atomic(using=alias):
+        # Skipped if the product was deleted or has moved on to another image in the meantime. A derived field: the
+        # version stays, so an edit based on the ETag from before the thumbnail still applies.
+        updated = Product.objects.filter(pk=product_id, image_url=store.url(name)).update(
+            thumbnail_url=store.url(thumbnail_names[0]), updated_at=timezone.now()
+        )
+        if updated:
+            catalog.record_changes([product_id])
+
+
+def schedule_thumbnails(product, stored_image):
+    if stored_image is not None and stored_image.thumbnails_pending:
+        enqueue_on_commit(
+            'products.generate_thumbnails',
+            {
+                'product_id': product.pk,
+                'name': stored_image.name,
+                'digest': stored_image.digest,
+                'business_id': product.business_id,
+            },
+            idempotency_key=f'products.generate_thumbnails:{product.pk}:{stored_image.digest}',
+            using=sharding.current_shard(),
+        )
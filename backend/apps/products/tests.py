@@ -1,15 +1,86 @@
+import base64
+import csv
+import io
+import itertools
+import json
+import re
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from datetime import timedelta
 from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-from django.urls import reverse
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import F, ProtectedError
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
 
 from apps.accounts.models import Business, User, UserRole
-from apps.products.models import Product, ProductStatus
+from apps.core.metrics import metrics_view
+from apps.jobs.models import Job, JobStatus
+from apps.jobs.worker import Worker
+from apps.products import catalog
+from apps.products import stats as product_stats
+from apps.products.apps import check_stalled_shard_moves
+from apps.products.async_views import AsyncPublicProductListView
+from apps.products.cache import catalogue_cache
+from apps.products.images import HAS_PILLOW
+from apps.products.models import (
+    BusinessProductStats,
+    BusinessShard,
+    CatalogOutbox,
+    Product,
+    ProductStatus,
+    PublicCatalogEntry,
+)
+from apps.products.serializers import ProductSerializer, PublicProductSerializer
+from apps.products.sharding import copy_business, set_placement
+from apps.products.views import ProductViewSet
 
 
-class ProductWorkflowTests(APITestCase):
+# Serves the async views when a test overrides ROOT_URLCONF with this module.
+urlpatterns = [
+    path('api/public/products/', AsyncPublicProductListView.as_view(), name='public_products'),
+    path('metrics', metrics_view, name='metrics'),
+]
+
+
+# Background jobs run inline after commit, so captureOnCommitCallbacks(execute=True) also runs them.
+@override_settings(JOBS_EAGER=True)
+class ProductAPITestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def publish_catalog(self):
+        # Fixtures written straight through the ORM bypass the outbox; copy them into the public catalogue.
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog.rebuild()
+
+
+def make_png(color=(200, 30, 30)) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 600), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class ProductWorkflowTests(ProductAPITestCase):
     def setUp(self):
+        super().setUp()
         self.business = Business.objects.create(name='Stark Industries')
         self.business_two = Business.objects.create(name='Wayne Enterprises')
         self.editor = User.objects.create_user(
@@ -51,7 +122,8 @@ class ProductWorkflowTests(APITestCase):
         )
 
         self.authenticate('approver', 'password123')
-        approve_response = self.client.post(reverse('products-approve', args=[product.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_response = self.client.post(reverse('products-approve', args=[product.id]))
         self.assertEqual(approve_response.status_code, status.HTTP_200_OK)
 
         public_response = self.client.get(reverse('public_products'))
@@ -89,3 +161,1349 @@ class ProductWorkflowTests(APITestCase):
         response = self.client.get(f"{reverse('products-list')}?search=Mouse&ordering=price")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['results'][0]['name'], 'Mousepad')
+
+
+@unittest.skipUnless(HAS_PILLOW, 'Pillow is required to build test images.')
+class ProductImageTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.business = Business.objects.create(name='Stark Industries')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        self.client.force_authenticate(self.editor)
+
+    def create_product(self, **payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('products-list'),
+                {'name': 'Lamp', 'description': 'Desk lamp', 'price': '15.00', **payload},
+                format='json',
+            )
+
+    def test_data_url_is_moved_to_blob_store(self):
+        data_url = 'data:image/png;base64,' + base64.b64encode(make_png()).decode()
+        response = self.create_product(image_url=data_url)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['image_url'].startswith('/media/products/'))
+        self.assertLess(len(response.data['image_url']), 120)
+        # Thumbnails are generated after the response; until then the original stands in.
+        self.assertEqual(response.data['thumbnail_url'], response.data['image_url'])
+        product = Product.objects.get(pk=response.data['id'])
+        self.assertFalse(product.image_url.startswith('data:'))
+        self.assertTrue(product.thumbnail_url.endswith('-w320.jpg'))
+
+    def test_identical_images_are_stored_once(self):
+        data_url = 'data:image/png;base64,' + base64.b64encode(make_png()).decode()
+        first = self.create_product(image_url=data_url)
+        second = self.create_product(image_url=data_url)
+
+        self.assertEqual(first.data['image_url'], second.data['image_url'])
+        self.assertTrue(second.data['thumbnail_url'].endswith('-w320.jpg'))
+        stored_files = [path for path in Path(self.media_root).rglob('*') if path.is_file()]
+        self.assertEqual(len(stored_files), 1 + len(settings.PRODUCT_IMAGE_THUMBNAIL_SIZES))
+
+    def test_thumbnails_do_not_invalidate_the_editors_etag(self):
+        data_url = 'data:image/png;base64,' + base64.b64encode(make_png()).decode()
+        created = self.create_product(image_url=data_url)
+        url = reverse('products-detail', args=[created.data['id']])
+
+        # The job ran on commit: the thumbnail changed the validators for readers but not the version.
+        fetched = self.client.get(url)
+        self.assertTrue(fetched.data['thumbnail_url'].endswith('-w320.jpg'))
+        self.assertEqual(fetched.data['version'], created.data['version'])
+        self.assertNotEqual(fetched['ETag'], created['ETag'])
+
+        response = self.client.patch(url, {'name': 'Desk lamp'}, format='json', HTTP_IF_MATCH=created['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], created.data['version'] + 1)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_thumbnails_are_queued_once_per_product_and_image(self):
+        data_url = 'data:image/png;base64,' + base64.b64encode(make_png()).decode()
+        product_id = self.create_product(image_url=data_url).data['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('products-detail', args=[product_id]), {'image_url': data_url}, format='json')
+
+        job = Job.objects.get()
+        self.assertEqual(job.task, 'products.generate_thumbnails')
+        self.assertEqual(job.payload['product_id'], product_id)
+        self.assertEqual(Worker().work_off(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.SUCCEEDED)
+        self.assertTrue(Product.objects.get(pk=product_id).thumbnail_url.endswith('-w320.jpg'))
+
+    def test_invalid_image_is_rejected_before_saving(self):
+        data_url = 'data:image/png;base64,' + base64.b64encode(b'not an image').decode()
+        response = self.create_product(image_url=data_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Product.objects.exists())
+
+    @override_settings(JOBS_EAGER=False)
+    def test_truncated_image_is_rejected_before_queueing_thumbnails(self):
+        data_url = 'data:image/png;base64,' + base64.b64encode(make_png()[:-200]).decode()
+        response = self.create_product(image_url=data_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_multipart_upload(self):
+        upload = SimpleUploadedFile('lamp.png', make_png((10, 10, 200)), content_type='image/png')
+        response = self.client.post(
+            reverse('products-list'),
+            {'name': 'Lamp', 'description': 'Desk lamp', 'price': '15.00', 'image': upload},
+            format='multipart',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['image_url'].endswith('.png'))
+
+    def test_invalid_data_url_is_rejected(self):
+        response = self.create_product(image_url='data:image/png;base64,not-an-image')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image_url', response.data)
+
+
+class ProductKeysetPaginationTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        prices = ['5.00', '20.00', '20.00', '7.50', '20.00', '99.00', '1.00']
+        self.products = [
+            Product.objects.create(
+                business=self.business,
+                created_by=self.editor,
+                name=f'Product {index}',
+                price=Decimal(price),
+                status=ProductStatus.APPROVED,
+            )
+            for index, price in enumerate(prices)
+        ]
+        self.publish_catalog()
+        self.client.force_authenticate(self.editor)
+
+    def collect_pages(self, url):
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_walks_every_ordering_without_gaps_or_duplicates(self):
+        for ordering in ['price', '-price', 'created_at', '-created_at']:
+            with self.subTest(ordering=ordering):
+                ids, pages = self.collect_pages(f"{reverse('products-list')}?ordering={ordering}&page_size=2")
+                expected = list(
+                    Product.objects.order_by(ordering, ordering.replace('price', 'id').replace('created_at', 'id'))
+                    .values_list('id', flat=True)
+                )
+                self.assertEqual(ids, expected)
+                self.assertEqual(pages, 4)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(f"{reverse('products-list')}?ordering=price&page_size=3")
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(
+            [item['id'] for item in back.data['results']], [item['id'] for item in first.data['results']]
+        )
+        self.assertIsNone(back.data['previous'])
+
+    def test_count_can_be_skipped(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{reverse('public_products')}?count=false&page_size=2")
+        self.assertIsNone(response.data['count'])
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.client.get(reverse('public_products'))
+        self.assertEqual(response.data['count'], len(self.products))
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(f"{reverse('public_products')}?cursor=bogus")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Checks the SQLite connection profile.')
+class SQLiteConnectionTests(unittest.TestCase):
+    def test_connection_applies_pragmas_and_busy_timeout(self):
+        options = settings.DATABASES['default']['OPTIONS']
+        with connection.cursor() as cursor:
+            pragmas = {
+                name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('synchronous', 'cache_size', 'temp_store', 'busy_timeout')
+            }
+        self.assertEqual(pragmas['synchronous'], 1)
+        self.assertEqual(pragmas['cache_size'], -32000)
+        self.assertEqual(pragmas['temp_store'], 2)
+        self.assertEqual(pragmas['busy_timeout'], int(options['timeout'] * 1000))
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Query plan assertions target SQLite EXPLAIN QUERY PLAN output.')
+class ProductQueryPlanTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        for index, product_status in enumerate(ProductStatus.values * 2):
+            Product.objects.create(
+                business=self.business,
+                created_by=self.editor,
+                name=f'Mouse {index}',
+                price=Decimal(10 + index),
+                status=product_status,
+            )
+        self.publish_catalog()
+
+    def capture_product_queries(self, url, table='products_product'):
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT') and re.search(rf'\b{table}\b', sql):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            if response.data['next']:
+                self.client.get(response.data['next'])
+        return statements
+
+    def assert_no_full_scan(self, url, table='products_product'):
+        statements = self.capture_product_queries(url, table)
+        self.assertTrue(statements, url)
+        full_scan = re.compile(rf'^SCAN (TABLE )?{table}\b(?! USING)')
+        for sql, params in statements:
+            if ' WHERE ' not in sql and 'COUNT(' in sql:
+                # Every projection row is public, so the unfiltered total legitimately reads the whole table.
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            full_scans = [line for line in plan if full_scan.match(line)]
+            self.assertFalse(full_scans, f'{url} falls back to a full table scan:\n{sql}\n{plan}')
+
+    def test_dashboard_filters_use_indexes(self):
+        self.client.force_authenticate(self.editor)
+        combinations = itertools.product(
+            ['', 'status=approved', 'status=draft'],
+            ['', 'search=Mouse'],
+            ['', 'min_price=11', 'max_price=13', 'min_price=11&max_price=13'],
+            ['', 'ordering=price', 'ordering=-price', 'ordering=created_at', 'ordering=-created_at'],
+        )
+        for params in combinations:
+            query = '&'.join(param for param in (*params, 'page_size=1') if param)
+            with self.subTest(query=query):
+                self.assert_no_full_scan(f"{reverse('products-list')}?{query}")
+
+    def test_public_filters_use_indexes(self):
+        combinations = itertools.product(
+            ['', f'business_id={self.business.id}'],
+            ['', 'search=Mouse'],
+            ['', 'max_price=13'],
+        )
+        for params in combinations:
+            query = '&'.join(param for param in (*params, 'page_size=1') if param)
+            with self.subTest(query=query):
+                url = f"{reverse('public_products')}?{query}"
+                self.assert_no_full_scan(url, 'products_publiccatalogentry')
+                self.assertEqual(self.capture_product_queries(url), [], url)
+
+
+class ProductSearchTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        self.headset = self.create_product('Headset', 'Wireless audio with a detachable microphone')
+        self.microphone = self.create_product('Microphone', 'Studio condenser')
+        self.create_product('Monitor', '4K display')
+        self.publish_catalog()
+
+    def create_product(self, name, description, product_status=ProductStatus.APPROVED):
+        return Product.objects.create(
+            business=self.business,
+            created_by=self.editor,
+            name=name,
+            description=description,
+            price=Decimal('10.00'),
+            status=product_status,
+        )
+
+    def public_search(self, term):
+        response = self.client.get(reverse('public_products'), {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.data['results']]
+
+    def test_prefix_search_covers_description_and_ranks_name_matches_first(self):
+        self.assertEqual(self.public_search('micro'), ['Microphone', 'Headset'])
+
+    def test_ranked_results_paginate(self):
+        response = self.client.get(reverse('public_products'), {'search': 'micro', 'page_size': 1})
+        second = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['name'], 'Microphone')
+        self.assertEqual(second.data['results'][0]['name'], 'Headset')
+        self.assertIsNone(second.data['next'])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.public_search('wireless micro'), ['Headset'])
+        self.assertEqual(self.public_search('wireless monitor'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.microphone.name = 'Podcast kit'
+        self.microphone.save()
+        self.publish_catalog()
+        self.assertEqual(self.public_search('podcast'), ['Podcast kit'])
+
+        self.headset.delete()
+        self.publish_catalog()
+        self.assertEqual(self.public_search('micro'), [])
+
+    def test_dashboard_search_includes_drafts(self):
+        self.create_product('Microscope', 'Lab equipment', ProductStatus.DRAFT)
+        self.client.force_authenticate(self.editor)
+        response = self.client.get(reverse('products-list'), {'search': 'micro'})
+        self.assertEqual([item['name'] for item in response.data['results']], ['Microphone', 'Microscope', 'Headset'])
+
+
+class CatalogueCacheTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.business_two = Business.objects.create(name='Wayne Enterprises')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        self.approver = User.objects.create_user(
+            username='approver', password='password123', business=self.business, role=UserRole.APPROVER
+        )
+        self.other_editor = User.objects.create_user(
+            username='other', password='password123', business=self.business_two, role=UserRole.EDITOR
+        )
+        self.product = self.create_product(self.business, self.editor, 'Mouse', ProductStatus.APPROVED)
+        self.other_product = self.create_product(self.business_two, self.other_editor, 'Cape', ProductStatus.APPROVED)
+        self.publish_catalog()
+
+    def create_product(self, business, user, name, product_status):
+        return Product.objects.create(
+            business=business, created_by=user, name=name, price=Decimal('10.00'), status=product_status
+        )
+
+    def test_repeated_requests_are_served_from_cache(self):
+        url = f"{reverse('public_products')}?max_price=50"
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(f"{reverse('public_products')}?max_price=50&unrelated=1")
+        self.assertEqual(first.data, second.data)
+
+    def test_equivalent_searches_share_an_entry(self):
+        self.client.get(reverse('public_products'), {'search': 'Mouse'})
+        hits = catalogue_cache.stats()['hits']
+        with self.assertNumQueries(0):
+            self.client.get(reverse('public_products'), {'search': '  mouse '})
+        self.assertEqual(catalogue_cache.stats()['hits'], hits + 1)
+
+    def test_approval_invalidates_global_and_business_pages(self):
+        pending = self.create_product(self.business, self.editor, 'Keyboard', ProductStatus.PENDING_APPROVAL)
+        global_url = reverse('public_products')
+        business_url = f'{global_url}?business_id={self.business.id}'
+        self.assertEqual(self.client.get(global_url).data['count'], 2)
+        self.assertEqual(self.client.get(business_url).data['count'], 1)
+
+        self.client.force_authenticate(self.approver)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('products-approve', args=[pending.id]))
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.client.get(global_url).data['count'], 3)
+        self.assertEqual(self.client.get(business_url).data['count'], 2)
+
+    def test_other_business_pages_survive_writes(self):
+        other_url = f"{reverse('public_products')}?business_id={self.business_two.id}"
+        self.client.get(other_url)
+
+        self.client.force_authenticate(self.editor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('products-detail', args=[self.product.id]))
+        self.client.force_authenticate(None)
+
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+
+
+class PublicCatalogueFacetTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.stark = Business.objects.create(name='Stark Industries')
+        self.wayne = Business.objects.create(name='Wayne Enterprises')
+        self.oscorp = Business.objects.create(name='Oscorp')
+        editor = User.objects.create_user(
+            username='editor', password='password123', business=self.stark, role=UserRole.EDITOR
+        )
+        for business, price, product_status in [
+            (self.stark, '5.00', ProductStatus.APPROVED),
+            (self.stark, '10.00', ProductStatus.APPROVED),
+            (self.stark, '15.00', ProductStatus.APPROVED),
+            (self.wayne, '20.00', ProductStatus.APPROVED),
+            (self.wayne, '100.00', ProductStatus.APPROVED),
+            (self.oscorp, '50.00', ProductStatus.APPROVED),
+            (self.wayne, '1.00', ProductStatus.DRAFT),
+        ]:
+            Product.objects.create(
+                business=business, created_by=editor, name='Gadget', price=Decimal(price), status=product_status
+            )
+        self.publish_catalog()
+
+    def get_facets(self, query):
+        response = self.client.get(f"{reverse('public_products')}?facets=true&{query}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_adaptive_buckets_and_business_counts_come_with_the_page(self):
+        with self.assertNumQueries(2):
+            response = self.get_facets('price_buckets=4&page_size=2')
+
+        facets = response.data['facets']
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(facets['count'], 6)
+        self.assertEqual(facets['price'], {'min': '5.00', 'max': '100.00'})
+        self.assertEqual(
+            [(business['name'], business['count']) for business in facets['businesses']],
+            [('Stark Industries', 3), ('Wayne Enterprises', 2), ('Oscorp', 1)],
+        )
+        self.assertEqual(
+            facets['price_buckets'],
+            [
+                {'min': '5.00', 'max': '28.75', 'count': 4},
+                {'min': '28.75', 'max': '52.50', 'count': 1},
+                {'min': '52.50', 'max': '76.25', 'count': 0},
+                {'min': '76.25', 'max': '100.00', 'count': 1},
+            ],
+        )
+
+    def test_fixed_edges_with_business_and_min_price_filters(self):
+        response = self.get_facets(f'price_edges=10,50&business_id={self.stark.id},{self.wayne.id}&min_price=10')
+        facets = response.data['facets']
+        self.assertEqual(facets['count'], 4)
+        self.assertEqual(
+            facets['price_buckets'],
+            [
+                {'min': None, 'max': '10.00', 'count': 0},
+                {'min': '10.00', 'max': '50.00', 'count': 3},
+                {'min': '50.00', 'max': None, 'count': 1},
+            ],
+        )
+
+        repeated = self.client.get(
+            f"{reverse('public_products')}?business_id={self.wayne.id}&business_id={self.stark.id}&min_price=10"
+        )
+        self.assertEqual(repeated.data['count'], 4)
+        self.assertNotIn('facets', repeated.data)
+
+    def test_facets_are_cached_apart_from_pages_and_invalidated_by_writes(self):
+        first = self.get_facets('page_size=2')
+        with self.assertNumQueries(1):
+            second_page = self.client.get(first.data['next'])
+        self.assertEqual(second_page.data['facets'], first.data['facets'])
+
+        with self.assertNumQueries(0):
+            self.get_facets('page_size=2')
+
+        Product.objects.filter(business=self.oscorp).update(status=ProductStatus.DRAFT)
+        self.publish_catalog()
+        self.assertEqual(self.get_facets('page_size=2').data['facets']['count'], 5)
+
+    def test_invalid_facet_parameters_are_rejected(self):
+        for query in ['price_edges=50,10', 'price_buckets=0', 'min_price=20&max_price=10', 'business_id=abc']:
+            response = self.client.get(f"{reverse('public_products')}?facets=true&{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+class ProductConditionalRequestTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        self.product = Product.objects.create(
+            business=self.business,
+            created_by=self.editor,
+            name='Mouse',
+            price=Decimal('19.99'),
+            status=ProductStatus.APPROVED,
+        )
+        self.client.force_authenticate(self.editor)
+
+    def test_unchanged_list_returns_304_after_one_aggregate_query(self):
+        url = f"{reverse('products-list')}?ordering=price"
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        other_filter = self.client.get(
+            f"{reverse('products-list')}?ordering=-price", HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(other_filter.status_code, status.HTTP_200_OK)
+
+    def test_update_changes_list_and_detail_validators(self):
+        list_response = self.client.get(reverse('products-list'))
+        detail_url = reverse('products-detail', args=[self.product.id])
+        detail_response = self.client.get(detail_url)
+        self.assertEqual(
+            self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_response['ETag']).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        self.client.patch(detail_url, {'name': 'Trackball'}, format='json')
+
+        self.assertEqual(
+            self.client.get(reverse('products-list'), HTTP_IF_NONE_MATCH=list_response['ETag']).status_code,
+            status.HTTP_200_OK,
+        )
+        self.assertEqual(
+            self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_response['ETag']).status_code,
+            status.HTTP_200_OK,
+        )
+
+    def test_public_list_revalidates_from_cache_and_from_page_rows(self):
+        self.client.force_authenticate(None)
+        url = reverse('public_products')
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        uncounted = self.client.get(f'{url}?count=false')
+        cache.clear()
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(f'{url}?count=false', HTTP_IF_NONE_MATCH=uncounted['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+    def test_updates_apply_to_the_version_named_in_if_match(self):
+        url = reverse('products-detail', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag.startswith('"1.'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url, {'name': 'Trackball'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 2)
+        self.assertTrue(response['ETag'].startswith('"2.'))
+        product_queries = [query['sql'] for query in queries if 'products_product"' in query['sql']]
+        # get_object() and one conditional UPDATE of the changed fields; no second fetch of the row.
+        self.assertEqual(len(product_queries), 2)
+        self.assertTrue(product_queries[1].startswith('UPDATE'))
+        self.assertIn('"version" = ', product_queries[1])
+        self.assertNotIn('"price"', product_queries[1])
+
+        stale = self.client.patch(url, {'name': 'Touchpad'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(stale.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.version), ('Trackball', 2))
+
+    def test_price_only_patch_keeps_the_approval(self):
+        approved_at = timezone.now() - timedelta(days=1)
+        Product.objects.filter(pk=self.product.pk).update(approved_by=self.editor, approved_at=approved_at)
+        product_stats.rebuild(self.business.id)
+        url = reverse('products-detail', args=[self.product.id])
+
+        response = self.client.patch(url, {'price': '24.99'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.status, self.product.approved_by_id, self.product.approved_at, self.product.price),
+            (ProductStatus.APPROVED, self.editor.id, approved_at, Decimal('24.99')),
+        )
+        stats = BusinessProductStats.objects.get(business=self.business)
+        self.assertEqual((stats.approved_count, stats.last_approved_at), (1, approved_at))
+
+        self.client.patch(url, {'status': ProductStatus.DRAFT}, format='json')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.approved_by_id, self.product.approved_at), (None, None))
+
+    def test_update_racing_another_write_gets_409(self):
+        url = reverse('products-detail', args=[self.product.id])
+        get_object = ProductViewSet.get_object
+
+        def get_object_then_race(view):
+            product = get_object(view)
+            Product.objects.filter(pk=product.pk).update(status=ProductStatus.DRAFT, version=F('version') + 1)
+            return product
+
+        with mock.patch.object(ProductViewSet, 'get_object', get_object_then_race):
+            response = self.client.patch(url, {'price': '5.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.status), (Decimal('19.99'), ProductStatus.DRAFT))
+
+class ProductFastPathSerializationTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        self.approver = User.objects.create_user(
+            username='approver', password='password123', business=self.business, role=UserRole.APPROVER
+        )
+        for index, name in enumerate(['Mouse', 'Crème brûlée torch  ', 'Keyboard "Pro"', '漢字 lamp']):
+            Product.objects.create(
+                business=self.business,
+                created_by=self.editor,
+                name=name,
+                description=f'Line one\nLine two {index}',
+                image_url='https://example.com/image.png' if index % 2 else '',
+                price=Decimal('19.99') + index,
+                status=ProductStatus.APPROVED if index % 2 else ProductStatus.DRAFT,
+                approved_by=self.approver if index % 2 else None,
+            )
+        self.publish_catalog()
+
+    def expected_body(self, response, serializer_class, queryset):
+        return JSONRenderer().render(
+            OrderedDict(
+                [
+                    ('count', response.data['count']),
+                    ('next', response.data['next']),
+                    ('previous', response.data['previous']),
+                    ('results', serializer_class(queryset, many=True).data),
+                ]
+            )
+        )
+
+    def test_dashboard_list_matches_model_serializer_output(self):
+        self.client.force_authenticate(self.editor)
+        response = self.client.get(reverse('products-list'), {'ordering': 'price', 'page_size': 3})
+        expected = self.expected_body(response, ProductSerializer, Product.objects.order_by('price', 'id')[:3])
+        self.assertEqual(response.content, expected)
+
+    def test_public_list_matches_model_serializer_output(self):
+        response = self.client.get(reverse('public_products'))
+        queryset = Product.objects.filter(status=ProductStatus.APPROVED).order_by('-created_at', '-id')
+        self.assertEqual(response.content, self.expected_body(response, PublicProductSerializer, queryset))
+
+    def test_dashboard_list_does_not_load_users_per_row(self):
+        self.client.force_authenticate(self.editor)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('products-list'))
+
+
+@override_settings(PRODUCT_IMPORT_BATCH_SIZE=2)
+class ProductBulkTransferTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.other_business = Business.objects.create(name='Wayne Enterprises')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        self.client.force_authenticate(self.editor)
+
+    def test_csv_import_reports_invalid_rows_and_creates_the_rest(self):
+        body = (
+            'name,description,price,status,unknown\n'
+            'Mouse,Wireless,19.99,draft,x\n'
+            ',Missing name,5.00,draft,x\n'
+            'Keyboard,"Mechanical, tenkeyless",89.00,approved,x\n'
+            'Cable,USB-C,not-a-price,draft,x\n'
+            'Dock,,149.00,pending_approval,x\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('products-import'), data=body, content_type='text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 5])
+        self.assertIn('name', response.data['errors'][0]['errors'])
+        self.assertIn('price', response.data['errors'][1]['errors'])
+        products = Product.objects.filter(business=self.business)
+        self.assertEqual(set(products.values_list('name', flat=True)), {'Mouse', 'Keyboard', 'Dock'})
+        self.assertFalse(products.exclude(created_by=self.editor).exists())
+        self.assertEqual(products.get(name='Keyboard').description, 'Mechanical, tenkeyless')
+
+    def test_ndjson_import_reports_malformed_lines(self):
+        body = (
+            '{"name": "Mouse", "price": "19.99"}\n'
+            '\n'
+            'not json\n'
+            '[1, 2]\n'
+            '{"name": "Lamp", "price": "5", "status": "x"}\n'
+        )
+        response = self.client.post(reverse('products-import'), data=body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4, 5])
+
+    def test_multipart_import_and_all_invalid_upload(self):
+        upload = SimpleUploadedFile('products.ndjson', b'{"name": "Mouse", "price": "19.99"}\n')
+        response = self.client.post(reverse('products-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        upload = SimpleUploadedFile('products.csv', b'name,price\nMouse,free\n', content_type='text/csv')
+        response = self.client.post(reverse('products-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['failed'], 1)
+
+    @override_settings(PRODUCT_IMPORT_MAX_ERRORS=1)
+    def test_error_report_is_bounded(self):
+        body = 'name,price\nA,x\nB,y\nC,z\n'
+        response = self.client.post(reverse('products-import'), data=body, content_type='text/csv')
+        self.assertEqual(response.data['failed'], 3)
+        self.assertEqual(len(response.data['errors']), 1)
+        self.assertTrue(response.data['errors_truncated'])
+
+    def test_export_streams_filtered_business_catalogue(self):
+        for index, name in enumerate(['Mouse', 'Keyboard, "Pro"', 'Lamp']):
+            Product.objects.create(
+                business=self.business, created_by=self.editor, name=name, price=Decimal('10.00') + index
+            )
+        Product.objects.create(
+            business=self.other_business, created_by=self.editor, name='Batmobile', price=Decimal('1.00')
+        )
+
+        response = self.client.get(reverse('products-export'), {'ordering': 'price', 'max_price': '11.00'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['name'] for row in rows], ['Mouse', 'Keyboard, "Pro"'])
+        self.assertEqual(rows[0]['created_by'], 'editor')
+        self.assertEqual(rows[0]['approved_by'], '')
+
+        response = self.client.get(reverse('products-export'), {'file_format': 'ndjson', 'ordering': 'price'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        queryset = Product.objects.filter(business=self.business).order_by('price')
+        self.assertEqual(lines, json.loads(JSONRenderer().render(ProductSerializer(queryset, many=True).data)))
+
+    def test_export_round_trips_through_import(self):
+        Product.objects.create(business=self.business, created_by=self.editor, name='Mouse', price=Decimal('19.99'))
+        exported = b''.join(self.client.get(reverse('products-export')).streaming_content)
+
+        Product.objects.all().delete()
+        response = self.client.post(reverse('products-import'), data=exported, content_type='text/csv')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Product.objects.get().price, Decimal('19.99'))
+
+
+class ProductBulkApproveTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.other_business = Business.objects.create(name='Wayne Enterprises')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        self.approver = User.objects.create_user(
+            username='approver', password='password123', business=self.business, role=UserRole.APPROVER
+        )
+        self.products = {
+            name: Product.objects.create(
+                business=business, created_by=self.editor, name=name, price=Decimal(price), status=product_status
+            )
+            for name, price, product_status, business in [
+                ('Mouse', '19.99', ProductStatus.PENDING_APPROVAL, self.business),
+                ('Keyboard', '89.00', ProductStatus.PENDING_APPROVAL, self.business),
+                ('Lamp', '25.00', ProductStatus.DRAFT, self.business),
+                ('Batmobile', '10.00', ProductStatus.PENDING_APPROVAL, self.other_business),
+            ]
+        }
+        product_stats.rebuild(self.business.id)
+        self.client.force_authenticate(self.approver)
+
+    def test_approves_pending_ids_in_one_update_and_reports_skipped(self):
+        ids = [self.products[name].id for name in ['Mouse', 'Keyboard', 'Lamp', 'Batmobile']] + [999999]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertNumQueries(7):
+                response = self.client.post(reverse('products-bulk-approve'), {'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['approved'], [self.products['Mouse'].id, self.products['Keyboard'].id])
+        self.assertEqual(
+            response.data['skipped'],
+            [
+                {'id': self.products['Lamp'].id, 'reason': 'not_pending'},
+                {'id': self.products['Batmobile'].id, 'reason': 'not_found'},
+                {'id': 999999, 'reason': 'not_found'},
+            ],
+        )
+        # Publishing the outbox, then invalidating the catalogue cache once the projection commits.
+        self.assertEqual(len(callbacks), 2)
+        mouse = Product.objects.get(pk=self.products['Mouse'].id)
+        self.assertEqual((mouse.status, mouse.approved_by), (ProductStatus.APPROVED, self.approver))
+        self.assertEqual(Product.objects.get(name='Batmobile').status, ProductStatus.PENDING_APPROVAL)
+
+        repeated = self.client.post(reverse('products-bulk-approve'), {'ids': ids[:1]}, format='json')
+        self.assertEqual(repeated.data, {'approved': [], 'skipped': [{'id': ids[0], 'reason': 'not_pending'}]})
+
+    def test_reports_only_its_own_rows_when_approvals_share_a_timestamp(self):
+        now = timezone.now()
+        Product.objects.filter(pk=self.products['Lamp'].id).update(
+            status=ProductStatus.APPROVED, approved_by=self.approver, approved_at=now, updated_at=now
+        )
+        with mock.patch('apps.products.views.timezone.now', return_value=now):
+            response = self.client.post(
+                reverse('products-bulk-approve'), {'ids': [self.products['Mouse'].id]}, format='json'
+            )
+        self.assertEqual(response.data['approved'], [self.products['Mouse'].id])
+
+    def test_approves_by_filter(self):
+        response = self.client.post(
+            reverse('products-bulk-approve'), {'filter': {'search': 'key', 'max_price': '100'}}, format='json'
+        )
+        self.assertEqual(response.data['approved'], [self.products['Keyboard'].id])
+        self.assertEqual(Product.objects.filter(status=ProductStatus.APPROVED).count(), 1)
+
+    def test_requires_approver_and_exactly_one_selector(self):
+        self.assertEqual(
+            self.client.post(reverse('products-bulk-approve'), {}, format='json').status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(
+            self.client.post(
+                reverse('products-bulk-approve'), {'ids': [1], 'filter': {}}, format='json'
+            ).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.client.force_authenticate(self.editor)
+        response = self.client.post(
+            reverse('products-bulk-approve'), {'ids': [self.products['Mouse'].id]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProductStatsTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.approver = User.objects.create_user(
+            username='approver', password='password123', business=self.business, role=UserRole.APPROVER
+        )
+        self.client.force_authenticate(self.approver)
+
+    def create_product(self, name, price, product_status=ProductStatus.PENDING_APPROVAL):
+        response = self.client.post(
+            reverse('products-list'), {'name': name, 'price': price, 'status': product_status}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def get_stats(self):
+        response = self.client.get(reverse('products-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def assert_stats_match_products(self):
+        call_command('rebuild_product_stats', verify=True, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_stats_follow_product_writes(self):
+        self.assertEqual(self.get_stats()['total_count'], 0)
+        mouse = self.create_product('Mouse', '10.00')
+        keyboard = self.create_product('Keyboard', '30.00')
+        lamp = self.create_product('Lamp', '20.00', ProductStatus.DRAFT)
+
+        approved = self.client.post(reverse('products-approve', args=[mouse]))
+        self.assertEqual(approved.status_code, status.HTTP_200_OK)
+        self.client.patch(reverse('products-detail', args=[lamp]), {'price': '5.00'}, format='json')
+        self.client.delete(reverse('products-detail', args=[keyboard]))
+
+        stats = self.get_stats()
+        self.assertEqual(
+            (stats['draft_count'], stats['pending_approval_count'], stats['approved_count'], stats['total_count']),
+            (1, 0, 1, 2),
+        )
+        self.assertEqual((stats['price_min'], stats['price_max'], stats['price_avg']), ('5.00', '10.00', '7.50'))
+        self.assertEqual(
+            stats['last_approved_at'], Product.objects.get(pk=mouse).approved_at.isoformat().replace('+00:00', 'Z')
+        )
+        self.assert_stats_match_products()
+
+        self.client.delete(reverse('products-detail', args=[mouse]))
+        stats = self.get_stats()
+        self.assertIsNone(stats['last_approved_at'])
+        self.assertEqual((stats['price_min'], stats['price_max']), ('5.00', '5.00'))
+        self.assert_stats_match_products()
+
+    def test_bulk_approve_and_import_update_stats(self):
+        ids = [self.create_product(name, price) for name, price in [('Mouse', '10.00'), ('Keyboard', '30.00')]]
+        self.client.post(reverse('products-bulk-approve'), {'ids': ids}, format='json')
+        rows = 'name,price,status\nLamp,99.50,draft\nChair,1.25,pending_approval\n'
+        self.client.generic('POST', reverse('products-import'), rows, content_type='text/csv')
+
+        stats = self.get_stats()
+        self.assertEqual((stats['approved_count'], stats['draft_count'], stats['pending_approval_count']), (2, 1, 1))
+        self.assertEqual((stats['price_min'], stats['price_max']), ('1.25', '99.50'))
+        self.assert_stats_match_products()
+
+    def test_stats_read_one_row(self):
+        self.create_product('Mouse', '10.00')
+        with self.assertNumQueries(1):
+            self.get_stats()
+
+    def test_verify_reports_drift_and_rebuild_repairs_it(self):
+        self.create_product('Mouse', '10.00')
+        BusinessProductStats.objects.filter(business=self.business).update(pending_approval_count=7)
+        with self.assertRaises(CommandError):
+            self.assert_stats_match_products()
+
+        call_command('rebuild_product_stats', stdout=io.StringIO())
+        self.assert_stats_match_products()
+        self.assertEqual(self.get_stats()['pending_approval_count'], 1)
+
+
+class PublicCatalogProjectionTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.approver = User.objects.create_user(
+            username='approver', password='password123', business=self.business, role=UserRole.APPROVER
+        )
+        self.client.force_authenticate(self.approver)
+
+    def write(self, method, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.data)
+        return response
+
+    def public_names(self):
+        response = self.client.get(reverse('public_products'))
+        return [item['name'] for item in response.data['results']]
+
+    def test_projection_follows_approve_edit_unapprove_and_delete(self):
+        product_id = self.write(
+            'post', reverse('products-list'), {'name': 'Mouse', 'price': '10.00', 'status': 'pending_approval'}
+        ).data['id']
+        self.assertEqual(self.public_names(), [])
+
+        self.write('post', reverse('products-approve', args=[product_id]))
+        self.assertEqual(self.public_names(), ['Mouse'])
+        self.assertFalse(CatalogOutbox.objects.exists())
+
+        self.write('patch', reverse('products-detail', args=[product_id]), {'name': 'Trackball', 'status': 'approved'})
+        self.assertEqual(self.public_names(), ['Trackball'])
+        self.assertEqual(PublicCatalogEntry.objects.get(pk=product_id).name, 'Trackball')
+
+        self.write('patch', reverse('products-detail', args=[product_id]), {'status': 'draft'})
+        self.assertEqual(self.public_names(), [])
+
+        self.write('patch', reverse('products-detail', args=[product_id]), {'status': 'approved'})
+        self.write('delete', reverse('products-detail', args=[product_id]))
+        self.assertFalse(PublicCatalogEntry.objects.exists())
+
+    @override_settings(JOBS_EAGER=False)
+    def test_worker_publishes_after_the_request(self):
+        product_id = self.write(
+            'post', reverse('products-list'), {'name': 'Mouse', 'price': '10.00', 'status': 'approved'}
+        ).data['id']
+        self.assertEqual(self.public_names(), [])
+        self.assertEqual(CatalogOutbox.objects.get().product_id, product_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Worker().work_off(), 1)
+        self.assertEqual(self.public_names(), ['Mouse'])
+        self.assertEqual(Job.objects.get().status, JobStatus.SUCCEEDED)
+
+    def test_bulk_approve_and_import_publish(self):
+        payloads = [{'name': name, 'price': '5.00', 'status': 'pending_approval'} for name in ['Mouse', 'Keyboard']]
+        ids = [self.write('post', reverse('products-list'), payload).data['id'] for payload in payloads]
+        self.write('post', reverse('products-bulk-approve'), {'ids': ids})
+        rows = 'name,price,status\nLamp,9.00,approved\nDesk,9.00,draft\n'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.generic('POST', reverse('products-import'), rows, content_type='text/csv')
+        self.assertEqual(sorted(self.public_names()), ['Keyboard', 'Lamp', 'Mouse'])
+
+    def test_changes_wait_in_the_outbox_until_commit(self):
+        product = Product.objects.create(
+            business=self.business,
+            created_by=self.approver,
+            name='Mouse',
+            price=Decimal('10.00'),
+            status=ProductStatus.APPROVED,
+        )
+        # The commit hook never runs, as after a crash between the write and the publish.
+        catalog.record_changes([product.pk])
+        self.assertEqual(self.public_names(), [])
+
+        output = io.StringIO()
+        call_command('sync_public_catalog', stdout=output)
+        self.assertIn('Applied 1 pending', output.getvalue())
+        cache.clear()
+        self.assertEqual(self.public_names(), ['Mouse'])
+
+    def test_rebuild_drops_stale_entries(self):
+        product = Product.objects.create(
+            business=self.business,
+            created_by=self.approver,
+            name='Mouse',
+            price=Decimal('10.00'),
+            status=ProductStatus.APPROVED,
+        )
+        self.publish_catalog()
+        Product.objects.filter(pk=product.pk).update(status=ProductStatus.DRAFT, name='Draft mouse')
+        call_command('sync_public_catalog', rebuild=True, stdout=io.StringIO())
+        self.assertFalse(PublicCatalogEntry.objects.exists())
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_SAMPLE_RATE=1.0, METRICS_SERVER_TIMING=True, METRICS_TOKEN='secret')
+class RequestMetricsTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        Product.objects.create(
+            business=self.business,
+            created_by=self.editor,
+            name='Mouse',
+            price=Decimal('19.99'),
+            status=ProductStatus.APPROVED,
+        )
+
+    def sample_count(self, body: str, metric: str, endpoint: str) -> float:
+        match = re.search(rf'^{metric}\{{endpoint="{endpoint}",method="GET"\}} (\S+)$', body, re.MULTILINE)
+        return float(match.group(1)) if match else 0.0
+
+    def get_metrics(self, **headers):
+        return self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret', **headers)
+
+    def test_requests_are_recorded_per_url_name(self):
+        before = self.get_metrics().content.decode()
+        response = self.client.get(reverse('public_products'))
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+
+        metrics = self.get_metrics()
+        self.assertTrue(metrics['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = metrics.content.decode()
+        for metric in ['http_request_duration_seconds_count', 'http_request_queries_count']:
+            self.assertEqual(
+                self.sample_count(body, metric, 'public_products'),
+                self.sample_count(before, metric, 'public_products') + 1,
+            )
+        self.assertGreater(self.sample_count(body, 'http_response_size_bytes_sum', 'public_products'), 0)
+        self.assertIn('http_requests_total{endpoint="public_products",method="GET",status="200"}', body)
+        self.assertIn('# TYPE catalogue_cache_misses_total counter', body)
+
+    def test_repeated_statements_are_counted_as_duplicates(self):
+        from apps.core.metrics import QueryRecorder
+
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for product in Product.objects.all():
+                product.created_by.username
+            list(Product.objects.filter(created_by=self.editor))
+            User.objects.get(pk=self.editor.pk)
+        self.assertEqual((recorder.count, recorder.duplicates), (4, 1))
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_sampling_and_token(self):
+        response = self.client.get(reverse('public_products'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.get_metrics().status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_without_a_token_are_only_served_in_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_200_OK)
+
+
+class AsyncPublicProductListTests(ProductAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.editor = User.objects.create_user(
+            username='editor', password='password123', business=self.business, role=UserRole.EDITOR
+        )
+        for index, name in enumerate(['Mouse', 'Keyboard', 'Monitor', 'Draft lamp']):
+            Product.objects.create(
+                business=self.business,
+                created_by=self.editor,
+                name=name,
+                price=Decimal('10.00') + index,
+                status=ProductStatus.DRAFT if name == 'Draft lamp' else ProductStatus.APPROVED,
+            )
+        self.publish_catalog()
+
+    def test_matches_sync_view_and_shares_its_cache(self):
+        url = f"{reverse('public_products')}?page_size=2"
+        sync_response = self.client.get(url)
+        cache.clear()
+
+        with override_settings(ROOT_URLCONF=__name__):
+            async_response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(async_response['ETag'], sync_response['ETag'])
+
+        hits = catalogue_cache.stats()['hits']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content, sync_response.content)
+        self.assertEqual(catalogue_cache.stats()['hits'], hits + 1)
+
+    def test_facets_match_sync_view(self):
+        url = f"{reverse('public_products')}?facets=true&price_edges=11&page_size=2"
+        sync_response = self.client.get(url)
+        cache.clear()
+
+        with override_settings(ROOT_URLCONF=__name__):
+            async_response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(async_response['ETag'], sync_response['ETag'])
+        self.assertEqual([bucket['count'] for bucket in sync_response.data['facets']['price_buckets']], [1, 2])
+
+    @override_settings(ROOT_URLCONF=__name__, METRICS_SERVER_TIMING=True, METRICS_SAMPLE_RATE=1.0)
+    async def test_pages_revalidates_and_validates_filters(self):
+        first = await self.async_client.get(reverse('public_products'), {'page_size': 2, 'count': 'false'})
+        self.assertRegex(first['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        second = await self.async_client.get(first.json()['next'])
+        names = [row['name'] for row in first.json()['results'] + second.json()['results']]
+        self.assertEqual(names, ['Monitor', 'Keyboard', 'Mouse'])
+
+        not_modified = await self.async_client.get(
+            reverse('public_products'), {'page_size': 2, 'count': 'false'}, headers={'If-None-Match': first['ETag']}
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        invalid = await self.async_client.get(reverse('public_products'), {'max_price': 'cheap'})
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('max_price', invalid.json())
+        bad_cursor = await self.async_client.get(reverse('public_products'), {'cursor': 'bogus'})
+        self.assertEqual(bad_cursor.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# New businesses go to a second SQLite shard. It is registered after the test databases are set up, so it is
+# migrated here rather than by the test runner.
+@override_settings(
+    JOBS_EAGER=True, PRODUCT_SHARDS=['default', 'shard_b'], PRODUCT_SHARDS_FOR_NEW_BUSINESSES=['shard_b']
+)
+class ProductShardingTests(APITransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.shard_dir = tempfile.mkdtemp()
+        connections.settings['shard_b'] = {
+            **connections['default'].settings_dict,
+            'NAME': str(Path(cls.shard_dir) / 'shard_b.sqlite3'),
+        }
+        cls.databases = {*cls.databases, 'shard_b'}
+        call_command('migrate', database='shard_b', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['shard_b'].close()
+        del connections['shard_b']
+        del connections.settings['shard_b']
+        shutil.rmtree(cls.shard_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.approver = User.objects.create_user(
+            username='approver', password='password123', business=self.business, role=UserRole.APPROVER
+        )
+        self.client.force_authenticate(self.approver)
+
+    def create_product(self, name, price='10.00', status='approved'):
+        response = self.client.post(
+            reverse('products-list'), {'name': name, 'price': price, 'status': status}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_products_are_written_to_the_business_shard(self):
+        self.assertEqual(BusinessShard.objects.get(business=self.business).alias, 'shard_b')
+        product_id = self.create_product('Mouse')
+
+        # Ids carry the shard's position, so they stay unique across shards.
+        self.assertEqual(product_id % settings.PRODUCT_SHARD_ID_STRIDE, 1)
+        self.assertFalse(Product.objects.using('default').exists())
+        self.assertEqual(Product.objects.using('shard_b').get().pk, product_id)
+        self.assertEqual(BusinessProductStats.objects.using('shard_b').get().approved_count, 1)
+        # Usernames come from `default` in a separate query, since the shard has no users table.
+        listed = self.client.get(reverse('products-list')).data['results']
+        self.assertEqual([(item['id'], item['created_by']) for item in listed], [(product_id, 'approver')])
+        export = self.client.get(reverse('products-export'), {'file_format': 'ndjson'})
+        self.assertEqual(json.loads(b''.join(export.streaming_content))['created_by'], 'approver')
+        public = self.client.get(reverse('public_products')).data['results']
+        self.assertEqual([item['id'] for item in public], [product_id])
+
+    def test_move_business_keeps_ids_timestamps_and_catalogue(self):
+        product_ids = [self.create_product('Mouse'), self.create_product('Lamp', status='draft')]
+        created_at = dict(Product.objects.using('shard_b').values_list('pk', 'created_at'))
+
+        output = io.StringIO()
+        call_command('move_business_shard', self.business.pk, 'default', grace=0, stdout=output)
+        self.assertIn('Moved 2 products', output.getvalue())
+
+        self.assertFalse(Product.objects.using('shard_b').exists())
+        self.assertEqual(dict(Product.objects.using('default').values_list('pk', 'created_at')), created_at)
+        self.assertEqual(BusinessProductStats.objects.using('default').get().draft_count, 1)
+        self.assertEqual(BusinessShard.objects.get(business=self.business).alias, 'default')
+        public = self.client.get(reverse('public_products')).data['results']
+        self.assertEqual([item['id'] for item in public], product_ids[:1])
+        # New products on `default` get `default` ids past the moved ones.
+        desk = self.create_product('Desk')
+        self.assertEqual(desk % settings.PRODUCT_SHARD_ID_STRIDE, 0)
+        self.assertGreater(desk, max(product_ids))
+
+    def test_writes_get_503_while_the_business_moves(self):
+        set_placement(self.business.pk, 'shard_b', moving=True)
+        response = self.client.post(reverse('products-list'), {'name': 'Mouse', 'price': '10.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get(reverse('products-list')).status_code, status.HTTP_200_OK)
+
+    def test_interrupted_moves_are_reported_and_finished_by_re_running(self):
+        product_id = self.create_product('Mouse')
+        # Killed after the copy, before the switch: rows on both shards and the business still marked as moving.
+        set_placement(self.business.pk, 'shard_b', moving=True)
+        copy_business(self.business.pk, 'shard_b', 'default', batch_size=500)
+        warnings = check_stalled_shard_moves(databases=['default'])
+        self.assertEqual([(warning.id, warning.obj) for warning in warnings], [('products.W001', None)])
+        self.assertIn(f'Business {self.business.pk} ', warnings[0].msg)
+
+        call_command('move_business_shard', self.business.pk, 'default', grace=0, stdout=io.StringIO())
+        self.assertEqual(check_stalled_shard_moves(databases=['default']), [])
+        self.assertEqual(list(Product.objects.using('default').values_list('pk', flat=True)), [product_id])
+        self.assertFalse(Product.objects.using('shard_b').exists())
+
+        # Killed after the switch, before the originals were deleted: re-running only clears them.
+        copy_business(self.business.pk, 'default', 'shard_b', batch_size=500)
+        output = io.StringIO()
+        call_command('move_business_shard', self.business.pk, 'default', grace=0, stdout=output)
+        self.assertIn('removed leftovers', output.getvalue())
+        self.assertFalse(Product.objects.using('shard_b').exists())
+        self.assertEqual(Product.objects.using('default').count(), 1)
+
+    def test_stats_are_verified_on_every_shard(self):
+        self.create_product('Mouse')
+        other = Business.objects.create(name='Wayne Enterprises')
+        set_placement(other.pk, 'default')
+        BusinessProductStats.objects.using('shard_b').update(approved_count=5)
+
+        with self.assertRaisesMessage(CommandError, '1 of 2 businesses'):
+            call_command('rebuild_product_stats', verify=True, stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('rebuild_product_stats', stdout=io.StringIO())
+        self.assertEqual(BusinessProductStats.objects.using('shard_b').get().approved_count, 1)
+
+    def test_deletes_follow_references_onto_the_shard(self):
+        self.create_product('Mouse')
+        with self.assertRaises(ProtectedError):
+            self.approver.delete()
+
+        self.business.delete()
+        self.assertFalse(Product.objects.using('shard_b').exists())
+        self.assertFalse(BusinessProductStats.objects.using('shard_b').exists())
+        self.assertFalse(PublicCatalogEntry.objects.exists())
+
+
+# A second SQLite file stands in for a read replica of `default`, and sync_replicas for replication.
+@override_settings(JOBS_EAGER=True, DATABASE_REPLICAS=['replica'])
+class ProductReplicaTests(APITransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'NAME': str(Path(cls.replica_dir) / 'replica.sqlite3'),
+        }
+        cls.databases = {*cls.databases, 'replica'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name='Stark Industries')
+        self.approver = User.objects.create_user(
+            username='approver', password='password123', business=self.business, role=UserRole.APPROVER
+        )
+        self.client.force_authenticate(self.approver)
+        self.sync()
+
+    def sync(self):
+        call_command('sync_replicas', stdout=io.StringIO())
+
+    def create_product(self, name):
+        response = self.client.post(
+            reverse('products-list'), {'name': name, 'price': '10.00', 'status': 'approved'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response
+
+    def test_reads_come_from_the_replica(self):
+        product_id = self.create_product('Mouse').data['id']
+        self.client.cookies.pop(settings.DATABASE_REPLICA_STICKY_COOKIE)
+
+        self.assertEqual(self.client.get(reverse('products-list')).data['results'], [])
+        self.assertEqual(self.client.get(reverse('public_products')).data['results'], [])
+
+        self.sync()
+        # The empty catalogue page read from the lagging replica is still cached, briefly.
+        cache.clear()
+        listed = self.client.get(reverse('products-list')).data['results']
+        self.assertEqual([item['id'] for item in listed], [product_id])
+        public = self.client.get(reverse('public_products')).data['results']
+        self.assertEqual([item['id'] for item in public], [product_id])
+
+    def test_a_write_keeps_its_author_on_the_primary(self):
+        product_id = self.create_product('Mouse').data['id']
+        url = reverse('products-detail', args=[product_id])
+
+        response = self.client.patch(url, {'name': 'Trackball'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sticky = response.cookies[settings.DATABASE_REPLICA_STICKY_COOKIE]
+        self.assertEqual(sticky['max-age'], settings.DATABASE_REPLICA_STICKY_SECONDS)
+        self.assertEqual(self.client.get(url).data['name'], 'Trackball')
+
+        self.client.cookies.pop(settings.DATABASE_REPLICA_STICKY_COOKIE)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        # Clients that do not keep cookies send the token back in a header instead; a forged one is ignored.
+        header = settings.DATABASE_REPLICA_STICKY_HEADER
+        self.assertEqual(response[header], sticky.value)
+        self.assertEqual(self.client.get(url, headers={header: response[header]}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, headers={header: '1'}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_failed_writes_do_not_pin_the_client_to_the_primary(self):
+        response = self.client.post(reverse('products-list'), {'name': ''}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(settings.DATABASE_REPLICA_STICKY_COOKIE, response.cookies)
+        self.assertFalse(response.has_header(settings.DATABASE_REPLICA_STICKY_HEADER))
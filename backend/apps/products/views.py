@@ -1,12 +1,48 @@
+from django.conf import settings
+from django.db.models import F, Value
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import serializers, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import ListAPIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from .models import Product, ProductStatus
-from .permissions import CanApproveProducts, CanManageProducts
-from .serializers import ProductSerializer, PublicProductSerializer
+from apps.accounts.models import Permission
+from apps.accounts.permissions import HasActionPermissions
+from apps.core.conditional import ConditionalResponseMixin, EditConflict
+from apps.core import replicas
+from apps.core.pagination import KeysetPagination
+from apps.core.rows import RowSerializerMixin
+
+from . import catalog, sharding
+from . import stats as product_stats
+from .bulk import (
+    CSVStreamParser,
+    NDJSONStreamParser,
+    ProductImporter,
+    rows_for_upload,
+    stream_csv,
+    stream_ndjson,
+)
+from .cache import catalogue_cache
+from .facets import FACET_PARAMS, compute_facets
+from .models import BusinessProductStats, Product, ProductStatus, PublicCatalogEntry
+from .search import search_products
+from .serializers import (
+    BusinessProductStatsSerializer,
+    ProductSerializer,
+    PublicProductSerializer,
+    product_row_serializer,
+    product_rows_serializer,
+    public_product_row_serializer,
+    with_usernames,
+)
+from .tasks import schedule_thumbnails
+
+# Keeps each `pk IN (...)` of a bulk approval under SQLite's bound-parameter limit.
+BULK_APPROVE_BATCH_SIZE = 500
 
 
 class ProductFilterSerializer(serializers.Serializer):
@@ -24,72 +60,358 @@ class ProductFilterSerializer(serializers.Serializer):
         return attrs
 
 
+class BulkApproveFilterSerializer(serializers.Serializer):
+    search = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+
+class BulkApproveSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.PRODUCT_BULK_APPROVE_MAX_IDS,
+        required=False,
+    )
+    filter = BulkApproveFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Provide either ids or filter.')
+        return attrs
+
+
+class ProductExportSerializer(serializers.Serializer):
+    file_format = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+
+
+class CommaSeparatedListField(serializers.ListField):
+    # Accepts repeated parameters (?business_id=1&business_id=2) as well as comma-separated values (?business_id=1,2).
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [data]
+        return super().to_internal_value([item for value in data for item in str(value).split(',') if item.strip()])
+
+
 class PublicProductFilterSerializer(serializers.Serializer):
-    business_id = serializers.IntegerField(required=False)
+    business_id = CommaSeparatedListField(
+        child=serializers.IntegerField(), max_length=settings.PRODUCT_FILTER_MAX_BUSINESSES, required=False
+    )
     search = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    facets = serializers.BooleanField(default=False)
+    price_buckets = serializers.IntegerField(
+        min_value=1, max_value=settings.PRODUCT_FACET_MAX_PRICE_BUCKETS, default=settings.PRODUCT_FACET_PRICE_BUCKETS
+    )
+    price_edges = CommaSeparatedListField(
+        child=serializers.DecimalField(max_digits=10, decimal_places=2),
+        max_length=settings.PRODUCT_FACET_MAX_PRICE_BUCKETS - 1,
+        required=False,
+    )
 
+    def validate_price_edges(self, value):
+        if any(low >= high for low, high in zip(value, value[1:])):
+            raise serializers.ValidationError('price_edges must be strictly increasing.')
+        return value
 
-class ProductViewSet(viewsets.ModelViewSet):
+    def validate(self, attrs):
+        min_price = attrs.get('min_price')
+        max_price = attrs.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError({'max_price': 'max_price must be greater than or equal to min_price.'})
+        return attrs
+
+
+def public_product_filters(query_params) -> dict:
+    serializer = PublicProductFilterSerializer(data=query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def public_products_queryset(filters):
+    # Served from the projection, so public reads never touch products_product or wait on its write locks.
+    queryset = PublicCatalogEntry.objects.annotate(status=Value(ProductStatus.APPROVED.value))
+
+    business_ids = [business_id for business_id in filters.get('business_id', []) if business_id]
+    if len(business_ids) == 1:
+        queryset = queryset.filter(business_id=business_ids[0])
+    elif business_ids:
+        queryset = queryset.filter(business_id__in=business_ids)
+    if filters.get('min_price') is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters.get('max_price') is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if filters.get('search'):
+        queryset = search_products(queryset, filters['search']).order_by('search_rank')
+
+    return queryset
+
+
+def with_facets(data, facets):
+    return data if facets is None else {**data, 'facets': facets['data']}
+
+
+class ProductViewSet(RowSerializerMixin, ConditionalResponseMixin, viewsets.ModelViewSet):
     serializer_class = ProductSerializer
-    permission_classes = [IsAuthenticated, CanManageProducts]
+    row_serializer = product_row_serializer
+    permission_classes = [IsAuthenticated, HasActionPermissions]
+    action_permissions = {
+        '*': Permission.MANAGE_PRODUCTS,
+        'approve': Permission.APPROVE_PRODUCTS,
+        'bulk_approve': Permission.APPROVE_PRODUCTS,
+    }
+    pagination_class = KeysetPagination
+    version_field = 'version'
+    shard_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Every product query of the request goes to the business's shard; writes get 503 while it is being moved.
+        alias = sharding.business_shard(request.user.business_id, for_write=request.method not in SAFE_METHODS)
+        self.shard_token = sharding.select_shard(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.shard_token is not None:
+            sharding.release_shard(self.shard_token)
+            self.shard_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = Product.objects.filter(business=self.request.user.business)
+        # Pinned to the shard (or its replica), since an export is streamed after the request has released it.
+        alias = replicas.read_alias(sharding.current_shard())
+        queryset = Product.objects.using(alias).filter(business_id=self.request.user.business_id)
         serializer = ProductFilterSerializer(data=self.request.query_params)
         serializer.is_valid(raise_exception=True)
         filters = serializer.validated_data
 
+        queryset = self.apply_filters(queryset, filters)
+        if filters.get('ordering'):
+            queryset = queryset.order_by(filters['ordering'])
+        elif filters.get('search'):
+            queryset = queryset.order_by('search_rank')
+
+        return queryset
+
+    def apply_filters(self, queryset, filters):
         if filters.get('status'):
             queryset = queryset.filter(status=filters['status'])
-        if filters.get('search'):
-            queryset = queryset.filter(name__icontains=filters['search'])
         if filters.get('min_price') is not None:
             queryset = queryset.filter(price__gte=filters['min_price'])
         if filters.get('max_price') is not None:
             queryset = queryset.filter(price__lte=filters['max_price'])
-        if filters.get('ordering'):
-            queryset = queryset.order_by(filters['ordering'])
-
+        if filters.get('search'):
+            queryset = search_products(queryset, filters['search'])
         return queryset
 
+    def get_list_rows_queryset(self, queryset):
+        self.row_serializer = product_rows_serializer(queryset.db)
+        return super().get_list_rows_queryset(queryset)
+
+    def serialize_list(self, rows):
+        data = super().serialize_list(rows)
+        return data if self.row_serializer is product_row_serializer else with_usernames(data)
+
+    def create(self, request, *args, **kwargs):
+        return self.with_version_etag(super().create(request, *args, **kwargs))
+
     def perform_create(self, serializer):
-        serializer.save(business=self.request.user.business, created_by=self.request.user)
+        with sharding.atomic():
+            product = serializer.save(business_id=self.request.user.business_id, created_by_id=self.request.user.id)
+            product_stats.record_created(product.business_id, [product])
+            schedule_thumbnails(product, serializer.stored_image)
+            if product.status == ProductStatus.APPROVED:
+                catalog.record_changes([product.pk])
+
+    def update(self, request, *args, **kwargs):
+        return self.with_version_etag(super().update(request, *args, **kwargs))
 
     def perform_update(self, serializer):
-        instance = self.get_object()
-        approved_by = instance.approved_by
-        if serializer.validated_data.get('status') != ProductStatus.APPROVED:
-            approved_by = None
-        serializer.save(approved_by=approved_by)
+        # Optimistic locking: one conditional UPDATE applies the changed fields only if the row still has the version
+        # get_object() loaded, so the loaded instance is also the exact "before" for the stats deltas.
+        instance = serializer.instance
+        self.check_if_match(instance.version)
+        was_public = instance.status == ProductStatus.APPROVED
+        changes = dict(serializer.validated_data)
+        # An edit that leaves status alone keeps the approval; moving out of APPROVED clears it.
+        if 'status' in changes and changes['status'] != ProductStatus.APPROVED:
+            changes.update(approved_by_id=None, approved_at=None)
+        changes = {field: value for field, value in changes.items() if getattr(instance, field) != value}
+        if not changes:
+            return
+        before = product_stats.snapshot(instance)
+        changes['updated_at'] = timezone.now()
+        with sharding.atomic():
+            updated = Product.objects.filter(pk=instance.pk, version=instance.version).update(
+                **changes, version=F('version') + 1
+            )
+            if not updated:
+                raise EditConflict('This product was changed by another request; reload it and try again.')
+            for field, value in changes.items():
+                setattr(instance, field, value)
+            instance.version += 1
+            product_stats.record_updated(instance.business_id, before, instance)
+            schedule_thumbnails(instance, serializer.stored_image)
+            if was_public or instance.status == ProductStatus.APPROVED:
+                catalog.record_changes([instance.pk])
+
+    def perform_destroy(self, instance):
+        with sharding.atomic():
+            instance = Product.objects.select_for_update().get(pk=instance.pk)
+            before = product_stats.snapshot(instance)
+            product_id, business_id = instance.pk, instance.business_id
+            instance.delete()
+            product_stats.record_deleted(business_id, before)
+            if before.status == ProductStatus.APPROVED:
+                catalog.record_changes([product_id])
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, CanApproveProducts])
+    @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         product = self.get_object()
-        if product.status != ProductStatus.PENDING_APPROVAL:
-            return Response({'detail': 'Only pending products can be approved.'}, status=status.HTTP_400_BAD_REQUEST)
-        product.status = ProductStatus.APPROVED
-        product.approved_by = request.user
-        product.save(update_fields=['status', 'approved_by', 'updated_at'])
-        return Response(self.get_serializer(product).data, status=status.HTTP_200_OK)
+        with sharding.atomic():
+            product = Product.objects.select_for_update().get(pk=product.pk)
+            if product.status != ProductStatus.PENDING_APPROVAL:
+                return Response(
+                    {'detail': 'Only pending products can be approved.'}, status=status.HTTP_400_BAD_REQUEST
+                )
+            before = product_stats.snapshot(product)
+            product.status = ProductStatus.APPROVED
+            product.approved_by_id = request.user.id
+            product.approved_at = timezone.now()
+            product.version += 1
+            product.save(update_fields=['status', 'approved_by', 'approved_at', 'updated_at', 'version'])
+            product_stats.record_updated(product.business_id, before, product)
+            catalog.record_changes([product.pk])
+        return self.with_version_etag(Response(self.get_serializer(product).data, status=status.HTTP_200_OK))
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        stats = BusinessProductStats.objects.filter(business_id=request.user.business_id).first()
+        if stats is None:
+            stats = BusinessProductStats(business_id=request.user.business_id)
+        return Response(BusinessProductStatsSerializer(stats).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='bulk-approve', url_name='bulk-approve')
+    def bulk_approve(self, request):
+        serializer = BulkApproveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data.get('ids')
+
+        business_id = request.user.business_id
+        candidates = Product.objects.filter(business_id=business_id)
+        if ids is not None:
+            candidates = candidates.filter(pk__in=ids)
+        else:
+            matching = self.apply_filters(candidates, serializer.validated_data['filter'])
+            candidates = candidates.filter(pk__in=matching.values('pk'))
+
+        # The pending rows are locked and collected first (SQLite's write transaction holds the database instead),
+        # so the response lists exactly the rows this request changed, even when another approval lands in the same
+        # clock tick.
+        approved_at = timezone.now()
+        with sharding.atomic():
+            approved = list(
+                candidates.filter(status=ProductStatus.PENDING_APPROVAL)
+                .select_for_update()
+                .order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            for start in range(0, len(approved), BULK_APPROVE_BATCH_SIZE):
+                Product.objects.filter(pk__in=approved[start:start + BULK_APPROVE_BATCH_SIZE]).update(
+                    status=ProductStatus.APPROVED,
+                    approved_by_id=request.user.id,
+                    approved_at=approved_at,
+                    updated_at=approved_at,
+                    version=F('version') + 1,
+                )
+            if approved:
+                product_stats.record_bulk_approved(business_id, len(approved), approved_at)
+                catalog.record_changes(approved)
+
+        skipped = []
+        if ids is not None:
+            remaining = sorted(set(ids) - set(approved))
+            existing = set(
+                Product.objects.filter(business_id=business_id, pk__in=remaining).values_list('pk', flat=True)
+            )
+            skipped = [{'id': pk, 'reason': 'not_pending' if pk in existing else 'not_found'} for pk in remaining]
+        return Response({'approved': approved, 'skipped': skipped}, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        url_name='import',
+        parser_classes=[CSVStreamParser, NDJSONStreamParser, MultiPartParser],
+    )
+    def bulk_import(self, request):
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+            rows = rows_for_upload(upload)
+        else:
+            rows = request.data
+
+        report = ProductImporter(business_id=request.user.business_id, user_id=request.user.id).run(rows)
+        failed_outright = report['failed'] and not report['created']
+        return Response(report, status=status.HTTP_400_BAD_REQUEST if failed_outright else status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        serializer = ProductExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        file_format = serializer.validated_data['file_format']
+
+        queryset = self.get_queryset()
+        if file_format == 'ndjson':
+            response = StreamingHttpResponse(stream_ndjson(queryset), content_type='application/x-ndjson')
+        else:
+            response = StreamingHttpResponse(stream_csv(queryset), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
 
 
-class PublicProductListView(ListAPIView):
+class PublicProductListView(RowSerializerMixin, ConditionalResponseMixin, ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = PublicProductSerializer
+    row_serializer = public_product_row_serializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        queryset = Product.objects.filter(status=ProductStatus.APPROVED)
+        return public_products_queryset(self.filters)
 
-        serializer = PublicProductFilterSerializer(data=self.request.query_params)
-        serializer.is_valid(raise_exception=True)
-        filters = serializer.validated_data
+    def list(self, request, *args, **kwargs):
+        self.filters = public_product_filters(request.query_params)
+        self.facets = self.get_facets() if self.filters['facets'] else None
+        self.result_count = self.facets['data']['count'] if self.facets is not None else None
+        cache_key = catalogue_cache.make_key(request)
+        cached = catalogue_cache.get(cache_key)
+        if cached is not None:
+            return self.conditional(
+                (cached['etag'], cached['last_modified']), lambda: Response(with_facets(cached['data'], self.facets))
+            )
 
-        if filters.get('business_id'):
-            queryset = queryset.filter(business_id=filters['business_id'])
-        if filters.get('search'):
-            queryset = queryset.filter(name__icontains=filters['search'])
-        if filters.get('max_price') is not None:
-            queryset = queryset.filter(price__lte=filters['max_price'])
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            etag, last_modified = self.validators
+            catalogue_cache.set(cache_key, {'etag': etag, 'last_modified': last_modified, 'data': response.data})
+            response.data = with_facets(response.data, self.facets)
+        return response
 
-        return queryset
+    def get_facets(self):
+        # Cached apart from pages: every page of one result set shares the same facet counts.
+        cache_key = catalogue_cache.make_key(self.request, 'facets', FACET_PARAMS)
+        facets = catalogue_cache.get(cache_key)
+        if facets is None:
+            facets = compute_facets(self.get_queryset(), self.filters)
+            catalogue_cache.set(cache_key, facets)
+        return facets
+
+    def counts_rows(self) -> bool:
+        return self.facets is not None or super().counts_rows()
+
+    def get_list_validators(self, queryset):
+        if self.facets is not None:
+            return self.make_validators(self.facets['data']['count'], self.facets['last_modified'])
+        return super().get_list_validators(queryset)
@@ -0,0 +1,74 @@
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'marketplace.settings')
+    import django
+
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database(on_disk: bool = False):
+    # Benchmarks run against a throwaway test database so they never touch db.sqlite3. Concurrent runs need SQLite on
+    # disk: the shared-cache in-memory database serializes threads on table locks instead of the file lock.
+    setup_django()
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    with contextlib.ExitStack() as stack:
+        if on_disk and connection.vendor == 'sqlite':
+            directory = stack.enter_context(tempfile.TemporaryDirectory(prefix='benchmark-'))
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+
+def summarize(samples_ms: list[float]) -> dict[str, float]:
+    ordered = sorted(samples_ms)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'p50_ms': round(percentile(0.50), 3),
+        'p95_ms': round(percentile(0.95), 3),
+        'p99_ms': round(percentile(0.99), 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+class QueryCounter:
+    # Counts statements through an execute wrapper; CaptureQueriesContext breaks once its 9000-entry log wraps.
+    def __init__(self, connection):
+        self.connection = connection
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+
+def timed(fn) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
@@ -0,0 +1,53 @@
+"""Compare two benchmarks.load reports and flag scenarios that got slower or issue more queries.
+
+Usage: python -m benchmarks.compare base.json head.json [--threshold 10]
+Exits with status 1 when any metric regressed by more than the threshold (percent).
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+def change(base: float, head: float) -> float | None:
+    if not base:
+        return None
+    return round((head - base) / base * 100, 1)
+
+
+def compare(base: dict, head: dict, threshold: float) -> dict:
+    report = {'base': base.get('revision'), 'head': head.get('revision'), 'scenarios': {}, 'regressions': []}
+    for name in [*base['scenarios'], 'overall']:
+        before = base['overall'] if name == 'overall' else base['scenarios'][name]
+        after = head['overall'] if name == 'overall' else head['scenarios'].get(name)
+        if after is None:
+            continue
+        entry = {}
+        for metric in METRICS:
+            delta = change(before[metric], after[metric])
+            entry[metric] = {'base': before[metric], 'head': after[metric], 'change_pct': delta}
+            if delta is not None and delta > threshold:
+                report['regressions'].append(f'{name}.{metric}')
+        report['scenarios'][name] = entry
+    if 'throughput_rps' in base['overall']:
+        report['throughput_change_pct'] = change(base['overall']['throughput_rps'], head['overall']['throughput_rps'])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base', type=Path)
+    parser.add_argument('head', type=Path)
+    parser.add_argument('--threshold', type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    report = compare(json.loads(args.base.read_text()), json.loads(args.head.read_text()), args.threshold)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 1 if report['regressions'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
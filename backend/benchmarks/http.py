@@ -0,0 +1,188 @@
+"""Load a running server over HTTP with concurrent keep-alive connections, e.g. to compare WSGI and ASGI serving.
+
+Usage:
+  python -m benchmarks.http seed --database /tmp/bench.sqlite3 [--products 5000]
+  python -m benchmarks.http run --url http://127.0.0.1:8000 [--connections 32] [--duration 15] [--output asgi.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from . import summarize
+from .load import NOUNS, PASSWORD
+
+DEFAULT_TARGETS = {
+    'public_list': 4,
+    'public_search': 2,
+    'me': 2,
+}
+
+
+def seed_database(args):
+    if args.database.exists():
+        raise SystemExit(f'{args.database} already exists; pass a new path so existing data is never touched.')
+    os.environ['DJANGO_SQLITE_PATH'] = str(args.database)
+    from . import setup_django
+
+    setup_django()
+    from django.core.management import call_command
+
+    from .load import seed
+
+    call_command('migrate', verbosity=0)
+    seeded = seed(args.businesses, args.users, args.products, args.image_bytes, random.Random(args.seed))
+    username, _ = seeded['approvers'][0]
+    json.dump({'database': str(args.database), 'username': username, 'password': PASSWORD}, sys.stdout)
+    sys.stdout.write('\n')
+
+
+class Target:
+    def __init__(self, token: str, rng: random.Random):
+        self.rng = rng
+        self.headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+
+    def public_list(self) -> str:
+        return '/api/public/products/?' + urlencode({'page_size': 20})
+
+    def public_search(self) -> str:
+        return '/api/public/products/?' + urlencode({'search': self.rng.choice(NOUNS)})
+
+    def me(self) -> str:
+        return '/api/auth/me/'
+
+
+def login(url: str, username: str, password: str) -> str:
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    body = json.dumps({'username': username, 'password': password})
+    connection.request('POST', '/api/auth/login/', body, {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    payload = json.loads(response.read())
+    if response.status != 200:
+        raise SystemExit(f'Login failed with {response.status}: {payload}')
+    return payload['access']
+
+
+def run_connection(url, token, targets, deadline, start, results, lock, seed):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    target = Target(token, random.Random(seed))
+    names, weights = list(targets), list(targets.values())
+    samples = defaultdict(lambda: {'latency': [], 'errors': 0})
+    start.wait()
+    while time.perf_counter() < deadline:
+        name = target.rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            connection.request('GET', getattr(target, name)(), headers=target.headers)
+            response = connection.getresponse()
+            response.read()
+            failed = response.status >= 400
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            failed = True
+        samples[name]['latency'].append((time.perf_counter() - started) * 1000)
+        samples[name]['errors'] += failed
+    connection.close()
+    with lock:
+        for name, sample in samples.items():
+            results[name]['latency'] += sample['latency']
+            results[name]['errors'] += sample['errors']
+
+
+def run_benchmark(args) -> dict:
+    token = login(args.url, args.username, args.password)
+    results = defaultdict(lambda: {'latency': [], 'errors': 0})
+    lock = threading.Lock()
+    start = threading.Barrier(args.connections + 1)
+    deadline = time.perf_counter() + args.duration + 1
+    threads = [
+        threading.Thread(
+            target=run_connection,
+            args=(args.url, token, args.targets, deadline, start, results, lock, args.seed + index),
+        )
+        for index in range(args.connections)
+    ]
+    for thread in threads:
+        thread.start()
+    # The extra second before the deadline covers thread start-up; measure from the moment all are released.
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    report = {
+        'url': args.url,
+        'label': args.label,
+        'connections': args.connections,
+        'duration_seconds': round(wall_seconds, 3),
+        'targets': {},
+    }
+    latencies, errors = [], 0
+    for name, sample in results.items():
+        report['targets'][name] = {**summarize(sample['latency']), 'errors': sample['errors']}
+        latencies += sample['latency']
+        errors += sample['errors']
+    report['overall'] = {
+        **summarize(latencies),
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / wall_seconds, 1),
+    }
+    return report
+
+
+def parse_targets(value: str) -> dict[str, int]:
+    targets = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_TARGETS:
+            raise argparse.ArgumentTypeError(f'unknown target {name!r}; choose from {", ".join(DEFAULT_TARGETS)}')
+        targets[name] = int(weight or 1)
+    return targets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='create and seed a fresh SQLite database for a benchmark server')
+    seed_parser.add_argument('--database', type=Path, required=True)
+    seed_parser.add_argument('--businesses', type=int, default=5)
+    seed_parser.add_argument('--users', type=int, default=8)
+    seed_parser.add_argument('--products', type=int, default=5000)
+    seed_parser.add_argument('--image-bytes', type=int, default=0)
+    seed_parser.add_argument('--seed', type=int, default=1)
+
+    run_parser = commands.add_parser('run', help='drive a running server')
+    run_parser.add_argument('--url', default='http://127.0.0.1:8000')
+    run_parser.add_argument('--username', required=True)
+    run_parser.add_argument('--password', default=PASSWORD)
+    run_parser.add_argument('--connections', type=int, default=32)
+    run_parser.add_argument('--duration', type=float, default=15.0)
+    run_parser.add_argument('--targets', type=parse_targets, default=DEFAULT_TARGETS)
+    run_parser.add_argument('--label', default='')
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--output', type=Path)
+    args = parser.parse_args(argv)
+
+    if args.command == 'seed':
+        seed_database(args)
+        return
+
+    output = json.dumps(run_benchmark(args), indent=2)
+    if args.output:
+        args.output.write_text(output + '\n')
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""Drive the real URLconf with concurrent in-process clients and report latency, queries and throughput as JSON.
+
+Usage: python -m benchmarks.load [--businesses 5] [--users 8] [--products 5000] [--image-bytes 0]
+                                 [--clients 8] [--requests 200] [--warmup 10]
+                                 [--scenarios login=1,me=3,...] [--output report.json]
+"""
+import argparse
+import base64
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from . import QueryCounter, benchmark_database, summarize
+
+PASSWORD = 'benchmark-password'
+ADJECTIVES = ['wireless', 'organic', 'steel', 'compact', 'vintage', 'smart', 'ergonomic', 'portable', 'pro', 'classic']
+NOUNS = ['lamp', 'desk', 'keyboard', 'mouse', 'chair', 'kettle', 'speaker', 'backpack', 'monitor', 'blender']
+DEFAULT_SCENARIOS = {
+    'login': 1,
+    'me': 3,
+    'product_list': 4,
+    'product_filter': 3,
+    'product_search': 3,
+    'public_list': 6,
+    'public_search': 3,
+    'approve': 1,
+}
+
+
+def seed(businesses: int, users: int, products: int, image_bytes: int, rng: random.Random) -> dict:
+    from decimal import Decimal
+
+    from django.contrib.auth.hashers import make_password
+
+    from apps.accounts.models import Business, User, UserRole
+    from apps.products import catalog
+    from apps.products.models import Product, ProductStatus
+
+    roles = [UserRole.APPROVER, UserRole.EDITOR, UserRole.ADMIN, UserRole.VIEWER]
+    password = make_password(PASSWORD)
+    if image_bytes:
+        # Legacy rows carried the image inline as a data: URL; size it to reproduce that payload.
+        payload = base64.b64encode(rng.randbytes(image_bytes)).decode()
+        image_url = f'data:image/jpeg;base64,{payload}'
+
+    business_rows = Business.objects.bulk_create([Business(name=f'Benchmark {index}') for index in range(businesses)])
+    User.objects.bulk_create(
+        [
+            User(
+                username=f'bench-{business.id}-{index}',
+                password=password,
+                business=business,
+                role=roles[index % len(roles)],
+            )
+            for business in business_rows
+            for index in range(users)
+        ],
+        batch_size=500,
+    )
+    approvers = list(
+        User.objects.filter(role__in=[UserRole.APPROVER, UserRole.ADMIN])
+        .order_by('id')
+        .values_list('username', 'business_id')
+    )
+    creators = dict(User.objects.filter(role=UserRole.EDITOR).values_list('business_id', 'id'))
+
+    statuses = [ProductStatus.APPROVED] * 12 + [ProductStatus.PENDING_APPROVAL] * 5 + [ProductStatus.DRAFT] * 3
+    Product.objects.bulk_create(
+        [
+            Product(
+                business=business,
+                created_by_id=creators[business.id],
+                name=f'{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} {index}',
+                description=' '.join(rng.choices(ADJECTIVES + NOUNS, k=24)),
+                image_url=image_url if image_bytes else f'/media/products/{index % 256:02x}/{index:064x}.jpg',
+                thumbnail_url='' if image_bytes else f'/media/products/{index % 256:02x}/{index:064x}-w320.jpg',
+                price=Decimal(rng.randint(100, 50000)) / 100,
+                status=rng.choice(statuses),
+            )
+            for index in range(products)
+            for business in [business_rows[index % businesses]]
+        ],
+        batch_size=500,
+    )
+    # bulk_create skips the outbox, so publish the approved products in one pass.
+    catalog.rebuild()
+    pending = defaultdict(list)
+    for product_id, business_id in Product.objects.filter(status=ProductStatus.PENDING_APPROVAL).values_list(
+        'id', 'business_id'
+    ):
+        pending[business_id].append(product_id)
+    return {'approvers': approvers, 'pending': pending, 'business_ids': [business.id for business in business_rows]}
+
+
+class VirtualClient:
+    def __init__(self, username: str, business_ids: list[int], pending: list[int], rng: random.Random):
+        from django.test import Client
+
+        self.client = Client()
+        self.username = username
+        self.business_ids = business_ids
+        self.pending = pending
+        self.rng = rng
+        self.headers = {}
+
+    def login(self):
+        from django.urls import reverse
+
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            {'username': self.username, 'password': PASSWORD},
+            content_type='application/json',
+        )
+        if response.status_code == 200:
+            self.headers = {'HTTP_AUTHORIZATION': f"Bearer {response.json()['access']}"}
+        return response
+
+    def get(self, name: str, params=None):
+        from django.urls import reverse
+
+        return self.client.get(reverse(name), params or {}, **self.headers)
+
+    def me(self):
+        return self.get('current_user')
+
+    def product_list(self):
+        return self.get('products-list')
+
+    def product_filter(self):
+        return self.get(
+            'products-list',
+            {'status': self.rng.choice(['approved', 'pending_approval']), 'max_price': self.rng.randint(50, 400)},
+        )
+
+    def product_search(self):
+        return self.get('products-list', {'search': self.rng.choice(ADJECTIVES + NOUNS)})
+
+    def public_list(self):
+        return self.get('public_products', {'business_id': self.rng.choice(self.business_ids)})
+
+    def public_search(self):
+        return self.get('public_products', {'search': self.rng.choice(NOUNS), 'max_price': self.rng.randint(50, 400)})
+
+    def approve(self):
+        from django.urls import reverse
+
+        if not self.pending:
+            return None
+        return self.client.post(reverse('products-approve', args=[self.pending.pop()]), **self.headers)
+
+
+def run_client(client, scenarios, requests, warmup, start, results, lock):
+    from django.db import connection, connections
+
+    names, weights = list(scenarios), list(scenarios.values())
+    samples = defaultdict(lambda: {'latency': [], 'queries': [], 'errors': 0})
+    try:
+        client.login()
+        for iteration in range(warmup + requests):
+            if iteration == warmup:
+                start.wait()
+            name = client.rng.choices(names, weights)[0]
+            with QueryCounter(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(client, name)()
+                elapsed = (time.perf_counter() - started) * 1000
+            if response is None or iteration < warmup:
+                continue
+            samples[name]['latency'].append(elapsed)
+            samples[name]['queries'].append(queries.count)
+            samples[name]['errors'] += response.status_code >= 400
+    except BaseException:
+        start.abort()
+        raise
+    finally:
+        connections.close_all()
+    with lock:
+        for name, sample in samples.items():
+            results[name]['latency'] += sample['latency']
+            results[name]['queries'] += sample['queries']
+            results[name]['errors'] += sample['errors']
+
+
+def git_revision() -> str | None:
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def run(args) -> dict:
+    from django.db import connection
+
+    rng = random.Random(args.seed)
+    scenarios = {name: weight for name, weight in args.scenarios.items() if weight > 0}
+    seeded = seed(args.businesses, args.users, args.products, args.image_bytes, rng)
+
+    pools = defaultdict(list)
+    clients = []
+    for index in range(args.clients):
+        username, business_id = seeded['approvers'][index % len(seeded['approvers'])]
+        clients.append(VirtualClient(username, seeded['business_ids'], [], random.Random(rng.getrandbits(64))))
+        pools[business_id].append(index)
+    # Each client approves its own share of its business's pending products so approvals never collide.
+    for business_id, product_ids in seeded['pending'].items():
+        owners = pools.get(business_id, [])
+        for position, product_id in enumerate(product_ids):
+            if owners:
+                clients[owners[position % len(owners)]].pending.append(product_id)
+
+    results = defaultdict(lambda: {'latency': [], 'queries': [], 'errors': 0})
+    lock = threading.Lock()
+    start = threading.Barrier(args.clients + 1)
+    threads = [
+        threading.Thread(target=run_client, args=(client, scenarios, args.requests, args.warmup, start, results, lock))
+        for client in clients
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        start.wait()
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        raise RuntimeError('A benchmark client failed before the measured run started.') from None
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'config': {
+            'businesses': args.businesses,
+            'users_per_business': args.users,
+            'products': args.products,
+            'image_bytes': args.image_bytes,
+            'clients': args.clients,
+            'requests_per_client': args.requests,
+            'warmup_per_client': args.warmup,
+            'seed': args.seed,
+            'scenarios': scenarios,
+        },
+        'scenarios': {},
+    }
+    latencies, total_queries, errors = [], 0, 0
+    for name in scenarios:
+        sample = results.get(name)
+        if not sample or not sample['latency']:
+            continue
+        report['scenarios'][name] = {
+            **summarize(sample['latency']),
+            'queries_per_request': round(sum(sample['queries']) / len(sample['queries']), 2),
+            'max_queries': max(sample['queries']),
+            'errors': sample['errors'],
+        }
+        latencies += sample['latency']
+        total_queries += sum(sample['queries'])
+        errors += sample['errors']
+    report['overall'] = {
+        **summarize(latencies),
+        'queries_per_request': round(total_queries / len(latencies), 2),
+        'errors': errors,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(len(latencies) / wall_seconds, 1),
+    }
+    return report
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1')
+    return number
+
+
+def parse_scenarios(value: str) -> dict[str, int]:
+    scenarios = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_SCENARIOS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}; choose from {", ".join(DEFAULT_SCENARIOS)}')
+        scenarios[name] = int(weight or 1)
+    return scenarios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--businesses', type=int, default=5)
+    parser.add_argument('--users', type=int, default=8, help='users per business')
+    parser.add_argument('--products', type=int, default=5000, help='products across all businesses')
+    parser.add_argument('--image-bytes', type=int, default=0, help='store images inline as data: URLs of this size')
+    parser.add_argument('--clients', type=positive_int, default=8)
+    parser.add_argument('--requests', type=positive_int, default=200, help='measured requests per client')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per client')
+    parser.add_argument('--scenarios', type=parse_scenarios, default=DEFAULT_SCENARIOS)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=Path)
+    args = parser.parse_args(argv)
+
+    with benchmark_database(on_disk=True):
+        from django.test import override_settings
+
+        # Every virtual client logs in from the same address; the login rate limits would turn the scenario into 429s.
+        with override_settings(AUTH_LOGIN_THROTTLE_RATES={'login_ip': None, 'login_username': None}):
+            report = run(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + '\n')
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
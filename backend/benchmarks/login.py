@@ -0,0 +1,114 @@
+"""Measure password hashing cost and login throughput per core for each configured hasher.
+
+Usage: python -m benchmarks.login [--repeat 20] [--hashers argon2,scrypt,pbkdf2]
+
+Single-threaded, so logins per CPU second is what one core sustains; multiply by cores for a process budget.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from . import QueryCounter, benchmark_database, summarize, timed
+from .load import PASSWORD
+
+
+def per_core_rate(count: int, cpu_seconds: float) -> float:
+    return round(count / cpu_seconds, 2) if cpu_seconds else 0.0
+
+
+def measure_hashers(names: list[str], repeat: int) -> dict:
+    from django.conf import settings
+    from django.utils.module_loading import import_string
+
+    results = {}
+    for name in names:
+        if name == 'argon2' and not settings.HAS_ARGON2:
+            results[name] = {'skipped': 'argon2-cffi is not installed'}
+            continue
+        hasher = import_string(settings.PASSWORD_HASHER_PATHS[name])()
+        encoded = hasher.encode(PASSWORD, hasher.salt())
+        samples = []
+        cpu_started = time.process_time()
+        for _ in range(repeat):
+            elapsed, verified = timed(lambda: hasher.verify(PASSWORD, encoded))
+            assert verified
+            samples.append(elapsed)
+        cpu_seconds = time.process_time() - cpu_started
+        parameters = hasher.safe_summary(encoded)
+        results[name] = {
+            **summarize(samples),
+            'parameters': {str(key): value for key, value in parameters.items() if key not in ('salt', 'hash')},
+            'verifications_per_core_s': per_core_rate(repeat, cpu_seconds),
+        }
+    return results
+
+
+def measure_endpoint(repeat: int) -> dict:
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from apps.accounts.models import Business, User, UserRole
+
+    business = Business.objects.create(name='Login Benchmark Co')
+    # Stored with the pre-tuning PBKDF2 default, as every account created before the hasher change is.
+    user = User.objects.create(
+        username='bench-login',
+        password=make_password(PASSWORD, hasher='pbkdf2_sha256'),
+        business=business,
+        role=UserRole.VIEWER,
+    )
+    client = Client()
+
+    def login():
+        response = client.post(
+            reverse('token_obtain_pair'),
+            {'username': user.username, 'password': PASSWORD},
+            content_type='application/json',
+        )
+        assert response.status_code == 200, response.content
+        return response
+
+    with override_settings(AUTH_LOGIN_THROTTLE_RATES={'login_ip': None, 'login_username': None}):
+        first_ms, _ = timed(login)
+        user.refresh_from_db()
+        samples, queries = [], []
+        cpu_started = time.process_time()
+        for _ in range(repeat):
+            with QueryCounter(connection) as counter:
+                elapsed, _ = timed(login)
+            samples.append(elapsed)
+            queries.append(counter.count)
+        cpu_seconds = time.process_time() - cpu_started
+    return {
+        'hasher': settings.AUTH_PASSWORD_HASHER,
+        'first_login_with_rehash_ms': round(first_ms, 3),
+        'rehashed_to': user.password.split('$', 1)[0],
+        **summarize(samples),
+        'queries': max(queries),
+        'logins_per_core_s': per_core_rate(repeat, cpu_seconds),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--hashers', default='argon2,scrypt,pbkdf2')
+    args = parser.parse_args(argv)
+
+    with benchmark_database():
+        report = {
+            'cpu_count': os.cpu_count(),
+            'hashers': measure_hashers(args.hashers.split(','), args.repeat),
+            'login_endpoint': measure_endpoint(args.repeat),
+        }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Compare ProductSerializer + JSONRenderer with the values()/RowSerializer/FastJSONRenderer list path.
+
+Usage: python -m benchmarks.serialization [--sizes 20,100,1000] [--repeat 30]
+"""
+import argparse
+import json
+import sys
+
+from . import QueryCounter, benchmark_database, summarize, timed
+
+
+def seed(count: int):
+    from decimal import Decimal
+
+    from apps.accounts.models import Business, User, UserRole
+    from apps.products.models import Product, ProductStatus
+
+    business = Business.objects.create(name='Benchmark Co')
+    editor = User.objects.create(username='bench-editor', business=business, role=UserRole.EDITOR)
+    approver = User.objects.create(username='bench-approver', business=business, role=UserRole.APPROVER)
+    Product.objects.bulk_create(
+        [
+            Product(
+                business=business,
+                created_by=editor,
+                approved_by=approver if index % 2 else None,
+                name=f'Product {index}',
+                description='A reasonably descriptive product description. ' * 4,
+                image_url=f'/media/products/{index:02x}/{index:064x}.jpg',
+                thumbnail_url=f'/media/products/{index:02x}/{index:064x}-w320.jpg',
+                price=Decimal('10.00') + index,
+                status=ProductStatus.APPROVED if index % 2 else ProductStatus.DRAFT,
+            )
+            for index in range(count)
+        ],
+        batch_size=500,
+    )
+
+
+def run(sizes: list[int], repeat: int) -> dict:
+    from django.db import connection
+    from rest_framework.renderers import JSONRenderer
+
+    from apps.core.renderers import HAS_ORJSON, FastJSONRenderer
+    from apps.products.models import Product
+    from apps.products.serializers import ProductSerializer, product_row_serializer
+
+    seed(max(sizes))
+    stock_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    report = {'orjson': HAS_ORJSON, 'results': []}
+
+    for size in sizes:
+        queryset = Product.objects.order_by('-created_at', '-id')
+
+        def model_path():
+            return stock_renderer.render(ProductSerializer(list(queryset[:size]), many=True).data)
+
+        def fast_path():
+            rows = list(queryset.values(*product_row_serializer.lookups)[:size])
+            return fast_renderer.render(product_row_serializer.serialize(rows))
+
+        entry = {'rows': size}
+        outputs = {}
+        for name, fn in (('model_serializer', model_path), ('fast_path', fast_path)):
+            samples = []
+            for _ in range(repeat):
+                with QueryCounter(connection) as queries:
+                    elapsed, outputs[name] = timed(fn)
+                samples.append(elapsed)
+            entry[name] = {**summarize(samples), 'queries': queries.count}
+        entry['identical_output'] = outputs['model_serializer'] == outputs['fast_path']
+        entry['speedup_p50'] = round(entry['model_serializer']['p50_ms'] / entry['fast_path']['p50_ms'], 2)
+        report['results'].append(entry)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='20,100,1000')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args(argv)
+
+    with benchmark_database():
+        report = run([int(size) for size in args.sizes.split(',')], args.repeat)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+import multiprocessing
+import os
+
+# DJANGO_SERVER_MODE=wsgi runs marketplace.wsgi under gthread workers; asgi runs marketplace.asgi under uvicorn
+# workers (pair it with DJANGO_ASYNC_VIEWS=true). See the README benchmark before switching.
+server_mode = os.getenv('DJANGO_SERVER_MODE', 'wsgi').lower()
+
+bind = os.getenv('DJANGO_BIND', '0.0.0.0:8000')
+# The catalogue versions, token denylist, permission versions, login throttles and shard placements live in the
+# Django cache, so workers must share it: locmem is per process and only works with a single worker.
+cache_backend = os.getenv('DJANGO_CACHE_BACKEND', 'locmem').lower()
+default_workers = 1 if cache_backend == 'locmem' else multiprocessing.cpu_count() * 2 + 1
+workers = int(os.getenv('WEB_CONCURRENCY', default_workers))
+if workers > 1 and cache_backend == 'locmem':
+    raise RuntimeError(
+        f'WEB_CONCURRENCY={workers} needs a shared cache; set DJANGO_CACHE_BACKEND=file or redis, or use one worker.'
+    )
+threads = int(os.getenv('WEB_THREADS', '4'))
+timeout = int(os.getenv('WEB_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+
+if server_mode == 'asgi':
+    wsgi_app = 'marketplace.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'marketplace.wsgi:application'
+    worker_class = 'gthread'
@@ -1,7 +1,10 @@
 from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
 import importlib.util
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'dev-secret-key-change-me')
@@ -23,9 +26,12 @@ INSTALLED_APPS = [
     'apps.core',
     'apps.accounts',
     'apps.products',
+    'apps.jobs',
 ]
 
 MIDDLEWARE = [
+    'apps.core.metrics.RequestMetricsMiddleware',
+    'apps.core.replicas.ReplicaReadMiddleware',
     'django.middleware.security.SecurityMiddleware',
     *(['corsheaders.middleware.CorsMiddleware'] if HAS_CORSHEADERS else []),
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -37,6 +43,8 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'marketplace.urls'
+# Serve the public catalogue and /api/auth/me/ from async views; only worth it under an ASGI server.
+ASYNC_VIEWS = os.getenv('DJANGO_ASYNC_VIEWS', 'false').lower() == 'true'
 
 TEMPLATES = [
     {
@@ -55,13 +63,147 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'marketplace.wsgi.application'
 
-DATABASES = {
-    'default': {
+DATABASE_URL = os.getenv('DJANGO_DATABASE_URL', '')
+CONN_HEALTH_CHECKS = os.getenv('DJANGO_CONN_HEALTH_CHECKS', 'true').lower() == 'true'
+DB_POOL = os.getenv('DJANGO_DB_POOL', 'true').lower() == 'true'
+
+
+def postgres_database(url: str) -> dict:
+    database_url = urlsplit(url)
+    if database_url.scheme not in ('postgres', 'postgresql'):
+        raise ImproperlyConfigured(f'Unsupported database URL scheme {database_url.scheme!r}.')
+    # Each worker process keeps a psycopg pool; persistent connections (CONN_MAX_AGE) cannot be combined with it.
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': unquote(database_url.path.lstrip('/')),
+        'USER': unquote(database_url.username or ''),
+        'PASSWORD': unquote(database_url.password or ''),
+        'HOST': database_url.hostname or '',
+        'PORT': database_url.port or '',
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DJANGO_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': CONN_HEALTH_CHECKS,
+        'OPTIONS': {
+            **dict(parse_qsl(database_url.query)),
+            **(
+                {
+                    'pool': {
+                        'min_size': int(os.getenv('DJANGO_DB_POOL_MIN_SIZE', '2')),
+                        'max_size': int(os.getenv('DJANGO_DB_POOL_MAX_SIZE', '10')),
+                        'timeout': float(os.getenv('DJANGO_DB_POOL_TIMEOUT', '10')),
+                    }
+                }
+                if DB_POOL
+                else {}
+            ),
+        },
+    }
+
+
+def sqlite_database(path) -> dict:
+    # WAL lets readers run alongside the single writer, and IMMEDIATE transactions take the write lock up front so
+    # concurrent writers queue on the busy timeout instead of failing with "database is locked" mid-transaction.
+    return {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': int(os.getenv('DJANGO_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': CONN_HEALTH_CHECKS,
+        'OPTIONS': {
+            'timeout': float(os.getenv('DJANGO_SQLITE_BUSY_TIMEOUT', '20')),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(
+                [
+                    'PRAGMA journal_mode=WAL',
+                    f"PRAGMA synchronous={os.getenv('DJANGO_SQLITE_SYNCHRONOUS', 'NORMAL')}",
+                    f"PRAGMA mmap_size={int(os.getenv('DJANGO_SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))}",
+                    # Negative values are KiB rather than pages.
+                    f"PRAGMA cache_size={int(os.getenv('DJANGO_SQLITE_CACHE_SIZE', '-32000'))}",
+                    'PRAGMA temp_store=MEMORY',
+                ]
+            ),
+        },
     }
+
+
+def database_from_location(location: str) -> dict:
+    return postgres_database(location) if '://' in location else sqlite_database(location)
+
+
+DATABASES = {
+    'default': database_from_location(DATABASE_URL or str(os.getenv('DJANGO_SQLITE_PATH', BASE_DIR / 'db.sqlite3')))
 }
 
+
+def extra_databases(variable: str) -> dict[str, dict]:
+    # alias=location,... where each location is a SQLite path or a postgres:// URL.
+    databases = {}
+    for entry in filter(None, (item.strip() for item in os.getenv(variable, '').split(','))):
+        alias, _, location = (part.strip() for part in entry.partition('='))
+        if not alias or not location or alias in DATABASES or alias in databases:
+            raise ImproperlyConfigured(f'Invalid {variable} entry {entry!r}; expected a new alias=location.')
+        databases[alias] = database_from_location(location)
+    return databases
+
+
+# Products, their stats and catalogue outbox are partitioned by business across PRODUCT_SHARDS (see
+# apps.products.sharding); everything else, including the shard map and the public catalogue, stays in `default`,
+# which is always the first shard. DJANGO_PRODUCT_SHARDS adds shards. Append only: a shard's position is part of the
+# ids of the products created on it.
+product_shards = extra_databases('DJANGO_PRODUCT_SHARDS')
+DATABASES.update(product_shards)
+PRODUCT_SHARDS = ['default', *product_shards]
+PRODUCT_SHARDS_FOR_NEW_BUSINESSES = [
+    alias.strip()
+    for alias in os.getenv('PRODUCT_SHARDS_FOR_NEW_BUSINESSES', ','.join(PRODUCT_SHARDS)).split(',')
+    if alias.strip()
+]
+if not set(PRODUCT_SHARDS_FOR_NEW_BUSINESSES) <= set(PRODUCT_SHARDS) or not PRODUCT_SHARDS_FOR_NEW_BUSINESSES:
+    raise ImproperlyConfigured('PRODUCT_SHARDS_FOR_NEW_BUSINESSES must name shards from DJANGO_PRODUCT_SHARDS.')
+PRODUCT_SHARD_ID_STRIDE = 1024
+PRODUCT_SHARD_CACHE_ALIAS = 'default'
+PRODUCT_SHARD_CACHE_TIMEOUT = int(os.getenv('PRODUCT_SHARD_CACHE_TIMEOUT', '300'))
+PRODUCT_SHARD_MOVE_GRACE = float(os.getenv('PRODUCT_SHARD_MOVE_GRACE', '5'))
+PRODUCT_SHARD_FAN_OUT_THREADS = int(os.getenv('PRODUCT_SHARD_FAN_OUT_THREADS', '4'))
+
+# Read replicas of `default` (DJANGO_DATABASE_REPLICAS), used by safe-method requests; see apps.core.replicas. After
+# a successful write the client reads from the primary for DATABASE_REPLICA_STICKY_SECONDS, which should exceed
+# replication lag, by sending back the token it got in the cookie or the DATABASE_REPLICA_STICKY_HEADER header.
+# Catalogue pages read from a replica are cached for at most DATABASE_REPLICA_CACHE_TIMEOUT, as the replica may not
+# have the change behind the latest invalidation yet. Locally, `manage.py sync_replicas` copies a SQLite primary onto
+# SQLite replicas in place of replication.
+database_replicas = extra_databases('DJANGO_DATABASE_REPLICAS')
+# The test runner points mirrors at the test `default` instead of creating databases for them.
+DATABASES.update({alias: {**database, 'TEST': {'MIRROR': 'default'}} for alias, database in database_replicas.items()})
+DATABASE_REPLICAS = list(database_replicas)
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '5'))
+DATABASE_REPLICA_STICKY_COOKIE = 'db_primary'
+DATABASE_REPLICA_STICKY_HEADER = 'X-DB-Primary'
+DATABASE_REPLICA_CACHE_TIMEOUT = int(os.getenv('DATABASE_REPLICA_CACHE_TIMEOUT', '30'))
+DATABASE_ROUTERS = ['apps.products.sharding.ProductShardRouter']
+
+CACHE_BACKEND = os.getenv('DJANGO_CACHE_BACKEND', 'locmem').lower()
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_URL', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    # Shared across processes on one host; a stand-in for Redis when none is running locally.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_URL', str(BASE_DIR / '.cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'marketplace',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -69,25 +211,129 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# New passwords are hashed with AUTH_PASSWORD_HASHER; the other hashers only verify older hashes, which are rehashed
+# with the current hasher and cost on the user's next successful login.
+HAS_ARGON2 = importlib.util.find_spec('argon2') is not None
+PASSWORD_HASHER_PATHS = {
+    'argon2': 'apps.accounts.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'apps.accounts.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+AUTH_PASSWORD_HASHER = os.getenv('AUTH_PASSWORD_HASHER', 'argon2' if HAS_ARGON2 else 'scrypt')
+if AUTH_PASSWORD_HASHER not in PASSWORD_HASHER_PATHS:
+    raise ImproperlyConfigured(f'Unsupported AUTH_PASSWORD_HASHER {AUTH_PASSWORD_HASHER!r}.')
+if AUTH_PASSWORD_HASHER == 'argon2' and not HAS_ARGON2:
+    raise ImproperlyConfigured('AUTH_PASSWORD_HASHER=argon2 needs the argon2-cffi package.')
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_PATHS[AUTH_PASSWORD_HASHER],
+    *(
+        path
+        for name, path in PASSWORD_HASHER_PATHS.items()
+        if name != AUTH_PASSWORD_HASHER and (name != 'argon2' or HAS_ARGON2)
+    ),
+]
+# scrypt: 32 MiB and under a third of the CPU time of Django's PBKDF2 default; argon2: OWASP's 19 MiB, t=2, p=1.
+AUTH_SCRYPT_WORK_FACTOR = int(os.getenv('AUTH_SCRYPT_WORK_FACTOR', str(2**15)))
+AUTH_SCRYPT_BLOCK_SIZE = int(os.getenv('AUTH_SCRYPT_BLOCK_SIZE', '8'))
+AUTH_SCRYPT_PARALLELISM = int(os.getenv('AUTH_SCRYPT_PARALLELISM', '1'))
+AUTH_ARGON2_TIME_COST = int(os.getenv('AUTH_ARGON2_TIME_COST', '2'))
+AUTH_ARGON2_MEMORY_COST = int(os.getenv('AUTH_ARGON2_MEMORY_COST', '19456'))
+AUTH_ARGON2_PARALLELISM = int(os.getenv('AUTH_ARGON2_PARALLELISM', '1'))
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = 'static/'
+MEDIA_URL = os.getenv('DJANGO_MEDIA_URL', '/media/')
+MEDIA_ROOT = Path(os.getenv('DJANGO_MEDIA_ROOT', BASE_DIR / 'media'))
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.accounts.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Fraction of requests whose SQL is timed and counted (every request under DEBUG); request counts, latency and sizes
+# are always recorded.
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '1.0' if DEBUG else '0.05'))
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', str(DEBUG)).lower() == 'true'
+METRICS_DUPLICATE_QUERY_THRESHOLD = int(os.getenv('METRICS_DUPLICATE_QUERY_THRESHOLD', '5'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'apps.accounts.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'apps.accounts.authentication.ClaimsTokenRefreshSerializer',
+    'TOKEN_USER_CLASS': 'apps.accounts.authentication.ClaimsUser',
+}
+
+# Token denylist and cached permission versions; use a shared backend when running several processes.
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_PERMISSIONS_VERSION_CACHE_TIMEOUT = int(os.getenv('AUTH_PERMISSIONS_VERSION_CACHE_TIMEOUT', '300'))
+# Login attempts per client IP, and failed logins per username from one IP (reset by a successful login), as DRF rate
+# strings (empty to disable); counted in the token cache and rejected before any password is hashed.
+AUTH_LOGIN_THROTTLE_RATES = {
+    'login_ip': os.getenv('AUTH_LOGIN_IP_RATE', '30/min') or None,
+    'login_username': os.getenv('AUTH_LOGIN_USERNAME_RATE', '10/min') or None,
+}
+# Logins hashing at once per process; others wait up to AUTH_LOGIN_QUEUE_TIMEOUT seconds, then get 503, so a login
+# burst cannot take every request thread away from other traffic.
+AUTH_LOGIN_CONCURRENCY = int(os.getenv('AUTH_LOGIN_CONCURRENCY', '2'))
+AUTH_LOGIN_QUEUE_TIMEOUT = float(os.getenv('AUTH_LOGIN_QUEUE_TIMEOUT', '2'))
+# POST /api/users/bulk/: rows per request, and processes hashing their passwords (1 hashes in the request thread).
+AUTH_BULK_CREATE_MAX_USERS = int(os.getenv('AUTH_BULK_CREATE_MAX_USERS', '5000'))
+AUTH_PASSWORD_HASH_PROCESSES = int(os.getenv('AUTH_PASSWORD_HASH_PROCESSES', str(os.cpu_count() or 1)))
+
+PRODUCT_CATALOGUE_CACHE_ALIAS = 'default'
+PRODUCT_CATALOGUE_CACHE_TIMEOUT = int(os.getenv('PRODUCT_CATALOGUE_CACHE_TIMEOUT', '300'))
+# Outbox rows applied to the public catalogue projection per transaction.
+PRODUCT_CATALOGUE_PUBLISH_BATCH_SIZE = int(os.getenv('PRODUCT_CATALOGUE_PUBLISH_BATCH_SIZE', '500'))
+
+PRODUCT_IMPORT_BATCH_SIZE = int(os.getenv('PRODUCT_IMPORT_BATCH_SIZE', '500'))
+PRODUCT_IMPORT_MAX_ERRORS = int(os.getenv('PRODUCT_IMPORT_MAX_ERRORS', '1000'))
+PRODUCT_EXPORT_CHUNK_SIZE = int(os.getenv('PRODUCT_EXPORT_CHUNK_SIZE', '2000'))
+
+PRODUCT_BULK_APPROVE_MAX_IDS = int(os.getenv('PRODUCT_BULK_APPROVE_MAX_IDS', '1000'))
+
+PRODUCT_FILTER_MAX_BUSINESSES = int(os.getenv('PRODUCT_FILTER_MAX_BUSINESSES', '50'))
+PRODUCT_FACET_PRICE_BUCKETS = int(os.getenv('PRODUCT_FACET_PRICE_BUCKETS', '5'))
+PRODUCT_FACET_MAX_PRICE_BUCKETS = int(os.getenv('PRODUCT_FACET_MAX_PRICE_BUCKETS', '20'))
+
+PRODUCT_IMAGE_PREFIX = 'products'
+PRODUCT_IMAGE_MAX_BYTES = int(os.getenv('PRODUCT_IMAGE_MAX_BYTES', str(5 * 1024 * 1024)))
+PRODUCT_IMAGE_THUMBNAIL_SIZES = tuple(
+    int(size) for size in os.getenv('PRODUCT_IMAGE_THUMBNAIL_SIZES', '320,640').split(',') if size.strip()
+)
+
+# Background jobs run by `manage.py run_jobs`. JOBS_EAGER runs them in the request after commit instead, for setups
+# without a worker process.
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'false').lower() == 'true'
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '5'))
+JOBS_RETRY_BASE_DELAY = float(os.getenv('JOBS_RETRY_BASE_DELAY', '2'))
+JOBS_RETRY_MAX_DELAY = float(os.getenv('JOBS_RETRY_MAX_DELAY', '600'))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '1'))
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', '600'))
+JOBS_MAINTENANCE_INTERVAL = int(os.getenv('JOBS_MAINTENANCE_INTERVAL', '60'))
+JOBS_RETENTION = int(os.getenv('JOBS_RETENTION', str(7 * 24 * 3600)))
+
 CORS_ALLOWED_ORIGINS = os.getenv('DJANGO_CORS_ALLOWED_ORIGINS', 'http://localhost:5173').split(',')
+if HAS_CORSHEADERS:
+    from corsheaders.defaults import default_headers
+
+    # The SPA echoes the replica sticky header; see apps.core.replicas.
+    CORS_ALLOW_HEADERS = (*default_headers, DATABASE_REPLICA_STICKY_HEADER.lower())
+    CORS_EXPOSE_HEADERS = [DATABASE_REPLICA_STICKY_HEADER]
 CSRF_TRUSTED_ORIGINS = os.getenv('DJANGO_CSRF_TRUSTED_ORIGINS', 'http://localhost:5173').split(',')
@@ -1,21 +1,46 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 
-from apps.accounts.views import BusinessAdminSignupView, BusinessUserViewSet, CurrentUserView
+from apps.accounts.async_views import AsyncCurrentUserView
+from apps.accounts.views import (
+    BusinessAdminSignupView,
+    BusinessRoleViewSet,
+    BusinessUserViewSet,
+    CurrentUserView,
+    LoginView,
+    LogoutView,
+)
+from apps.core.metrics import metrics_view
+from apps.products.async_views import AsyncPublicProductListView
 from apps.products.views import ProductViewSet, PublicProductListView
 
+if settings.ASYNC_VIEWS:
+    current_user_view = AsyncCurrentUserView.as_view()
+    public_products_view = AsyncPublicProductListView.as_view()
+else:
+    current_user_view = CurrentUserView.as_view()
+    public_products_view = PublicProductListView.as_view()
+
 router = DefaultRouter()
 router.register(r'users', BusinessUserViewSet, basename='business-users')
+router.register(r'roles', BusinessRoleViewSet, basename='business-roles')
 router.register(r'products', ProductViewSet, basename='products')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/auth/login/', LoginView.as_view(), name='token_obtain_pair'),
     path('api/auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api/auth/me/', CurrentUserView.as_view(), name='current_user'),
+    path('api/auth/logout/', LogoutView.as_view(), name='token_logout'),
+    path('api/auth/me/', current_user_view, name='current_user'),
     path('api/auth/signup/', BusinessAdminSignupView.as_view(), name='business_admin_signup'),
-    path('api/public/products/', PublicProductListView.as_view(), name='public_products'),
+    path('api/public/products/', public_products_view, name='public_products'),
     path('api/', include(router.urls)),
 ]
+
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -5,6 +5,10 @@ const configuredApiBaseUrl = (import.meta.env.VITE_API_BASE_URL || '').trim();
 const API_BASE_URL = configuredApiBaseUrl.replace(/\/$/, '');
 const ACCESS_TOKEN_KEY = 'glovo_access_token';
 const REFRESH_TOKEN_KEY = 'glovo_refresh_token';
+// After a write the backend returns a short-lived token that keeps this client's reads on the primary database
+// (the backend's cookie is not sent cross-origin); it is echoed on later requests and expires on its own.
+const DB_PRIMARY_HEADER = 'X-DB-Primary';
+let dbPrimaryToken: string | null = null;
 
 const getAccessToken = () => localStorage.getItem(ACCESS_TOKEN_KEY);
 const getRefreshToken = () => localStorage.getItem(REFRESH_TOKEN_KEY);
@@ -51,8 +55,12 @@ export const apiRequest = async <T>(path: string, options: RequestInit = {}, ret
   if (accessToken) {
     headers.set('Authorization', `Bearer ${accessToken}`);
   }
+  if (dbPrimaryToken) {
+    headers.set(DB_PRIMARY_HEADER, dbPrimaryToken);
+  }
 
   const response = await fetch(`${API_BASE_URL}${path}`, { ...options, headers });
+  dbPrimaryToken = response.headers.get(DB_PRIMARY_HEADER) || dbPrimaryToken;
 
   if (response.status === 401 && retry) {
     const newAccess = await refreshAccessToken();
@@ -14,6 +14,10 @@ export default defineConfig(({ mode }) => {
           target: env.VITE_DEV_BACKEND_URL || 'http://localhost:8000',
           changeOrigin: true,
         },
+        '/media': {
+          target: env.VITE_DEV_BACKEND_URL || 'http://localhost:8000',
+          changeOrigin: true,
+        },
       },
     },
     plugins: [react()],